@@ -23,6 +23,7 @@ public:
 private:
     zmq::context_t context;
     zmq::socket_t publisher;
+    uint64_t seq = 0;               // per-message sequence number, lets subscribers count lost windows
 };
 
 } // namespace resonance
@@ -16,9 +16,14 @@ public:
     // True when we have 64 frames ready
     bool isReady() const;
 
-    // Get pointer to contiguous (bins × frames) tensor
+    // Raw ring storage: frame-major (one row of `bins` per frame) and
+    // rotating, so the oldest frame is not at the start once full
     const float* data() const;
 
+    // Copy the window as published (schema/spectrogram.proto): bins × frames,
+    // frequency-major, oldest frame in column 0 and newest in the last one
+    void copyWindow(std::vector<float>& out) const;
+
     size_t getBins() const { return bins; }
     size_t getFrames() const { return frames; }
 
@@ -0,0 +1,90 @@
+import time
+import logging
+import numpy as np
+
+logger = logging.getLogger("NodeB.arena")
+
+
+def is_scoring_graph(session):
+    """True for a graph that returns ("mse", "band_errors") instead of a reconstruction."""
+    return [o.name for o in session.get_outputs()] == ["mse", "band_errors"]
+
+
+class InferenceArena:
+    """
+    Preallocated, reusable input/output buffers for an ORT session.
+
+    The input and output arrays are bound to the session through IOBinding,
+    so onnxruntime reads the batch straight from `inputs` and writes the
+    reconstruction straight into `outputs`. The squared error is computed in
+    a scratch buffer and reduced into a preallocated MSE vector. Apart from
+    copying each message into its arena slot, the steady state allocates no
+    tensors per message.
+
+    For a scoring graph (export_onnx.py --scoring) ORT writes the MSE and
+    per-band errors directly into `mse` and `bands`; there is no
+    reconstruction buffer and no reduction in numpy.
+    """
+
+    def __init__(self, session, max_batch, sample_shape=(1, 1024, 64)):
+        self.session = session
+        self.max_batch = max(1, int(max_batch))
+        self.sample_shape = tuple(sample_shape)
+        self.input_name = session.get_inputs()[0].name
+        self.output_name = session.get_outputs()[0].name
+        self.scoring = is_scoring_graph(session)
+
+        shape = (self.max_batch,) + self.sample_shape
+        self.inputs = np.zeros(shape, dtype=np.float32)
+        self.mse = np.zeros(self.max_batch, dtype=np.float32)
+        if self.scoring:
+            self.bands = np.zeros((self.max_batch, session.get_outputs()[1].shape[1]), dtype=np.float32)
+        else:
+            self.bands = None
+            self.outputs = np.zeros(shape, dtype=np.float32)
+            self.scratch = np.zeros(shape, dtype=np.float32)
+        # Duration of the last ORT run, excluding the MSE reduction
+        self.ort_seconds = 0.0
+
+        # One IOBinding per batch size; all of them point into the same arena.
+        # Slicing the leading axis keeps the buffers contiguous, so batch n
+        # simply uses the first n slots.
+        self._bindings = {}
+
+    def _binding(self, n):
+        binding = self._bindings.get(n)
+        if binding is None:
+            shape = [n] + list(self.sample_shape)
+            binding = self.session.io_binding()
+            binding.bind_input(self.input_name, "cpu", 0, np.float32, shape, self.inputs.ctypes.data)
+            if self.scoring:
+                binding.bind_output("mse", "cpu", 0, np.float32, [n], self.mse.ctypes.data)
+                binding.bind_output("band_errors", "cpu", 0, np.float32, [n, self.bands.shape[1]],
+                                    self.bands.ctypes.data)
+            else:
+                binding.bind_output(self.output_name, "cpu", 0, np.float32, shape, self.outputs.ctypes.data)
+            self._bindings[n] = binding
+        return binding
+
+    def load(self, slot, tensor):
+        """Copies one (1, 1024, 64)-compatible tensor into the given arena slot."""
+        np.copyto(self.inputs[slot], tensor.reshape(self.sample_shape))
+
+    def run(self, n):
+        """
+        Runs the model over the first n slots and returns a view of the
+        per-sample MSE (and of the per-band errors in `bands`, for a scoring
+        graph). The views are overwritten by the next call.
+        """
+        start = time.perf_counter()
+        self.session.run_with_iobinding(self._binding(n))
+        self.ort_seconds = time.perf_counter() - start
+        if self.scoring:
+            return self.mse[:n]
+
+        diff = self.scratch[:n]
+        np.subtract(self.inputs[:n], self.outputs[:n], out=diff)
+        np.square(diff, out=diff)
+        mse = self.mse[:n]
+        np.mean(diff.reshape(n, -1), axis=1, out=mse)
+        return mse
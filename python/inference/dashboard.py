@@ -0,0 +1,105 @@
+import json
+import time
+import base64
+import numpy as np
+
+from utils.codec import JSON_HEADER, PROTO_HEADER, encode_result
+
+# Stream modes on the dashboard link (port 5557)
+JSON_MODE = "json"       # single JSON frame, spectrogram as base64 float32 (legacy)
+BINARY_MODE = "binary"   # [header, raw spectrogram bytes] multipart
+
+
+class SpectrogramEncoder:
+    """
+    Encodes Node B results for the dashboard.
+
+    In binary mode the spectrogram leaves the JSON header and travels as a
+    second frame, quantized to float16 or to uint8 with a scale/offset per
+    FFT frame (waterfall column). With `delta` enabled only the waterfall columns appended
+    since the last emitted frame are sent, derived from Node A's timestamp_ms
+    and the FFT hop duration. `target_fps` decimates NORMAL results; anomalies
+    are always forwarded immediately. Delta and decimation state is kept per
+    machine_id.
+
+    In binary mode the header is JSON or, with header="proto", a
+    DashboardMessage from schema/alert.proto.
+    """
+
+    def __init__(self, mode=JSON_MODE, dtype="float16", delta=False, target_fps=0.0,
+                 hop_ms=512 / 44100 * 1000, bins=1024, frames=64, header=JSON_HEADER):
+        if mode not in (JSON_MODE, BINARY_MODE):
+            raise ValueError(f"Unknown dashboard stream mode '{mode}'")
+        if dtype not in ("float16", "uint8"):
+            raise ValueError(f"Unsupported dashboard dtype '{dtype}'")
+        if header == PROTO_HEADER and mode != BINARY_MODE:
+            raise ValueError("Protobuf dashboard headers require the binary stream mode")
+        self.mode = mode
+        self.header = header
+        self.dtype = dtype
+        self.delta = delta
+        self.min_interval = 1.0 / target_fps if target_fps > 0 else 0.0
+        self.hop_ms = hop_ms
+        self.bins = bins
+        self.frames = frames
+        self._last_emit = {}
+        self._last_ts = {}
+
+    def _new_columns(self, key, timestamp_ms):
+        """Number of waterfall columns appended since the last emitted window."""
+        last_ts = self._last_ts.get(key)
+        if not self.delta or timestamp_ms is None or last_ts is None:
+            return self.frames
+        hops = int(round((timestamp_ms - last_ts) / self.hop_ms))
+        return min(max(hops, 1), self.frames)
+
+    def _quantize(self, window):
+        """
+        Returns (values, scale, offset). uint8 values are scaled per column
+        (FFT hop) of the (bins, columns) window, so one loud hop does not
+        cost the quiet ones their resolution; float16 has no scale/offset.
+        """
+        if self.dtype == "float16":
+            return window.astype(np.float16), [], []
+        lo = window.min(axis=0)
+        span = window.max(axis=0) - lo
+        scale = np.where(span > 0, span / 255.0, 1.0).astype(np.float32)
+        q = np.rint((window - lo) / scale).astype(np.uint8)
+        return q, scale.tolist(), lo.astype(np.float32).tolist()
+
+    def encode(self, result, metadata, raw_data):
+        """
+        Returns the list of frames to publish for this result, or None if it
+        was decimated away.
+        """
+        key = result.get("machine_id")
+        now = time.monotonic()
+        if (self.min_interval and result.get("severity") == "NORMAL"
+                and now - self._last_emit.get(key, 0.0) < self.min_interval):
+            return None
+        self._last_emit[key] = now
+
+        if self.mode == JSON_MODE:
+            payload = dict(result)
+            payload["spectrogram"] = base64.b64encode(raw_data.tobytes()).decode('utf-8')
+            return [json.dumps(payload).encode('utf-8')]
+
+        timestamp_ms = metadata.get("timestamp_ms") if metadata else None
+        columns = self._new_columns(key, timestamp_ms)
+        self._last_ts[key] = timestamp_ms
+
+        # Node A publishes frequency-major (bins x frames) windows in time order
+        # (schema/spectrogram.proto), so the newest columns are on the right
+        window = raw_data.reshape(self.bins, self.frames)[:, self.frames - columns:]
+        values, scale, offset = self._quantize(window)
+
+        header = dict(result)
+        header["spectrogram_format"] = {
+            "dtype": self.dtype,
+            "bins": self.bins,
+            "frames": self.frames,
+            "columns": columns,
+            "scale": scale,
+            "offset": offset,
+        }
+        return [encode_result(header, self.header), np.ascontiguousarray(values).tobytes()]
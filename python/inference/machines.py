@@ -0,0 +1,164 @@
+import os
+import json
+import logging
+import threading
+
+from utils.quantiles import QuantileSketch
+
+logger = logging.getLogger("NodeB.machines")
+
+SNAPSHOT_VERSION = 1
+
+
+class MachineState:
+    """
+    Per-machine scoring state: severity thresholds, the last score and a
+    result sequence number, so one Node B can serve many sensors without
+    their results bleeding into each other.
+
+    Every score also feeds a constant-memory quantile sketch of the machine's
+    MSE. With `adaptive` set, the (low, medium, high) thresholds follow the
+    sketch's `threshold_quantiles` once `min_samples` scores have been seen;
+    until then the static thresholds apply. HIGH scores are kept out of the
+    sketch while adaptive, so a sustained fault cannot raise its own bar.
+    """
+
+    def __init__(self, machine_id, thresholds, quantiles=(), threshold_quantiles=None,
+                 adaptive=False, min_samples=1000, sketch=None):
+        self.machine_id = machine_id
+        self.threshold_low, self.threshold_medium, self.threshold_high = thresholds
+        self.last_mse = None
+        self.last_severity = "NORMAL"
+        self.sequence = 0
+
+        self.threshold_quantiles = tuple(threshold_quantiles or ())
+        self.adaptive = adaptive and len(self.threshold_quantiles) == 3
+        self.min_samples = min_samples
+        tracked = sorted(set(quantiles) | set(self.threshold_quantiles))
+        self.sketch = QuantileSketch(tracked)
+        if sketch is not None:
+            # Keep restored estimators still configured, start the others afresh
+            for p in tracked:
+                if p in sketch.estimators:
+                    self.sketch.estimators[p] = sketch.estimators[p]
+        self._lock = threading.Lock()
+        self._update_thresholds()
+
+    @property
+    def calibrated(self):
+        return self.adaptive and self.sketch.count >= self.min_samples
+
+    def _update_thresholds(self):
+        if not self.calibrated:
+            return
+        low, medium, high = (self.sketch.quantile(p) for p in self.threshold_quantiles)
+        # P² estimates are independent, keep them ordered
+        self.threshold_low = low
+        self.threshold_medium = max(medium, low)
+        self.threshold_high = max(high, self.threshold_medium)
+
+    def classify(self, mse):
+        if mse > self.threshold_high:
+            return "HIGH"
+        elif mse > self.threshold_medium:
+            return "MEDIUM"
+        elif mse > self.threshold_low:
+            return "LOW"
+        return "NORMAL"
+
+    def record(self, mse):
+        """Stores a new score and returns (severity, sequence) for it."""
+        self.last_mse = mse
+        self.last_severity = self.classify(mse)
+        self.sequence += 1
+        if self.sketch.estimators and not (self.adaptive and self.last_severity == "HIGH"):
+            with self._lock:
+                self.sketch.update(mse)
+                self._update_thresholds()
+        return self.last_severity, self.sequence
+
+    def quantiles(self):
+        return {p: self.sketch.quantile(p) for p in self.sketch.estimators}
+
+    def snapshot(self):
+        with self._lock:
+            return self.sketch.to_dict()
+
+
+class MachineRegistry:
+    """
+    Creates MachineState objects on first sight of a machine_id.
+
+    The quantile sketches can be saved to and restored from a JSON snapshot,
+    so calibration survives restarts. Machines with explicit threshold
+    overrides keep them and never adapt.
+    """
+
+    def __init__(self, default_thresholds, overrides=None, quantiles=(), threshold_quantiles=None,
+                 adaptive=False, min_samples=1000):
+        self.default_thresholds = tuple(default_thresholds)
+        self.overrides = overrides or {}
+        self.quantiles = tuple(quantiles)
+        self.threshold_quantiles = threshold_quantiles
+        self.adaptive = adaptive
+        self.min_samples = min_samples
+        self._machines = {}
+        self._restored = {}
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._machines.values()))
+
+    def __len__(self):
+        return len(self._machines)
+
+    def get(self, machine_id):
+        machine = self._machines.get(machine_id)
+        if machine is None:
+            with self._lock:
+                machine = self._machines.get(machine_id)
+                if machine is None:
+                    override = self.overrides.get(machine_id)
+                    machine = self._machines[machine_id] = MachineState(
+                        machine_id,
+                        override or self.default_thresholds,
+                        quantiles=self.quantiles,
+                        threshold_quantiles=self.threshold_quantiles,
+                        adaptive=self.adaptive and override is None,
+                        min_samples=self.min_samples,
+                        sketch=self._restored.pop(machine_id, None),
+                    )
+        return machine
+
+    def snapshot(self):
+        machines = {m.machine_id: m.snapshot() for m in self}
+        # Restored machines that have not reported since the restart
+        for machine_id, sketch in list(self._restored.items()):
+            machines.setdefault(machine_id, sketch.to_dict())
+        return {"version": SNAPSHOT_VERSION, "machines": machines}
+
+    def restore(self, snapshot):
+        if snapshot.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported quantile snapshot version {snapshot.get('version')}")
+        with self._lock:
+            for machine_id, data in snapshot.get("machines", {}).items():
+                self._restored[machine_id] = QuantileSketch.from_dict(data)
+        return len(self._restored)
+
+    def save(self, path):
+        # Write then rename, so a crash mid-save keeps the previous snapshot
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        try:
+            with open(path) as f:
+                count = self.restore(json.load(f))
+            logger.info(f"Restored MSE quantile sketches of {count} machine(s) from {path}")
+        except FileNotFoundError:
+            logger.info(f"No quantile snapshot at {path}, starting uncalibrated")
+        except Exception as e:
+            logger.error(f"Error restoring quantile snapshot {path}: {e}")
@@ -1,19 +1,29 @@
 import sys
 import os
 import time
+import signal
+import threading
 import logging
-import numpy as np
 import zmq
-import json
-import base64
-import onnxruntime as ort
 
 # Add parent dir to path to allow imports
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
 from utils.zmq_receiver import ZMQSubscriber
 from llm.handler import LLMHandler
+from llm.dispatcher import AlertDispatcher
+from llm.cache import AlertTextCache, TemplateTable
+from llm.templates import template_details
 from utils import config
+from utils.codec import encode_alert_update
+from utils.tracing import SequenceTracker
+from inference.pipeline import BoundedQueue, Stage, DropReporter
+from inference.scorer import ModelScorer
+from inference.machines import MachineRegistry
+from inference.workers import WorkerPool
+from inference.dashboard import SpectrogramEncoder
+from inference.scheduler import ScoringScheduler
+from inference.metrics import NodeMetrics, MetricsServer
 
 # Configure logging
 logging.basicConfig(
@@ -35,96 +45,333 @@ class ZMQPublisher:
         except Exception as e:
             logger.error(f"Failed to publish results: {e}")
 
+    def publish_frames(self, frames):
+        try:
+            self.socket.send_multipart(frames)
+        except Exception as e:
+            logger.error(f"Failed to publish results: {e}")
+
+    def close(self):
+        self.socket.close()
+        self.context.term()
+
 class InferenceNode:
     def __init__(self):
-        self.receiver = ZMQSubscriber(config.ZMQ_ENDPOINT)
+        self.receiver = ZMQSubscriber(config.ZMQ_ENDPOINTS, copy=not config.ZMQ_ZERO_COPY, topics=config.ZMQ_TOPICS)
         self.publisher = ZMQPublisher(endpoint="tcp://*:5557")
-        
-        # Load ONNX Model
-        try:
+        self.encoder = SpectrogramEncoder(
+            mode=config.DASHBOARD_STREAM,
+            dtype=config.DASHBOARD_DTYPE,
+            delta=config.DASHBOARD_DELTA,
+            target_fps=config.DASHBOARD_FPS,
+            hop_ms=config.HOP_MS,
+            bins=config.INPUT_SHAPE[1],
+            frames=config.INPUT_SHAPE[2],
+            header=config.DASHBOARD_HEADER,
+        )
+
+        # Per-machine thresholds, last score and result sequence
+        self.machines = MachineRegistry(
+            (config.THRESHOLD_LOW, config.THRESHOLD_MEDIUM, config.THRESHOLD_HIGH),
+            overrides=config.MACHINE_THRESHOLDS,
+            quantiles=config.MSE_QUANTILES,
+            threshold_quantiles=config.THRESHOLD_QUANTILES,
+            adaptive=config.ADAPTIVE_THRESHOLDS,
+            min_samples=config.ADAPTIVE_MIN_SAMPLES,
+        )
+        if config.QUANTILE_SNAPSHOT_PATH:
+            self.machines.load(config.QUANTILE_SNAPSHOT_PATH)
+
+        # Load ONNX Model: either here, or once per worker process
+        self.scorer = None
+        self.pool = None
+        if config.INFERENCE_WORKERS > 0:
             if not os.path.exists(config.MODEL_PATH_ONNX):
                 logger.error(f"ONNX model not found at {config.MODEL_PATH_ONNX}")
             else:
-                logger.info(f"Loading model from {config.MODEL_PATH_ONNX}")
-                self.ort_session = ort.InferenceSession(config.MODEL_PATH_ONNX)
-        except Exception as e:
-            logger.error(f"Error loading model: {e}")
-            self.ort_session = None
-
-        # LLM Handler
-        self.llm = LLMHandler(url=config.OLLAMA_URL, model=config.OLLAMA_MODEL)
-        self.llm_available = self.llm.check_connection()
-        
-    def preprocess(self, tensor_data):
+                logger.info(f"Starting {config.INFERENCE_WORKERS} inference worker(s)")
+                self.pool = WorkerPool(
+                    config.INFERENCE_WORKERS,
+                    config.WORKER_RING_SLOTS,
+                    config.INPUT_SHAPE,
+                    config.MODEL_PATH_ONNX,
+                    max_batch=config.BATCH_MAX_SIZE,
+                    max_wait=config.BATCH_MAX_WAIT_MS / 1000.0,
+                    use_io_binding=config.USE_IO_BINDING,
+                    warmup_runs=config.ORT_WARMUP_RUNS,
+                    log_level=config.LOG_LEVEL,
+                    max_restarts=config.WORKER_MAX_RESTARTS,
+                )
+        if self.pool is None:
+            self.scorer = ModelScorer(
+                config.MODEL_PATH_ONNX,
+                max_batch=config.BATCH_MAX_SIZE,
+                sample_shape=config.INPUT_SHAPE,
+                use_io_binding=config.USE_IO_BINDING,
+                warmup_runs=config.ORT_WARMUP_RUNS,
+            )
+
+        # Decides which overlapping windows actually get scored
+        self.scheduler = ScoringScheduler(
+            stride_hops=config.SCORE_STRIDE_HOPS,
+            stride_ms=config.SCORE_STRIDE_MS,
+            hop_ms=config.HOP_MS,
+            escalate=config.SCORE_ESCALATE,
+            escalate_threshold=config.THRESHOLD_LOW,
+        )
+
+        # LLM alerts: generated off the scoring path, published by the publish stage
+        self.llm = LLMHandler(
+            url=config.OLLAMA_URL,
+            model=config.OLLAMA_MODEL,
+            timeout=config.OLLAMA_TIMEOUT_S,
+            language=config.ALERT_LANGUAGE,
+            cache=AlertTextCache(config.ALERT_CACHE_SIZE, config.ALERT_CACHE_TTL_S),
+            templates=TemplateTable(config.ALERT_TEMPLATES_PATH),
+        )
+        self.alert_queue = BoundedQueue(256, name="alert_queue")
+        self.alerts = None
+        if config.ALERT_LLM:
+            self.alerts = AlertDispatcher(
+                self.llm,
+                emit=self.alert_queue.put,
+                stream=config.ALERT_STREAM,
+                update_interval=config.ALERT_UPDATE_INTERVAL_MS / 1000.0,
+                cooldown=config.ALERT_COOLDOWN_S,
+                prefill=template_details(config.ALERT_TEMPLATE_LANGUAGES) if config.ALERT_TEMPLATES_PREFILL else None,
+            )
+
+        # Stage timings, per-machine counters, queue depths and process stats
+        self.metrics = NodeMetrics()
+        # Node A sequence numbers: windows lost before they reached us
+        self.sequences = SequenceTracker()
+
+        # Stage queues: receive -> inference -> publish
+        self.input_queue = BoundedQueue(config.INPUT_QUEUE_SIZE, config.INPUT_QUEUE_POLICY, name="input_queue",
+                                        on_drop=self._dropped("input_queue"))
+        self.output_queue = BoundedQueue(config.OUTPUT_QUEUE_SIZE, config.OUTPUT_QUEUE_POLICY, name="output_queue",
+                                         on_drop=self._dropped("output_queue"))
+        self.stop_event = threading.Event()
+        self.ring_drops = 0
+
+        self.metrics.watch_scheduler(self.scheduler)
+        self.metrics.watch_sequences(self.sequences)
+        self.metrics.watch_queues([self.input_queue, self.output_queue, self.alert_queue])
+        self.metrics.watch_processes(self.process_ids)
+        self.metrics_server = None
+        if config.METRICS_PORT:
+            try:
+                self.metrics_server = MetricsServer(self.metrics.registry, config.METRICS_HOST, config.METRICS_PORT,
+                                                    profiling=config.METRICS_PROFILING)
+            except OSError as e:
+                logger.error(f"Metrics endpoint unavailable on port {config.METRICS_PORT}: {e}")
+
+    def _dropped(self, reason):
+        return lambda item: self.metrics.dropped.inc(item[0].get("machine_id"), reason)
+
+    def process_ids(self):
+        pids = {"main": None}
+        if self.pool is not None:
+            for worker_id, proc in enumerate(self.pool.processes):
+                pids[f"worker-{worker_id}"] = proc.pid
+        return pids
+
+    def finish(self, metadata, raw_data, mse, bands=None):
+        """Applies a score to its machine's state and hands the result to the publish stage."""
+        self.metrics.reached("scoring", metadata)
+        machine = self.machines.get(metadata.get("machine_id", "default"))
+        severity, sequence = machine.record(mse)
+        self.scheduler.record(mse, machine.machine_id, threshold=machine.threshold_low)
+        result = self.build_result(machine, metadata, mse, severity, sequence, bands)
+        self.output_queue.put((metadata, raw_data, result))
+
+    def build_result(self, machine, metadata, mse, severity, sequence, bands=None):
+        # Handle Anomaly & Alerts
+        alert_text = None
+        alert_id = None
+        if severity != "NORMAL":
+             # With a scoring graph, the band with the largest error localizes the fault
+             band = f" | Band: {max(bands, key=bands.get)}" if bands else ""
+             logger.info(f"Anomaly Detected on {machine.machine_id}! MSE: {mse:.4f} | Severity: {severity}{band}")
+             if severity in ["HIGH", "MEDIUM"]:
+                 # Never blocks: the LLM text follows as an alert_update (coalesced per machine)
+                 if self.alerts is not None:
+                     alert_id, alert_text = self.alerts.submit(machine.machine_id, mse, severity, sequence)
+                 alert_text = alert_text or self.llm.fallback_text(severity)
+
+        # Result payload for the Dashboard (Node.js)
+        # The spectrogram itself is attached by the SpectrogramEncoder
+        return {
+            "timestamp": time.time(),
+            "machine_id": machine.machine_id,
+            "sequence": sequence,
+            # Node A timestamp and sequence number of the scored window, so results
+            # can be matched to their input and sensor-to-screen latency measured
+            "origin_timestamp_ms": metadata.get("timestamp_ms"),
+            "origin_seq": metadata.get("seq"),
+            "mse": mse,
+            # Mean reconstruction error per frequency band (scoring graphs only)
+            "band_errors": bands,
+            "severity": severity,
+            "alert": alert_text,
+            # Later alert_update messages with this id replace the alert text
+            "alert_id": alert_id
+        }
+
+    # ─── Pipeline Stages ────────────────────────────────────────────────────
+    # Each stage runs on its own thread and owns its resources: the receive
+    # stage is the only user of the SUB sockets, the publish stage the only
+    # user of the PUB socket. ORT releases the GIL while running, so the
+    # receive stage keeps draining Node A during inference.
+
+    def receive_step(self):
+        # Blocks in zmq poll (no sleep loop); the timeout only bounds how long
+        # shutdown can take.
+        metadata, raw_data = self.receiver.receive(timeout_ms=config.RECEIVE_POLL_MS)
+        if raw_data is not None:
+            self.metrics.received.inc(metadata["machine_id"])
+            self.sequences.update(metadata["machine_id"], metadata.get("seq"))
+            self.metrics.stage_done("decode", self.receiver.decode_seconds, metadata)
+            if self.scheduler.should_score(metadata, metadata["machine_id"]):
+                self.input_queue.put((metadata, raw_data))
+        self.input_drops.check()
+
+    def next_batch(self):
+        return self.input_queue.get_batch(
+            config.BATCH_MAX_SIZE,
+            config.BATCH_MAX_WAIT_MS / 1000.0,
+            timeout=config.RECEIVE_POLL_MS / 1000.0,
+        )
+
+    def inference_step(self):
+        batch = self.next_batch()
+        if not batch:
+            return
+        mse_values = self.scorer.score([raw_data for _, raw_data in batch])
+        self.metrics.observe_scoring(self.scorer.timings)
+        for (metadata, raw_data), mse, bands in zip(batch, mse_values, self.scorer.band_errors):
+            self.finish(metadata, raw_data, mse, bands)
+        self.output_drops.check()
+
+    def dispatch_step(self):
+        # Worker mode: hand tensors to the owning worker's shared-memory ring
+        for metadata, raw_data in self.next_batch():
+            if not self.pool.submit(metadata, raw_data):
+                self.ring_drops += 1
+                self.metrics.dropped.inc(metadata.get("machine_id"), "worker_ring")
+
+    def collect_step(self):
+        # Worker mode: merge results from all workers back into one stream
+        results = self.pool.results(timeout=config.RECEIVE_POLL_MS / 1000.0)
+        if results:
+            self.metrics.observe_scoring(self.pool.timings)
+        for metadata, raw_data, mse, bands in results:
+            self.finish(metadata, raw_data, mse, bands)
+        self.output_drops.check()
+
+    def snapshot_step(self):
+        # Wakes up early on shutdown; the final snapshot is taken in run()
+        if not self.stop_event.wait(config.QUANTILE_SNAPSHOT_INTERVAL_S):
+            self.save_quantiles()
+
+    def save_quantiles(self):
         try:
-            data = tensor_data.reshape(1, 1024, 64)
-            data = np.expand_dims(data, axis=0)
-            return data
+            self.machines.save(config.QUANTILE_SNAPSHOT_PATH)
         except Exception as e:
-            logger.error(f"Preprocessing error: {e}")
-            return None
+            logger.error(f"Error saving quantile snapshot: {e}")
+
+    def publish_step(self):
+        while True:
+            update = self.alert_queue.get(timeout=0)
+            if update is None:
+                break
+            self.publisher.publish_frames([encode_alert_update(update, config.DASHBOARD_HEADER)])
+        item = self.output_queue.get(timeout=config.RECEIVE_POLL_MS / 1000.0)
+        if item is None:
+            return
+        metadata, raw_data, result = item
+        start = time.perf_counter()
+        frames = self.encoder.encode(result, metadata, raw_data)
+        encoded = time.perf_counter()
+        self.metrics.stage_done("encode", encoded - start, metadata)
+        if frames is not None:
+            self.publisher.publish_frames(frames)
+            self.metrics.stage_done("publish", time.perf_counter() - encoded, metadata)
+            self.metrics.published.inc()
+        else:
+            self.metrics.decimated.inc(result.get("machine_id"))
+
+    def _terminate(self, signum, frame):
+        raise KeyboardInterrupt
 
     def run(self):
         logger.info("Starting Inference Node...")
-        if self.ort_session is None:
+        if self.pool is None and not self.scorer.available:
              logger.warning("No model loaded. Running in pass-through mode (no inference).")
+        elif config.BATCH_MAX_SIZE > 1:
+             logger.info(f"Batching enabled: up to {config.BATCH_MAX_SIZE} messages "
+                         f"or {config.BATCH_MAX_WAIT_MS:.1f} ms per ORT call")
+        if self.scheduler.stride_hops > 1:
+             logger.info(f"Scoring every {self.scheduler.stride_hops} hops "
+                         f"({self.scheduler.stride_ms:.1f} ms), escalate={self.scheduler.escalate}")
+
+        self.input_drops = DropReporter(self.input_queue)
+        self.output_drops = DropReporter(self.output_queue)
+        stages = [Stage("receive", self.receive_step, self.stop_event)]
+        if self.pool is not None:
+            stages.append(Stage("dispatch", self.dispatch_step, self.stop_event))
+            stages.append(Stage("collect", self.collect_step, self.stop_event))
+        else:
+            stages.append(Stage("inference", self.inference_step, self.stop_event))
+        stages.append(Stage("publish", self.publish_step, self.stop_event))
+        if config.QUANTILE_SNAPSHOT_PATH:
+            stages.append(Stage("snapshot", self.snapshot_step, self.stop_event))
+        for stage in stages:
+            stage.start()
+        if self.alerts is not None:
+            self.alerts.start()
+        if self.metrics_server is not None:
+            self.metrics_server.start()
+
+        # docker stop / kill send SIGTERM: shut down like on Ctrl+C so worker
+        # processes and shared memory are cleaned up
+        signal.signal(signal.SIGTERM, self._terminate)
 
         try:
-            while True:
-                # Receive data from Node A
-                metadata, raw_data = self.receiver.receive()
-                
-                if raw_data is None:
-                    time.sleep(0.01)
-                    continue
-                
-                mse = 0.0
-                severity = "NORMAL"
-                spectrogram_b64 = ""
-
-                # Preprocess & Inference
-                if self.ort_session:
-                    input_tensor = self.preprocess(raw_data)
-                    if input_tensor is not None:
-                        ort_inputs = {self.ort_session.get_inputs()[0].name: input_tensor}
-                        ort_outs = self.ort_session.run(None, ort_inputs)
-                        reconstruction = ort_outs[0]
-                        mse = float(np.mean((input_tensor - reconstruction) ** 2))
-                
-                # Check Thresholds
-                if mse > config.THRESHOLD_HIGH:
-                    severity = "HIGH"
-                elif mse > config.THRESHOLD_MEDIUM:
-                    severity = "MEDIUM"
-                elif mse > config.THRESHOLD_LOW:
-                    severity = "LOW"
-                
-                # Encode spectrogram for visualization
-                # Using 1024x64 float32 is heavy, but we'll send it for the modern dashboard
-                spectrogram_b64 = base64.b64encode(raw_data.tobytes()).decode('utf-8')
-
-                # Handle Anomaly & Alerts
-                alert_text = None
-                if severity != "NORMAL":
-                     logger.info(f"Anomaly Detected! MSE: {mse:.4f} | Severity: {severity}")
-                     if self.llm_available and severity in ["HIGH", "MEDIUM"]:
-                         # Rate limit or logic here
-                         alert_text = f"Warning: {severity} severity anomaly detected. Check machine components."
-
-                # Publish Results to Dashboard (Node.js)
-                result_payload = {
-                    "timestamp": time.time(),
-                    "mse": mse,
-                    "severity": severity,
-                    "alert": alert_text,
-                    "spectrogram": spectrogram_b64
-                }
-                self.publisher.publish(result_payload)
-                
+            while all(stage.is_alive() for stage in stages):
+                time.sleep(0.5)
+                if self.pool is not None:
+                    # Raises (and stops Node B) once workers keep dying
+                    for metadata in self.pool.check_workers():
+                        self.metrics.dropped.inc(metadata.get("machine_id"), "worker_died")
         except KeyboardInterrupt:
             logger.info("Stopping Node B...")
         finally:
+            self.stop_event.set()
+            for stage in stages:
+                stage.join(timeout=2.0)
+            if self.metrics_server is not None:
+                self.metrics_server.close()
+            if self.pool is not None:
+                self.pool.close()
+            if self.alerts is not None:
+                self.alerts.close()
+                logger.info(f"LLM alerts generated: {self.alerts.generated}, failed: {self.alerts.failed}, "
+                            f"coalesced: {self.alerts.coalesced}, cache hits: {self.llm.cache.hits}")
             self.receiver.close()
+            self.publisher.close()
+            logger.info(f"Windows scored: {self.scheduler.scored}, skipped: {self.scheduler.skipped}, "
+                        f"duplicates: {self.scheduler.duplicates}, worker ring drops: {self.ring_drops}")
+            totals = self.sequences.totals()
+            logger.info(f"Node A windows received: {totals['received']}, lost upstream: {totals['lost']}, "
+                        f"reordered: {totals['reordered']}, sender restarts: {totals['restarts']}")
+            if config.QUANTILE_SNAPSHOT_PATH:
+                self.save_quantiles()
+            for machine in self.machines:
+                quantiles = ", ".join(f"p{p * 100:g}={q:.4f}" for p, q in machine.quantiles().items() if q is not None)
+                logger.info(f"{machine.machine_id}: {machine.sequence} results, last MSE {machine.last_mse}"
+                            f"{f', MSE {quantiles}' if quantiles else ''}"
+                            f"{' (adaptive thresholds)' if machine.calibrated else ''}")
 
 if __name__ == "__main__":
     node = InferenceNode()
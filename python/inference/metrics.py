@@ -0,0 +1,329 @@
+import os
+import sys
+import time
+import bisect
+import logging
+import resource
+import threading
+import traceback
+from collections import Counter as _Tally
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+logger = logging.getLogger("NodeB.metrics")
+
+# Seconds; spans sub-millisecond stages up to a stalled pipeline
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    """A named family of samples, one per combination of label values."""
+
+    kind = "untyped"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def samples(self):
+        with self._lock:
+            return list(self._values.items())
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in self.samples():
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    Set directly, or computed at scrape time by `collect`, a callable
+    returning a number or a {label values tuple: number} dict.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name, help, labels=(), collect=None, kind=None):
+        super().__init__(name, help, labels)
+        self.collect = collect
+        if kind:
+            self.kind = kind
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def samples(self):
+        if self.collect is None:
+            return super().samples()
+        values = self.collect()
+        return list(values.items()) if isinstance(values, dict) else [((), values)]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                # Per-bucket (non-cumulative) counts, the +Inf bucket last; sum
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][i] += 1
+            entry[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = [(labels, list(counts), total) for labels, (counts, total) in self._values.items()]
+        for labels, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                logger.error(f"Error collecting {metric.name}: {e}")
+        return "\n".join(lines) + "\n"
+
+
+def process_stats(pid=None):
+    """(cpu_seconds, rss_bytes) of a process from /proc, or of this one via getrusage elsewhere."""
+    try:
+        with open(f"/proc/{pid or 'self'}/stat") as f:
+            # Fields after the parenthesised command name, which may contain spaces
+            fields = f.read().rsplit(")", 1)[1].split()
+        ticks = os.sysconf("SC_CLK_TCK")
+        cpu = (int(fields[11]) + int(fields[12])) / ticks
+        rss = int(fields[21]) * os.sysconf("SC_PAGE_SIZE")
+        return cpu, rss
+    except (OSError, IndexError, ValueError):
+        if pid is not None:
+            return None
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        # ru_maxrss is the peak, in KB on Linux and bytes on macOS
+        rss_scale = 1 if sys.platform == "darwin" else 1024
+        return usage.ru_utime + usage.ru_stime, usage.ru_maxrss * rss_scale
+
+
+def sample_stacks(duration, interval=0.005, skip_thread=None):
+    """
+    Samples the Python stacks of all threads every `interval` seconds for
+    `duration` seconds. Returns folded stacks ("thread;frame;frame count"
+    lines, hottest first), the input format of flamegraph.pl / speedscope.
+    """
+    names = {t.ident: t.name for t in threading.enumerate()}
+    tally = _Tally()
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        for ident, frame in sys._current_frames().items():
+            if ident == skip_thread:
+                continue
+            stack = traceback.extract_stack(frame)
+            frames = ";".join(f"{os.path.basename(f.filename)}:{f.name}:{f.lineno}" for f in stack)
+            tally[f"{names.get(ident, ident)};{frames}"] += 1
+        time.sleep(interval)
+    return "".join(f"{stack} {count}\n" for stack, count in tally.most_common())
+
+
+class MetricsServer:
+    """
+    Serves GET /metrics in the Prometheus text format from a daemon thread.
+    With `profiling` enabled, GET /profile?seconds=5&hz=200 samples the
+    stacks of all threads and returns them folded (see sample_stacks).
+    """
+
+    def __init__(self, registry, host="127.0.0.1", port=9108, profiling=False, max_profile_s=60.0):
+        self.registry = registry
+        self.profiling = profiling
+        self.max_profile_s = max_profile_s
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == "/metrics":
+                    self._reply(200, server.registry.render(), "text/plain; version=0.0.4; charset=utf-8")
+                elif url.path == "/profile" and server.profiling:
+                    query = parse_qs(url.query)
+                    seconds = min(float(query.get("seconds", ["5"])[0]), server.max_profile_s)
+                    hz = max(1.0, min(float(query.get("hz", ["200"])[0]), 1000.0))
+                    logger.info(f"Sampling stacks for {seconds:.1f}s at {hz:.0f} Hz")
+                    stacks = sample_stacks(seconds, 1.0 / hz, skip_thread=threading.get_ident())
+                    self._reply(200, stacks, "text/plain; charset=utf-8")
+                else:
+                    self._reply(404, "Not found\n", "text/plain")
+
+            def _reply(self, status, body, content_type):
+                data = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="metrics", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        host, port = self.httpd.server_address[:2]
+        logger.info(f"Metrics on http://{host}:{port}/metrics"
+                    f"{f', stack profiles on /profile' if self.profiling else ''}")
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class NodeMetrics:
+    """
+    The metrics Node B exposes. Stage timings come from the pipeline stages;
+    queue depths, per-machine scheduling counts and process CPU/RSS are read
+    when scraped, so they cost nothing between scrapes.
+    """
+
+    # Stages on the receive -> publish path, in order
+    STAGES = ("decode", "preprocess", "ort_run", "scoring", "encode", "publish")
+
+    def __init__(self):
+        self.registry = MetricsRegistry()
+        add = self.registry.add
+        self.stage_seconds = add(Histogram(
+            "nodeb_stage_duration_seconds",
+            "Time spent in each pipeline stage, per message (per batch for preprocess, ort_run and scoring)",
+            ("stage",)))
+        self.since_receive = add(Histogram(
+            "nodeb_receive_latency_seconds",
+            "Time from receiving a window until the end of each stage",
+            ("stage",)))
+        self.since_origin = add(Histogram(
+            "nodeb_origin_latency_seconds",
+            "Time from the Node A timestamp of a window until the end of each stage (includes clock offset)",
+            ("stage",)))
+        self.received = add(Counter("nodeb_messages_received_total", "Windows received", ("machine_id",)))
+        self.dropped = add(Counter("nodeb_messages_dropped_total", "Windows dropped, by where",
+                                   ("machine_id", "reason")))
+        self.published = add(Counter("nodeb_messages_published_total", "Results published to the dashboard"))
+        self.decimated = add(Counter("nodeb_messages_decimated_total",
+                                     "NORMAL results not published because of DASHBOARD_FPS", ("machine_id",)))
+        self.ort_seconds = add(Counter("nodeb_ort_session_seconds_total", "Time spent in ORT session runs"))
+        self.ort_runs = add(Counter("nodeb_ort_session_runs_total", "ORT session runs (batches)"))
+
+    def watch_scheduler(self, scheduler):
+        def counts(index):
+            return lambda: {(key,): c[index] for key, c in scheduler.counts().items()}
+        self.registry.add(Gauge("nodeb_messages_scored_total", "Windows selected for scoring",
+                                ("machine_id",), collect=counts(0), kind="counter"))
+        self.registry.add(Gauge("nodeb_messages_skipped_total", "Windows skipped by the scoring stride",
+                                ("machine_id",), collect=counts(1), kind="counter"))
+        self.registry.add(Gauge("nodeb_messages_duplicate_total", "Re-delivered or out-of-order windows",
+                                ("machine_id",), collect=counts(2), kind="counter"))
+
+    def watch_sequences(self, tracker):
+        def field(name):
+            return lambda: {(key,): s[name] for key, s in tracker.stats().items()}
+        self.registry.add(Gauge("nodeb_sequence_lost_total", "Windows missing from the Node A sequence",
+                                ("machine_id",), collect=field("lost"), kind="counter"))
+        self.registry.add(Gauge("nodeb_sequence_reordered_total", "Windows that arrived after a later one",
+                                ("machine_id",), collect=field("reordered"), kind="counter"))
+        self.registry.add(Gauge("nodeb_sequence_restarts_total", "Node A sequence restarts",
+                                ("machine_id",), collect=field("restarts"), kind="counter"))
+
+    def watch_queues(self, queues):
+        self.registry.add(Gauge("nodeb_queue_depth", "Items waiting in each stage queue", ("queue",),
+                                collect=lambda: {(q.name,): len(q) for q in queues}))
+        self.registry.add(Gauge("nodeb_queue_capacity", "Stage queue sizes", ("queue",),
+                                collect=lambda: {(q.name,): q.maxsize for q in queues}))
+
+    def watch_processes(self, pids):
+        """pids: callable returning {process label: pid or None for this process}."""
+        def stats(index):
+            def collect():
+                values = {}
+                for label, pid in pids().items():
+                    result = process_stats(pid)
+                    if result is not None:
+                        values[(label,)] = result[index]
+                return values
+            return collect
+        self.registry.add(Gauge("nodeb_process_cpu_seconds_total", "User and system CPU time", ("process",),
+                                collect=stats(0), kind="counter"))
+        self.registry.add(Gauge("nodeb_process_resident_memory_bytes", "Resident set size", ("process",),
+                                collect=stats(1)))
+
+    def observe_scoring(self, timings):
+        """Records the per-batch timings reported by ModelScorer.score()."""
+        for stage in ("preprocess", "ort_run", "scoring"):
+            if stage in timings:
+                self.stage_seconds.observe(timings[stage], stage)
+        if "ort_run" in timings:
+            self.ort_seconds.inc(amount=timings["ort_run"])
+            self.ort_runs.inc()
+
+    def stage_done(self, stage, seconds, metadata):
+        self.stage_seconds.observe(seconds, stage)
+        self.reached(stage, metadata)
+
+    def reached(self, stage, metadata):
+        """Records how long after its arrival, and after Node A stamped it, a window got through `stage`."""
+        if not metadata:
+            return
+        now = time.time()
+        received_at = metadata.get("received_at")
+        if received_at is not None:
+            self.since_receive.observe(max(now - received_at, 0.0), stage)
+        timestamp_ms = metadata.get("timestamp_ms")
+        if timestamp_ms:
+            self.since_origin.observe(max(now - timestamp_ms / 1000.0, 0.0), stage)
@@ -0,0 +1,140 @@
+import time
+import threading
+import logging
+from collections import deque
+
+logger = logging.getLogger("NodeB.pipeline")
+
+# Overflow policies for BoundedQueue
+DROP_OLDEST = "drop_oldest"   # evict the head, keep the freshest data flowing
+DROP_NEWEST = "drop_newest"   # reject the incoming item, keep what is queued
+LATEST = "latest"             # keep only the most recent item
+POLICIES = (DROP_OLDEST, DROP_NEWEST, LATEST)
+
+
+class BoundedQueue:
+    """
+    Thread-safe FIFO joining two pipeline stages.
+
+    Unlike queue.Queue, put() never blocks: when the queue is full the
+    configured overflow policy decides what gets dropped, so a slow consumer
+    degrades into predictable loss instead of an unbounded backlog.
+
+    Items are whole messages (e.g. the (metadata, tensor) pair of a multipart
+    ZMQ message), so the "latest" policy is safe for multipart data, unlike
+    zmq.CONFLATE which operates on individual frames.
+    """
+
+    def __init__(self, maxsize, policy=DROP_OLDEST, name="queue", on_drop=None):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown overflow policy '{policy}', expected one of {POLICIES}")
+        if policy == LATEST:
+            maxsize = 1
+        self.maxsize = max(1, int(maxsize))
+        self.policy = policy
+        self.name = name
+        self.dropped = 0
+        # Called with every item dropped, e.g. to count drops per machine
+        self.on_drop = on_drop
+        self._items = deque()
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._items)
+
+    def put(self, item):
+        """
+        Enqueues an item. Returns False if an item was dropped to make room
+        (or the incoming item itself was rejected).
+        """
+        with self._cond:
+            accepted = True
+            if len(self._items) >= self.maxsize:
+                self.dropped += 1
+                accepted = False
+                if self.policy == DROP_NEWEST:
+                    if self.on_drop is not None:
+                        self.on_drop(item)
+                    return False
+                evicted = self._items.popleft()
+                if self.on_drop is not None:
+                    self.on_drop(evicted)
+            self._items.append(item)
+            self._cond.notify()
+            return accepted
+
+    def get(self, timeout=None):
+        """Returns the next item, or None if nothing arrived within timeout seconds."""
+        with self._cond:
+            if not self._items:
+                self._cond.wait(timeout)
+            if not self._items:
+                return None
+            return self._items.popleft()
+
+    def get_batch(self, max_items, max_wait, timeout=None):
+        """
+        Blocks up to timeout seconds for the first item, then keeps collecting
+        until max_items are gathered or max_wait seconds have passed since the
+        first one. Returns a (possibly empty) list.
+        """
+        first = self.get(timeout)
+        if first is None:
+            return []
+
+        batch = [first]
+        deadline = time.monotonic() + max_wait
+        with self._cond:
+            while len(batch) < max_items:
+                if self._items:
+                    batch.append(self._items.popleft())
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+        return batch
+
+
+class Stage(threading.Thread):
+    """
+    Runs `step()` in a loop on its own thread until the shared stop event is
+    set. Exceptions in a single step are logged and do not kill the stage.
+    """
+
+    def __init__(self, name, step, stop_event):
+        super().__init__(name=name, daemon=True)
+        self.step = step
+        self.stop_event = stop_event
+
+    def run(self):
+        logger.info(f"Stage '{self.name}' started")
+        while not self.stop_event.is_set():
+            try:
+                self.step()
+            except Exception as e:
+                logger.error(f"Stage '{self.name}' error: {e}")
+        logger.info(f"Stage '{self.name}' stopped")
+
+
+class DropReporter:
+    """Rate-limited warning when a queue starts shedding load."""
+
+    def __init__(self, queue, interval=5.0):
+        self.queue = queue
+        self.interval = interval
+        self._last_report = 0.0
+        self._last_count = 0
+
+    def check(self):
+        if self.queue.dropped == self._last_count:
+            return
+        now = time.monotonic()
+        if now - self._last_report >= self.interval:
+            logger.warning(
+                f"{self.queue.name}: dropped {self.queue.dropped - self._last_count} message(s) "
+                f"({self.queue.policy}, total {self.queue.dropped})"
+            )
+            self._last_report = now
+            self._last_count = self.queue.dropped
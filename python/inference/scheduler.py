@@ -0,0 +1,88 @@
+class ScoringScheduler:
+    """
+    Decides which incoming windows are worth scoring.
+
+    Once Node A's spectrogram ring is full it publishes a new 64-frame window
+    on every FFT hop, so consecutive windows overlap by 63/64. The scheduler
+    scores one window per stride (given in hops or milliseconds), drops
+    windows whose timestamp_ms was already seen, and - in escalate mode -
+    falls back to scoring every window while the last score of that machine
+    is above the escalation threshold.
+
+    should_score() runs on the receive stage and record() on the inference
+    stage; per-machine state is only ever updated field by field, so no lock
+    is needed.
+    """
+
+    def __init__(self, stride_hops=1, stride_ms=0.0, hop_ms=512 / 44100 * 1000,
+                 escalate=True, escalate_threshold=0.05):
+        self.hop_ms = hop_ms
+        self.stride_ms = stride_ms if stride_ms > 0 else max(1, stride_hops) * hop_ms
+        self.stride_hops = max(1, int(round(self.stride_ms / hop_ms)))
+        self.escalate = escalate
+        self.escalate_threshold = escalate_threshold
+        self.scored = 0
+        self.skipped = 0
+        self.duplicates = 0
+        self._state = {}
+
+    def _machine(self, key):
+        state = self._state.get(key)
+        if state is None:
+            state = self._state[key] = {
+                "last_ts": None,         # newest timestamp_ms seen
+                "last_scored_ts": None,  # timestamp_ms of the last scored window
+                "since_scored": 0,       # windows seen since the last scored one
+                "has_scored": False,
+                "escalated": False,
+                "counts": [0, 0, 0],     # scored, skipped, duplicates
+            }
+        return state
+
+    def counts(self):
+        """{key: (scored, skipped, duplicates)} per machine."""
+        return {key: tuple(state["counts"]) for key, state in list(self._state.items())}
+
+    def should_score(self, metadata, key="default"):
+        state = self._machine(key)
+        ts = metadata.get("timestamp_ms") if metadata else None
+
+        # Deduplicate re-delivered or out-of-order windows
+        if ts is not None and state["last_ts"] is not None and ts <= state["last_ts"]:
+            self.duplicates += 1
+            state["counts"][2] += 1
+            return False
+        if ts is not None:
+            state["last_ts"] = ts
+        state["since_scored"] += 1
+
+        if not state["has_scored"]:
+            due = True  # always score the first window of a machine
+        elif self.escalate and state["escalated"]:
+            due = True
+        elif ts is not None and state["last_scored_ts"] is not None:
+            # Half a hop of tolerance for timestamp jitter
+            due = ts - state["last_scored_ts"] >= self.stride_ms - self.hop_ms / 2
+        else:
+            due = state["since_scored"] >= self.stride_hops
+
+        if not due:
+            self.skipped += 1
+            state["counts"][1] += 1
+            return False
+
+        state["last_scored_ts"] = ts
+        state["since_scored"] = 0
+        state["has_scored"] = True
+        self.scored += 1
+        state["counts"][0] += 1
+        return True
+
+    def record(self, mse, key="default", threshold=None):
+        """
+        Feeds back the latest score so escalation can kick in (or end).
+        `threshold` overrides escalate_threshold, e.g. with the machine's own
+        LOW threshold.
+        """
+        threshold = self.escalate_threshold if threshold is None else threshold
+        self._machine(key)["escalated"] = mse > threshold
@@ -0,0 +1,155 @@
+import os
+import json
+import time
+import logging
+import numpy as np
+
+from inference.arena import InferenceArena, is_scoring_graph
+from inference.session import create_session
+
+logger = logging.getLogger("NodeB.scorer")
+
+
+class ModelScorer:
+    """
+    Owns the ONNX session and turns spectrogram tensors into reconstruction
+    MSE scores. Used by the in-process inference stage and by every worker
+    process, so both paths score identically.
+
+    With a scoring graph (export_onnx.py --scoring) the MSE comes straight
+    out of the session, together with the mean error per frequency band.
+    """
+
+    def __init__(self, model_path, max_batch=1, sample_shape=(1, 1024, 64), use_io_binding=True, warmup_runs=0):
+        self.sample_shape = tuple(sample_shape)
+        self.max_batch = max(1, int(max_batch))
+        self.ort_session = None
+        self.arena = None
+        # Durations (s) of the "preprocess", "ort_run" and "scoring" steps of the last score() call
+        self.timings = {}
+        # Scoring graphs only: band names, and {band: error} per tensor of the last score() call
+        self.scoring = False
+        self.band_names = []
+        self.band_errors = []
+
+        # Load ONNX Model
+        try:
+            if not os.path.exists(model_path):
+                logger.error(f"ONNX model not found at {model_path}")
+            else:
+                logger.info(f"Loading model from {model_path}")
+                self.ort_session = create_session(model_path)
+                self.input_name = self.ort_session.get_inputs()[0].name
+                self.scoring = is_scoring_graph(self.ort_session)
+                if self.scoring:
+                    self.band_names = self._band_names()
+                    logger.info(f"Scoring graph: MSE and band errors ({', '.join(self.band_names)}) from ORT")
+                if use_io_binding:
+                    self.arena = InferenceArena(self.ort_session, self.max_batch, self.sample_shape)
+                if warmup_runs > 0:
+                    self.warmup(warmup_runs)
+        except Exception as e:
+            logger.error(f"Error loading model: {e}")
+            self.ort_session = None
+            self.arena = None
+
+    def warmup(self, runs):
+        """
+        Runs a few inferences at batch size 1 and at the maximum batch size,
+        so lazy allocations and kernel selection happen before the first real
+        message rather than on it.
+        """
+        start = time.perf_counter()
+        dummy = np.zeros(int(np.prod(self.sample_shape)), dtype=np.float32)
+        sizes = sorted({1, self.max_batch})
+        for _ in range(runs):
+            for n in sizes:
+                self.score([dummy] * n)
+        logger.info(f"Warm-up: {runs} run(s) at batch sizes {sizes} in "
+                    f"{(time.perf_counter() - start) * 1000:.1f} ms")
+
+    def _band_names(self):
+        count = self.ort_session.get_outputs()[1].shape[1]
+        names = self.ort_session.get_modelmeta().custom_metadata_map.get("resonance.bands")
+        names = json.loads(names) if names else []
+        return names if len(names) == count else [f"band_{i}" for i in range(count)]
+
+    @property
+    def available(self):
+        return self.ort_session is not None
+
+    def preprocess(self, tensor_data):
+        try:
+            # Views only: the zero-copy receive buffer is not duplicated here
+            return tensor_data.reshape((1,) + self.sample_shape)
+        except Exception as e:
+            logger.error(f"Preprocessing error: {e}")
+            return None
+
+    def infer_batch(self, input_batch):
+        """
+        Runs a single ORT call over an (N, 1, 1024, 64) batch.
+        The model is exported with a dynamic batch axis, so N is free.
+        Returns the per-sample reconstruction MSE as an (N,) array, and the
+        (N, B) band errors (None unless this is a scoring graph).
+        """
+        start = time.perf_counter()
+        ort_outs = self.ort_session.run(None, {self.input_name: input_batch})
+        self.timings["ort_run"] = time.perf_counter() - start
+        if self.scoring:
+            return ort_outs[0], ort_outs[1]
+        reconstruction = ort_outs[0]
+        return np.mean((input_batch - reconstruction) ** 2, axis=(1, 2, 3)), None
+
+    def _bands(self, errors):
+        return dict(zip(self.band_names, errors.tolist()))
+
+    def score(self, tensors):
+        """
+        Scores a list of flat float32 tensors in one ORT call.
+        Returns one MSE per tensor; tensors that fail preprocessing (or all of
+        them, if no model is loaded) score 0.0. With a scoring graph,
+        `band_errors` holds a {band: error} dict per tensor (else None).
+        """
+        mse_values = [0.0] * len(tensors)
+        self.band_errors = [None] * len(tensors)
+        self.timings = {}
+        if not self.available:
+            return mse_values
+
+        # Preprocess & Inference
+        start = time.perf_counter()
+        if self.arena is not None:
+            valid = []
+            for i, tensor_data in enumerate(tensors):
+                input_tensor = self.preprocess(tensor_data)
+                if input_tensor is not None:
+                    self.arena.load(len(valid), input_tensor)
+                    valid.append(i)
+            preprocessed = time.perf_counter()
+            if valid:
+                batch_mse = self.arena.run(len(valid))
+                self.timings["ort_run"] = self.arena.ort_seconds
+                for i, mse in zip(valid, batch_mse):
+                    mse_values[i] = float(mse)
+                if self.scoring:
+                    for i, errors in zip(valid, self.arena.bands):
+                        self.band_errors[i] = self._bands(errors)
+        else:
+            inputs = [self.preprocess(tensor_data) for tensor_data in tensors]
+            valid = [i for i, t in enumerate(inputs) if t is not None]
+            if valid:
+                input_batch = np.concatenate([inputs[i] for i in valid], axis=0)
+            preprocessed = time.perf_counter()
+            if valid:
+                batch_mse, batch_bands = self.infer_batch(input_batch)
+                for i, mse in zip(valid, batch_mse):
+                    mse_values[i] = float(mse)
+                if batch_bands is not None:
+                    for i, errors in zip(valid, batch_bands):
+                        self.band_errors[i] = self._bands(errors)
+
+        self.timings["preprocess"] = preprocessed - start
+        if "ort_run" in self.timings:
+            self.timings["scoring"] = time.perf_counter() - preprocessed - self.timings["ort_run"]
+        return mse_values
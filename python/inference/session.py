@@ -0,0 +1,107 @@
+import os
+import zlib
+import logging
+import onnxruntime as ort
+
+from utils import config
+
+logger = logging.getLogger("NodeB.session")
+
+GRAPH_OPT_LEVELS = {
+    "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+EXECUTION_MODES = {
+    "sequential": ort.ExecutionMode.ORT_SEQUENTIAL,
+    "parallel": ort.ExecutionMode.ORT_PARALLEL,
+}
+
+
+def resolve_providers(requested):
+    """Keeps the requested execution providers that this ORT build supports."""
+    available = ort.get_available_providers()
+    providers = [p for p in requested if p in available]
+    for p in requested:
+        if p not in available:
+            logger.warning(f"Execution provider {p} not available (have: {', '.join(available)})")
+    return providers or ["CPUExecutionProvider"]
+
+
+def cached_model_path(model_path, opt_level, providers, fmt):
+    """
+    Path of the optimized graph stored next to the source model. The name
+    encodes the optimization level plus a signature of the providers and ORT
+    version, since the optimized graph is specific to both.
+    """
+    stem, _ = os.path.splitext(model_path)
+    sig = zlib.crc32(f"{','.join(providers)}|{ort.__version__}".encode('utf-8'))
+    ext = ".ort" if fmt == "ort" else ".onnx"
+    return f"{stem}.opt-{opt_level}-{sig:08x}{ext}"
+
+
+def session_options(opt_level):
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = config.ORT_INTRA_OP_THREADS
+    options.inter_op_num_threads = config.ORT_INTER_OP_THREADS
+    options.execution_mode = EXECUTION_MODES[config.ORT_EXECUTION_MODE]
+    options.graph_optimization_level = GRAPH_OPT_LEVELS[opt_level]
+    return options
+
+
+def create_session(model_path):
+    """
+    Creates the ORT session using the settings in utils/config.py.
+
+    With ORT_MODEL_CACHE enabled the optimized graph is saved next to the
+    ONNX file on the first start and loaded directly on later starts (graph
+    optimizations are then skipped, as they are already baked in). The cache
+    is rebuilt whenever the source model is newer than it, or if it fails to
+    load. It is written under a per-process temporary name and renamed into
+    place, so inference workers starting together never see a partial file.
+    """
+    opt_level = config.ORT_GRAPH_OPT_LEVEL
+    providers = resolve_providers(config.ORT_PROVIDERS)
+    logger.info(f"ORT session: providers={providers}, opt={opt_level}, mode={config.ORT_EXECUTION_MODE}, "
+                f"intra_op={config.ORT_INTRA_OP_THREADS or 'auto'}, inter_op={config.ORT_INTER_OP_THREADS or 'auto'}")
+
+    if not config.ORT_MODEL_CACHE or opt_level == "disable":
+        return ort.InferenceSession(model_path, sess_options=session_options(opt_level), providers=providers)
+
+    cache_path = cached_model_path(model_path, opt_level, providers, config.ORT_MODEL_CACHE_FORMAT)
+    if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(model_path):
+        logger.info(f"Using optimized model cache {cache_path}")
+        try:
+            return ort.InferenceSession(cache_path, sess_options=session_options("disable"), providers=providers)
+        except Exception as e:
+            logger.warning(f"Optimized model cache {cache_path} failed to load ({e}), rebuilding it")
+            try:
+                os.remove(cache_path)
+            except OSError:
+                pass
+
+    if not os.access(os.path.dirname(cache_path) or ".", os.W_OK):
+        logger.warning("Model directory not writable, optimized model cache disabled")
+        return ort.InferenceSession(model_path, sess_options=session_options(opt_level), providers=providers)
+
+    # Same extension as the cache, so ORT picks the same format
+    stem, ext = os.path.splitext(cache_path)
+    tmp_path = f"{stem}.tmp{os.getpid()}{ext}"
+    options = session_options(opt_level)
+    options.optimized_model_filepath = tmp_path
+    if config.ORT_MODEL_CACHE_FORMAT == "ort":
+        options.add_session_config_entry("session.save_model_format", "ORT")
+    logger.info(f"Saving optimized model to {cache_path}")
+    try:
+        session = ort.InferenceSession(model_path, sess_options=options, providers=providers)
+        try:
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            logger.warning(f"Could not store optimized model cache {cache_path}: {e}")
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return session
+
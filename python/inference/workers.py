@@ -0,0 +1,281 @@
+import time
+import queue
+import zlib
+import logging
+import threading
+import itertools
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+
+import numpy as np
+
+from inference.scorer import ModelScorer
+
+logger = logging.getLogger("NodeB.workers")
+
+
+class SharedTensorRing:
+    """
+    Fixed number of float32 tensor slots in a multiprocessing.shared_memory
+    block. The parent writes a tensor into a free slot and only sends the slot
+    index to the worker, so tensors never go through pickling.
+    Free-slot bookkeeping lives in the parent only.
+    """
+
+    def __init__(self, slots, shape, name=None):
+        self.slots = slots
+        self.shape = tuple(shape)
+        nbytes = slots * int(np.prod(self.shape)) * np.dtype(np.float32).itemsize
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=nbytes)
+            self.owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+        self.array = np.ndarray((slots,) + self.shape, dtype=np.float32, buffer=self.shm.buf)
+        self._free = list(range(slots))
+        self._lock = threading.Lock()
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def acquire(self):
+        """Returns a free slot index, or None if the ring is full."""
+        with self._lock:
+            return self._free.pop() if self._free else None
+
+    def release(self, slot):
+        with self._lock:
+            self._free.append(slot)
+
+    def reset(self):
+        """Marks every slot free again (the worker reading them is gone)."""
+        with self._lock:
+            self._free = list(range(self.slots))
+
+    def write(self, slot, tensor):
+        np.copyto(self.array[slot], tensor.reshape(self.shape))
+
+    def close(self):
+        del self.array
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def worker_main(worker_id, shm_name, slots, shape, task_queue, result_conn,
+                model_path, max_batch, max_wait, use_io_binding, warmup_runs, log_level):
+    """
+    Worker process entry point: scores tensors from its shared-memory ring
+    and reports (token, mse, band_errors) tuples, plus the batch's scorer timings, back to
+    the parent over its own pipe.
+    A None task is the shutdown signal.
+    """
+    logging.basicConfig(
+        level=getattr(logging, log_level),
+        format='%(asctime)s - %(processName)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    ring = SharedTensorRing(slots, shape, name=shm_name)
+
+    scorer = ModelScorer(model_path, max_batch=max_batch, sample_shape=shape,
+                         use_io_binding=use_io_binding, warmup_runs=warmup_runs)
+    result_conn.send(("ready", worker_id))
+
+    parent = mp.parent_process()
+    running = True
+    while running:
+        try:
+            task = task_queue.get(timeout=1.0)
+        except queue.Empty:
+            # Exit on our own if Node B died without sending the shutdown signal
+            if parent is not None and not parent.is_alive():
+                break
+            continue
+        if task is None:
+            break
+        batch = [task]
+        deadline = time.monotonic() + max_wait
+        while len(batch) < max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                task = task_queue.get(timeout=remaining) if remaining > 0 else task_queue.get_nowait()
+            except queue.Empty:
+                break
+            if task is None:
+                running = False
+                break
+            batch.append(task)
+
+        mse_values = scorer.score([ring.array[slot] for _, slot in batch])
+        result_conn.send(([(token, mse, bands) for (token, _), mse, bands
+                           in zip(batch, mse_values, scorer.band_errors)], scorer.timings))
+
+    ring.close()
+
+
+class WorkerPool:
+    """
+    Shards machines across inference worker processes.
+
+    Every worker has its own SharedTensorRing and task queue; a machine is
+    always routed to the same worker (crc32 of its machine_id), so per-worker
+    batches stay warm and ordering per machine is preserved. Every worker
+    sends its results over its own pipe, which the parent merges into one
+    stream.
+
+    A worker that dies is restarted by check_workers() on the same ring,
+    with a new task queue and pipe (it may have died holding their locks or
+    halfway through a message); the windows it had queued are lost. After `max_restarts` restarts in total
+    the pool gives up and check_workers() raises.
+    """
+
+    def __init__(self, workers, slots, shape, model_path, max_batch=1, max_wait=0.02,
+                 use_io_binding=True, warmup_runs=0, log_level="INFO", max_restarts=3):
+        # spawn: the parent already holds ZMQ sockets and threads, which must
+        # not be inherited through fork.
+        self._ctx = mp.get_context("spawn")
+        self.slots = slots
+        self.shape = shape
+        self.max_restarts = max_restarts
+        self.restarts = 0
+        self._worker_args = (model_path, max_batch, max_wait, use_io_binding, warmup_runs, log_level)
+        self.rings = []
+        self.task_queues = []
+        self.result_conns = []
+        self.processes = []
+        self._pending = {}
+        # Guards the rings, _pending and the queues against check_workers() replacing a worker
+        self._lock = threading.Lock()
+        self._tokens = itertools.count()
+        # Worker whose pipe results() reads first, rotated so none is starved
+        self._turn = 0
+        # Scorer timings of the batch last returned by results()
+        self.timings = {}
+
+        for worker_id in range(workers):
+            self.rings.append(SharedTensorRing(slots, shape))
+            self.task_queues.append(None)
+            self.result_conns.append(None)
+            self.processes.append(None)
+            self._start_worker(worker_id)
+
+        # Wait for every worker to load and warm up its model before accepting traffic
+        deadline = time.monotonic() + 120
+        for conn in self.result_conns:
+            try:
+                if not conn.poll(max(deadline - time.monotonic(), 0)):
+                    raise EOFError
+                _, worker_id = conn.recv()
+            except (EOFError, OSError):
+                self.close()
+                raise RuntimeError("Inference workers did not start in time")
+            logger.info(f"Worker {worker_id} ready")
+
+    def _start_worker(self, worker_id):
+        task_queue = self._ctx.Queue()
+        reader, writer = self._ctx.Pipe(duplex=False)
+        proc = self._ctx.Process(
+            target=worker_main,
+            args=(worker_id, self.rings[worker_id].name, self.slots, self.shape, task_queue,
+                  writer) + self._worker_args,
+            name=f"nodeb-worker-{worker_id}",
+            daemon=True,
+        )
+        proc.start()
+        # Only the worker writes, so the pipe reports EOF once it is gone
+        writer.close()
+        self.task_queues[worker_id] = task_queue
+        self.result_conns[worker_id] = reader
+        self.processes[worker_id] = proc
+
+    def shard(self, machine_id):
+        return zlib.crc32(str(machine_id).encode('utf-8')) % len(self.processes)
+
+    def submit(self, metadata, raw_data):
+        """
+        Copies the tensor into the owning worker's ring and queues it.
+        Returns False if that worker's ring is full (the message is dropped).
+        """
+        worker = self.shard(metadata.get("machine_id"))
+        with self._lock:
+            ring = self.rings[worker]
+            slot = ring.acquire()
+            if slot is None:
+                return False
+            ring.write(slot, raw_data)
+            token = next(self._tokens)
+            self._pending[token] = (worker, slot, metadata, raw_data)
+            self.task_queues[worker].put((token, slot))
+        return True
+
+    def results(self, timeout):
+        """
+        Waits up to timeout seconds for a batch of worker results.
+        Returns a list of (metadata, raw_data, mse, band_errors) and frees their slots.
+        """
+        workers = len(self.processes)
+        self._turn = (self._turn + 1) % workers
+        # Dead workers are left to check_workers(); their pipes would only report EOF
+        conns = [self.result_conns[w] for w in ((self._turn + i) % workers for i in range(workers))
+                 if self.processes[w].is_alive()]
+        ready = wait(conns, timeout)
+        if not ready:
+            return []
+        try:
+            batch, timings = next(conn for conn in conns if conn in ready).recv()
+        except (EOFError, OSError):
+            return []
+        if batch == "ready":
+            logger.info(f"Worker {timings} ready")
+            return []
+        self.timings = timings
+
+        results = []
+        with self._lock:
+            for token, mse, bands in batch:
+                # Tokens written off by check_workers() no longer have a slot
+                entry = self._pending.pop(token, None)
+                if entry is None:
+                    continue
+                worker, slot, metadata, raw_data = entry
+                self.rings[worker].release(slot)
+                results.append((metadata, raw_data, mse, bands))
+        return results
+
+    def check_workers(self):
+        """
+        Restarts dead workers. Returns the metadata of the windows they had
+        queued, which are lost; raises RuntimeError once more than
+        `max_restarts` restarts were needed.
+        """
+        lost = []
+        for worker_id, proc in enumerate(self.processes):
+            if proc.is_alive():
+                continue
+            with self._lock:
+                tokens = [t for t, entry in self._pending.items() if entry[0] == worker_id]
+                lost += [self._pending.pop(t)[2] for t in tokens]
+                self.rings[worker_id].reset()
+                if self.restarts >= self.max_restarts:
+                    raise RuntimeError(f"Worker {worker_id} exited with code {proc.exitcode} after "
+                                       f"{self.restarts} restart(s); giving up")
+                self.restarts += 1
+                logger.error(f"Worker {worker_id} exited with code {proc.exitcode}, restarting it "
+                             f"({len(tokens)} queued window(s) lost, restart {self.restarts}/{self.max_restarts})")
+                self._start_worker(worker_id)
+        return lost
+
+    def close(self):
+        for task_queue in self.task_queues:
+            task_queue.put(None)
+        for proc in self.processes:
+            proc.join(timeout=2.0)
+            if proc.is_alive():
+                proc.terminate()
+        for conn in self.result_conns:
+            conn.close()
+        for ring in self.rings:
+            ring.close()
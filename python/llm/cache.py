@@ -0,0 +1,105 @@
+import os
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+TEMPLATES_VERSION = 1
+
+
+class AlertTextCache:
+    """
+    In-memory LRU of generated alert texts keyed on (severity, fault,
+    language). Entries expire `ttl` seconds after they were stored, so
+    phrasings get refreshed now and then; ttl=0 keeps them until evicted.
+    """
+
+    def __init__(self, max_size=256, ttl=3600.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (text, stored_at)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl and time.monotonic() - entry[1] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, text):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (text, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+class TemplateTable:
+    """
+    Persisted alert phrasings generated ahead of time (see llm/templates.py),
+    so the first alert after a restart does not wait for the model.
+    Stored as JSON: {"version", "entries": [{severity, fault, language, text, model}]}.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._entries = {}
+        self._lock = threading.Lock()
+        if path:
+            self.load(path)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        return entry["text"] if entry else None
+
+    def put(self, key, text, model=None):
+        severity, fault, language = key
+        with self._lock:
+            self._entries[key] = {"severity": severity, "fault": fault, "language": language,
+                                  "text": text, "model": model}
+
+    def load(self, path):
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != TEMPLATES_VERSION:
+                raise ValueError(f"unsupported version {data.get('version')}")
+            with self._lock:
+                for entry in data.get("entries", []):
+                    self._entries[(entry["severity"], entry["fault"], entry["language"])] = entry
+            logging.info(f"Loaded {len(self._entries)} alert template(s) from {path}")
+        except FileNotFoundError:
+            logging.info(f"No alert templates at {path}")
+        except Exception as e:
+            logging.error(f"Error loading alert templates {path}: {e}")
+
+    def save(self, path=None):
+        path = path or self.path
+        with self._lock:
+            data = {"version": TEMPLATES_VERSION, "entries": list(self._entries.values())}
+        # Write then rename, so a crash mid-save keeps the previous table
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
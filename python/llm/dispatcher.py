@@ -0,0 +1,170 @@
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+SEVERITY_RANK = {"NORMAL": 0, "LOW": 1, "MEDIUM": 2, "HIGH": 3}
+
+
+class AlertDispatcher:
+    """
+    Generates LLM alerts on a background thread so scoring never waits on
+    Ollama.
+
+    submit() returns at once. Per machine there is at most one request in
+    flight and one pending: alerts arriving meanwhile (or within `cooldown`
+    seconds of a finished one) are coalesced into it unless they are more
+    severe. Generated text is passed to `emit` as alert update messages,
+    throttled to one per `update_interval` while streaming, plus a final one
+    with done=True. If Ollama is unreachable, the connection is re-checked
+    every `retry_interval` seconds and alerts keep their fallback text.
+
+    Texts found in the handler's cache or template table are returned by
+    submit() directly. Templates listed in `prefill` and missing from the
+    table are generated while the dispatcher is otherwise idle.
+    """
+
+    def __init__(self, handler, emit, stream=True, update_interval=0.1, cooldown=30.0, retry_interval=30.0,
+                 prefill=None):
+        self.handler = handler
+        self.emit = emit
+        self.stream = stream
+        self.update_interval = update_interval
+        self.cooldown = cooldown
+        self.retry_interval = retry_interval
+        # Detail dicts whose templates are generated while no alert is pending
+        self.prefill = list(prefill or [])
+        self.available = None          # unknown until the first connection check
+        self.coalesced = 0
+        self.generated = 0
+        self.failed = 0
+        self._pending = OrderedDict()  # machine_id -> request
+        self._in_flight = None
+        self._recent = {}              # machine_id -> finished request
+        self._last_check = float("-inf")
+        self._cond = threading.Condition()
+        self._stop = False
+        self._thread = threading.Thread(target=self._run, name="alerts", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def close(self, timeout=2.0):
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
+        self._thread.join(timeout=timeout)
+
+    def submit(self, machine_id, mse, severity, sequence):
+        """
+        Requests an alert for a scored window. Returns (alert_id, text): the
+        alert the window belongs to and its text if already generated, or
+        (None, None) if the LLM is known to be unavailable.
+        """
+        # Cached and pre-generated texts are served at once, even if Ollama is down
+        text = self.handler.cached_alert({"severity": severity})
+        if text is not None:
+            return None, text
+        if self.available is False:
+            return None, None
+        rank = SEVERITY_RANK.get(severity, 0)
+        with self._cond:
+            for request in (self._in_flight, self._pending.get(machine_id)):
+                if request is not None and request["machine_id"] == machine_id and rank <= request["rank"]:
+                    self.coalesced += 1
+                    return request["alert_id"], None
+            recent = self._recent.get(machine_id)
+            if (recent is not None and rank <= recent["rank"]
+                    and time.monotonic() - recent["finished"] < self.cooldown):
+                self.coalesced += 1
+                return recent["alert_id"], recent["text"]
+
+            # A more severe pending alert replaces the queued one
+            request = {
+                "alert_id": f"{machine_id}-{sequence}",
+                "machine_id": machine_id,
+                "mse": mse,
+                "severity": severity,
+                "rank": rank,
+            }
+            self._pending[machine_id] = request
+            self._cond.notify()
+            return request["alert_id"], None
+
+    def _run(self):
+        while True:
+            if not self.available and time.monotonic() - self._last_check >= self.retry_interval:
+                self._last_check = time.monotonic()
+                self.available = self.handler.check_connection()
+            with self._cond:
+                if not self._pending and not self._stop and not (self.available and self.prefill):
+                    # While Ollama is down, wake up periodically to re-check it
+                    self._cond.wait(timeout=None if self.available else self.retry_interval)
+                if self._stop:
+                    return
+                request = self._pending.popitem(last=False)[1] if self._pending else None
+                self._in_flight = request
+            if request is None:
+                # Idle: pre-generate one missing template, live alerts go first
+                if self.available and self.prefill:
+                    self._fill_template(self.prefill.pop(0))
+                continue
+
+            if self.available:
+                self._generate(request)
+            with self._cond:
+                self._in_flight = None
+                if "text" in request:
+                    request["finished"] = time.monotonic()
+                    self._recent[request["machine_id"]] = request
+
+    def _generate(self, request):
+        details = {"machine_id": request["machine_id"], "severity": request["severity"]}
+        text = ""
+        last_update = 0.0
+        try:
+            if self.stream:
+                for chunk in self.handler.stream_alert(request["mse"], details):
+                    text += chunk
+                    now = time.monotonic()
+                    if now - last_update >= self.update_interval:
+                        last_update = now
+                        self._publish(request, text, done=False)
+            else:
+                text = self.handler.generate_alert(request["mse"], details)
+            text = text.strip()
+            self.generated += 1
+        except Exception as e:
+            logging.error(f"Failed to query LLM for {request['machine_id']}: {e}")
+            self.failed += 1
+            text = None
+            # Stop queueing requests if Ollama went away; _run re-checks it
+            self._last_check = time.monotonic()
+            self.available = self.handler.check_connection()
+        request["text"] = text or self.handler.fallback_text(request["severity"])
+        self._publish(request, request["text"], done=True, error=text is None)
+
+    def _fill_template(self, details):
+        templates = self.handler.templates
+        key = self.handler.alert_key(details)
+        if templates is None or key in templates:
+            return
+        try:
+            templates.put(key, self.handler.request_alert(details), model=self.handler.model)
+            templates.save()
+            logging.info(f"Pre-generated alert template {key}")
+        except Exception as e:
+            logging.error(f"Failed to pre-generate alert template {key}: {e}")
+            self._last_check = time.monotonic()
+            self.available = self.handler.check_connection()
+
+    def _publish(self, request, text, done, error=False):
+        self.emit({
+            "type": "alert_update",
+            "alert_id": request["alert_id"],
+            "machine_id": request["machine_id"],
+            "severity": request["severity"],
+            "alert": text,
+            "done": done,
+            "error": error,
+        })
@@ -3,60 +3,148 @@ import json
 import logging
 import time
 
+# Fault descriptor used when the detector does not name one
+DEFAULT_FAULT = "Harmonic distortion detected"
+
 class LLMHandler:
-    def __init__(self, url="http://localhost:11434/api/generate", model="llama3"):
+    """
+    Talks to Ollama over a single pooled HTTP session, so repeated alerts
+    and connection checks reuse the same keep-alive connection. Alert texts
+    are looked up in an optional AlertTextCache and TemplateTable (see
+    llm/cache.py) before anything is generated.
+    """
+
+    def __init__(self, url="http://localhost:11434/api/generate", model="llama3", timeout=30.0,
+                 language="English", cache=None, templates=None):
         self.url = url
         self.model = model
-        
-    def check_connection(self):
+        self.timeout = timeout
+        self.language = language
+        # Tier 1: in-memory LRU of generated texts; tier 2: persisted templates
+        self.cache = cache
+        self.templates = templates
+        self.session = requests.Session()
+
+    def check_connection(self, timeout=2.0):
         try:
             # Test connection to Ollama
-            response = requests.get(self.url.replace("/api/generate", "/"))
+            response = self.session.get(self.url.replace("/api/generate", "/"), timeout=timeout)
             if response.status_code == 200:
                 logging.info(f"Connected to Ollama at {self.url}")
                 return True
             return False
-        except requests.exceptions.ConnectionError:
+        except requests.exceptions.RequestException:
             logging.warning(f"Could not connect to Ollama at {self.url}. LLM features will be disabled.")
             return False
 
-    def generate_alert(self, anomaly_score, detection_details):
+    @staticmethod
+    def fallback_text(severity):
+        """Shown until (or instead of, if it fails) the LLM's alert."""
+        return f"FAULT DETECTED (Severity: {severity}). Check machine immediately."
+
+    def alert_key(self, detection_details):
         """
-        Generates a worker-friendly alert using the local LLM.
+        (severity, fault, language): everything the alert text depends on.
+        The prompt leaves out machine names and scores, so texts are shared
+        by every anomaly with the same key.
         """
-        prompt = f"""
+        return (
+            detection_details.get('severity', 'Unknown'),
+            detection_details.get('message', DEFAULT_FAULT),
+            detection_details.get('language', self.language),
+        )
+
+    def cached_alert(self, detection_details):
+        """Alert text from the LRU cache or the pre-generated templates, or None."""
+        key = self.alert_key(detection_details)
+        text = self.cache.get(key) if self.cache is not None else None
+        if text is None and self.templates is not None:
+            text = self.templates.get(key)
+            if text is not None and self.cache is not None:
+                self.cache.put(key, text)
+        return text
+
+    def remember(self, detection_details, text):
+        if self.cache is not None and text:
+            self.cache.put(self.alert_key(detection_details), text)
+
+    def build_prompt(self, detection_details):
+        severity, fault, language = self.alert_key(detection_details)
+        return f"""
         You are an industrial AI assistant. 
         A machine fault has been detected.
         
         Technical Details:
-        - Reconstruction Error (MSE): {anomaly_score:.4f}
-        - Severity: {detection_details.get('severity', 'Unknown')}
-        - Message: {detection_details.get('message', 'Harmonic distortion detected')}
+        - Severity: {severity}
+        - Message: {fault}
         
         Task:
-        Translate this into a clear, concise instruction for a factory worker in English.
-        Do not explain the AI model. Focus on the physical check required.
+        Translate this into a clear, concise instruction for a factory worker in {language}.
+        Do not explain the AI model. Do not mention machine names or numbers. Focus on the physical check required.
         Example output: "High vibration detected. Please check the motor bearings immediately."
         """
-        
+
+    def request_alert(self, detection_details):
+        """One non-streaming generation, bypassing the caches. Raises on failure."""
         payload = {
             "model": self.model,
-            "prompt": prompt,
+            "prompt": self.build_prompt(detection_details),
             "stream": False
         }
-        
+        response = self.session.post(self.url, json=payload, timeout=self.timeout)
+        if response.status_code != 200:
+            raise RuntimeError(f"Ollama returned error: {response.text}")
+        return response.json().get("response", "").strip()
+
+    def generate_alert(self, anomaly_score, detection_details):
+        """
+        Generates a worker-friendly alert using the local LLM, unless an
+        alert for the same severity, fault and language is cached.
+        """
+        text = self.cached_alert(detection_details)
+        if text is not None:
+            return text
+
         try:
-            response = requests.post(self.url, json=payload, timeout=10) # 10s timeout
-            if response.status_code == 200:
-                response_json = response.json()
-                return response_json.get("response", "Alert generated but empty response.")
-            else:
-                logging.error(f"Ollama returned error: {response.text}")
-                return f"Error detecting fault: Severity {detection_details.get('severity')}. Please check machine."
-                
+            text = self.request_alert(detection_details)
+            self.remember(detection_details, text)
+            return text or "Alert generated but empty response."
         except Exception as e:
             logging.error(f"Failed to query LLM: {e}")
-            return f"FAULT DETECTED (Severity: {detection_details.get('severity')}). Check machine immediately."
+            return self.fallback_text(detection_details.get('severity'))
+
+    def stream_alert(self, anomaly_score, detection_details):
+        """
+        Yields the alert text in chunks as Ollama generates it (or the cached
+        text in one chunk), and caches the complete text.
+        Raises on connection or HTTP errors; the caller falls back.
+        """
+        text = self.cached_alert(detection_details)
+        if text is not None:
+            yield text
+            return
+
+        payload = {
+            "model": self.model,
+            "prompt": self.build_prompt(detection_details),
+            "stream": True
+        }
+        parts = []
+        # timeout bounds the connect and every read between chunks
+        with self.session.post(self.url, json=payload, timeout=self.timeout, stream=True) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    raise RuntimeError(chunk["error"])
+                if chunk.get("response"):
+                    parts.append(chunk["response"])
+                    yield chunk["response"]
+                # Read on past "done" to the end of the body, so the
+                # connection goes back to the session's pool
+        self.remember(detection_details, "".join(parts).strip())
 
 if __name__ == "__main__":
     # Test
@@ -0,0 +1,71 @@
+"""
+Pre-generates the alert template table, so alerts are served without a
+model call even right after a restart.
+
+    python python/llm/templates.py --languages English,Hindi,Marathi
+
+Only missing entries are generated unless --refresh is given. Node B can
+also fill missing entries in the background (ALERT_TEMPLATES_PREFILL=1).
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from utils import config
+from llm.cache import TemplateTable
+from llm.handler import LLMHandler, DEFAULT_FAULT
+
+# Severities that get an LLM alert (see InferenceNode.build_result)
+ALERT_SEVERITIES = ("MEDIUM", "HIGH")
+
+
+def template_details(languages, severities=ALERT_SEVERITIES, faults=(DEFAULT_FAULT,)):
+    """Detail dicts for every (severity, fault, language) combination."""
+    return [
+        {"severity": severity, "message": fault, "language": language}
+        for language in languages
+        for fault in faults
+        for severity in severities
+    ]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Pre-generate multilingual alert templates.")
+    parser.add_argument("--languages", default=",".join(config.ALERT_TEMPLATE_LANGUAGES),
+                        help="Comma-separated target languages")
+    parser.add_argument("--severities", default=",".join(ALERT_SEVERITIES))
+    parser.add_argument("--faults", default=DEFAULT_FAULT,
+                        help="Semicolon-separated fault descriptors")
+    parser.add_argument("--output", default=config.ALERT_TEMPLATES_PATH, help="Template table (JSON)")
+    parser.add_argument("--refresh", action="store_true", help="Regenerate entries that already exist")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args()
+    handler = LLMHandler(url=config.OLLAMA_URL, model=config.OLLAMA_MODEL, timeout=config.OLLAMA_TIMEOUT_S)
+    if not handler.check_connection():
+        sys.exit(1)
+
+    table = TemplateTable(args.output)
+    details = template_details(
+        [l.strip() for l in args.languages.split(",") if l.strip()],
+        [s.strip() for s in args.severities.split(",") if s.strip()],
+        [f.strip() for f in args.faults.split(";") if f.strip()],
+    )
+    for i, detail in enumerate(details, 1):
+        key = handler.alert_key(detail)
+        if key in table and not args.refresh:
+            continue
+        start = time.perf_counter()
+        try:
+            table.put(key, handler.request_alert(detail), model=handler.model)
+            table.save(args.output)
+            print(f"[{i}/{len(details)}] {key}: {time.perf_counter() - start:.1f}s")
+        except Exception as e:
+            print(f"[{i}/{len(details)}] {key}: FAILED ({e})")
+    print(f"{len(table)} template(s) in {args.output}")
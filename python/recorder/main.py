@@ -0,0 +1,116 @@
+"""
+Records the Node A spectrogram stream to disk for replay and offline
+analysis.
+
+    python python/recorder/main.py
+
+Every window is appended to the current segment in RECORDER_DIR (see
+recorder/segments.py for the format). Read recordings back with:
+
+    from recorder.segments import SegmentReader
+    for window in SegmentReader(config.RECORDER_DIR).windows(start_ms, end_ms):
+        window["timestamp_ms"], window["machine_id"], window["data"]
+"""
+import sys
+import os
+import time
+import signal
+import threading
+import logging
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from utils.zmq_receiver import ZMQSubscriber
+from utils import config
+from inference.pipeline import BoundedQueue, Stage, DropReporter
+from recorder.segments import SegmentWriter
+
+logging.basicConfig(
+    level=getattr(logging, config.LOG_LEVEL),
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("Recorder")
+
+
+class Recorder:
+    def __init__(self):
+        # Zero-copy receive: the tensor frame is only read once, by the writer
+        self.receiver = ZMQSubscriber(config.ZMQ_ENDPOINTS, copy=False, topics=config.ZMQ_TOPICS)
+        self.writer = SegmentWriter(
+            config.RECORDER_DIR,
+            bins=config.INPUT_SHAPE[1],
+            frames=config.INPUT_SHAPE[2],
+            dtype=config.RECORDER_DTYPE,
+            max_segment_bytes=int(config.RECORDER_SEGMENT_MB * 2**20),
+            max_segment_s=config.RECORDER_SEGMENT_S,
+            retention_bytes=int(config.RECORDER_RETENTION_GB * 2**30),
+            retention_s=config.RECORDER_RETENTION_H * 3600,
+            flush_s=config.RECORDER_FLUSH_S,
+        )
+        # Disk stalls must not back up into the SUB socket: the receive stage
+        # keeps draining Node A and the queue absorbs (then drops) the backlog
+        self.queue = BoundedQueue(config.RECORDER_QUEUE_SIZE, name="record_queue")
+        self.stop_event = threading.Event()
+
+    def receive_step(self):
+        metadata, raw_data = self.receiver.receive(timeout_ms=config.RECEIVE_POLL_MS)
+        if raw_data is not None:
+            self.queue.put((metadata, raw_data))
+        self.drops.check()
+
+    def write_step(self):
+        item = self.queue.get(timeout=config.RECEIVE_POLL_MS / 1000.0)
+        if item is None:
+            self.writer.flush()
+            return
+        try:
+            self.record(*item)
+        except Exception as e:
+            logger.error(f"Failed to record window: {e}")
+
+    def record(self, metadata, raw_data):
+        # Senders without a Node A timestamp are indexed by arrival time
+        timestamp_ms = metadata.get("timestamp_ms") or int(metadata.get("received_at", time.time()) * 1000)
+        self.writer.append(timestamp_ms, metadata.get("rms", 0.0), metadata["machine_id"], raw_data,
+                           seq=metadata.get("seq", 0))
+
+    def _terminate(self, signum, frame):
+        raise KeyboardInterrupt
+
+    def run(self):
+        logger.info(f"Recording Node A stream to {os.path.abspath(config.RECORDER_DIR)} ({config.RECORDER_DTYPE})")
+        self.drops = DropReporter(self.queue)
+        stages = [
+            Stage("receive", self.receive_step, self.stop_event),
+            Stage("write", self.write_step, self.stop_event),
+        ]
+        for stage in stages:
+            stage.start()
+        signal.signal(signal.SIGTERM, self._terminate)
+
+        start = time.monotonic()
+        try:
+            while all(stage.is_alive() for stage in stages):
+                time.sleep(0.5)
+        except KeyboardInterrupt:
+            logger.info("Stopping recorder...")
+        finally:
+            self.stop_event.set()
+            for stage in stages:
+                stage.join(timeout=2.0)
+            # Drain what was received before the stop
+            while True:
+                item = self.queue.get(timeout=0)
+                if item is None:
+                    break
+                self.record(*item)
+            self.writer.close()
+            self.receiver.close()
+            elapsed = time.monotonic() - start
+            logger.info(f"Recorded {self.writer.records_written} windows in {self.writer.segments_written} "
+                        f"segment(s) ({self.writer.records_written / max(elapsed, 1e-9):.1f}/s), "
+                        f"dropped: {self.queue.dropped}")
+
+
+if __name__ == "__main__":
+    Recorder().run()
@@ -0,0 +1,261 @@
+import os
+import glob
+import time
+import struct
+import logging
+import numpy as np
+
+logger = logging.getLogger("Recorder.segments")
+
+# Segment file layout
+# -------------------
+#   file header   SEGMENT_HEADER (16 bytes): magic, version, bins, frames,
+#                 dtype code, header size of a record
+#   records       fixed size, back to back:
+#                   timestamp_ms  int64    Node A timestamp
+#                   rms           float32
+#                   seq           uint32   per-sensor sequence (0 if unknown)
+#                   machine_id    32 bytes UTF-8, NUL padded
+#                   data          float16/float32 (bins, frames)
+#
+# Sidecar index (<segment>.idx): one little-endian int64 per record, the
+# running maximum of timestamp_ms. It is non-decreasing even when sensors
+# interleave slightly out of order, so time ranges are found with a binary
+# search; the exact timestamps are then checked on the records themselves.
+
+MAGIC = b"RSEG"
+VERSION = 1
+SEGMENT_HEADER = struct.Struct("<4sHHHBB4x")
+MACHINE_ID_BYTES = 32
+DTYPES = {1: "float16", 2: "float32"}
+DTYPE_CODES = {v: k for k, v in DTYPES.items()}
+SEGMENT_EXT = ".seg"
+INDEX_EXT = ".idx"
+
+
+def record_dtype(bins, frames, dtype="float16"):
+    return np.dtype([
+        ("timestamp_ms", "<i8"),
+        ("rms", "<f4"),
+        ("seq", "<u4"),
+        ("machine_id", f"S{MACHINE_ID_BYTES}"),
+        ("data", f"<{np.dtype(dtype).str[1:]}", (bins, frames)),
+    ])
+
+
+class SegmentWriter:
+    """
+    Appends windows to segment files in `directory`.
+
+    A new segment starts once the current one holds `max_segment_bytes` or
+    spans `max_segment_s` seconds of wall time. After each rotation the
+    oldest segments are deleted while the directory exceeds
+    `retention_bytes` or they are older than `retention_s` (0 disables
+    either limit). Writes are buffered and flushed every `flush_s` seconds,
+    so a crash loses at most that much; the reader ignores a torn tail.
+    """
+
+    def __init__(self, directory, bins=1024, frames=64, dtype="float16", prefix="segment",
+                 max_segment_bytes=256 * 2**20, max_segment_s=3600.0,
+                 retention_bytes=0, retention_s=0.0, flush_s=1.0):
+        if dtype not in DTYPE_CODES:
+            raise ValueError(f"Unsupported recording dtype '{dtype}'")
+        self.directory = directory
+        self.bins = bins
+        self.frames = frames
+        self.dtype = dtype
+        self.prefix = prefix
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segment_s = max_segment_s
+        self.retention_bytes = retention_bytes
+        self.retention_s = retention_s
+        self.flush_s = flush_s
+        self.record = record_dtype(bins, frames, dtype)
+        self.header_bytes = self.record.itemsize - self.record["data"].itemsize
+        self._header = struct.Struct(f"<qfI{MACHINE_ID_BYTES}s")
+        self.records_written = 0
+        self.segments_written = 0
+        self._file = None
+        self._index = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _open(self, timestamp_ms):
+        # Named after the first timestamp so segments sort chronologically
+        base = os.path.join(self.directory, f"{self.prefix}-{max(timestamp_ms, 0):015d}")
+        path = base + SEGMENT_EXT
+        suffix = 1
+        while os.path.exists(path):
+            path = f"{base}.{suffix}{SEGMENT_EXT}"
+            suffix += 1
+        self.path = path
+        self._file = open(path, "wb", buffering=4 * 2**20)
+        self._index = open(path + INDEX_EXT, "wb", buffering=64 * 2**10)
+        self._file.write(SEGMENT_HEADER.pack(MAGIC, VERSION, self.bins, self.frames,
+                                             DTYPE_CODES[self.dtype], self.header_bytes))
+        self._opened = time.monotonic()
+        self._last_flush = self._opened
+        self._bytes = SEGMENT_HEADER.size
+        self._max_ts = None
+        self.segments_written += 1
+        logger.info(f"Recording to {path}")
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._index.close()
+            self._file = self._index = None
+
+    def _rotate_due(self):
+        return (self._bytes + self.record.itemsize > self.max_segment_bytes
+                or (self.max_segment_s and time.monotonic() - self._opened >= self.max_segment_s))
+
+    def append(self, timestamp_ms, rms, machine_id, tensor, seq=0):
+        """Appends one (bins x frames) window; tensor may be any float array or buffer."""
+        timestamp_ms = int(timestamp_ms or 0)
+        if self._file is None or self._rotate_due():
+            self._close()
+            self._open(timestamp_ms)
+            self.enforce_retention()
+
+        values = np.asarray(tensor).reshape(self.bins, self.frames)
+        machine = str(machine_id).encode("utf-8")[:MACHINE_ID_BYTES]
+        self._file.write(self._header.pack(timestamp_ms, float(rms or 0.0), int(seq) & 0xFFFFFFFF, machine))
+        self._file.write(values.astype(self.dtype, copy=False).tobytes())
+        self._max_ts = timestamp_ms if self._max_ts is None else max(self._max_ts, timestamp_ms)
+        # Index entry after the record, so an entry never points past the data
+        self._index.write(struct.pack("<q", self._max_ts))
+        self._bytes += self.record.itemsize
+        self.records_written += 1
+
+        now = time.monotonic()
+        if now - self._last_flush >= self.flush_s:
+            self.flush()
+            self._last_flush = now
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+            self._index.flush()
+
+    def enforce_retention(self):
+        """Deletes the oldest closed segments beyond the size or age limit."""
+        if not self.retention_bytes and not self.retention_s:
+            return
+        segments = sorted(glob.glob(os.path.join(self.directory, f"{self.prefix}-*{SEGMENT_EXT}")))
+        sizes = {path: os.path.getsize(path) for path in segments}
+        total = sum(sizes.values())
+        now = time.time()
+        for path in segments:
+            if path == getattr(self, "path", None):
+                break
+            too_big = self.retention_bytes and total > self.retention_bytes
+            too_old = self.retention_s and now - os.path.getmtime(path) > self.retention_s
+            if not (too_big or too_old):
+                break
+            for victim in (path, path + INDEX_EXT):
+                if os.path.exists(victim):
+                    os.remove(victim)
+            total -= sizes[path]
+            logger.info(f"Retention: deleted {path}")
+
+    def close(self):
+        self._close()
+
+
+class Segment:
+    """A memory-mapped view of one segment file and its time index."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            magic, version, bins, frames, code, header_bytes = SEGMENT_HEADER.unpack(f.read(SEGMENT_HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} segment")
+        self.bins, self.frames, self.dtype = bins, frames, DTYPES[code]
+        record = record_dtype(bins, frames, self.dtype)
+
+        # Records (and index entries) may still be in flight on the last
+        # segment, or torn after a crash: only count complete pairs
+        index_path = path + INDEX_EXT
+        n_records = (os.path.getsize(path) - SEGMENT_HEADER.size) // record.itemsize
+        n_index = os.path.getsize(index_path) // 8 if os.path.exists(index_path) else 0
+        self.count = min(n_records, n_index)
+        if self.count:
+            self.records = np.memmap(path, dtype=record, mode="r", offset=SEGMENT_HEADER.size, shape=(self.count,))
+            self.index = np.memmap(index_path, dtype="<i8", mode="r", shape=(self.count,))
+        else:
+            self.records = np.empty(0, dtype=record)
+            self.index = np.empty(0, dtype="<i8")
+
+    @property
+    def start_ms(self):
+        return int(self.records["timestamp_ms"].min()) if self.count else None
+
+    @property
+    def end_ms(self):
+        return int(self.index[-1]) if self.count else None
+
+    def span(self, start_ms, end_ms, slack_ms=0):
+        """
+        (lo, hi) record positions covering [start_ms, end_ms): a binary search
+        on the running-max index. slack_ms extends hi for windows that
+        arrived up to that much later than newer ones.
+        """
+        lo = int(np.searchsorted(self.index, start_ms, side="left"))
+        hi = int(np.searchsorted(self.index, end_ms + slack_ms, side="left"))
+        return lo, hi
+
+
+class SegmentReader:
+    """
+    Reads recorded windows back. Every window returned is a view into a
+    memory-mapped segment: nothing is loaded until its data is touched.
+    """
+
+    def __init__(self, directory, prefix="segment", slack_ms=1000):
+        self.directory = directory
+        self.prefix = prefix
+        self.slack_ms = slack_ms
+
+    def segments(self):
+        paths = sorted(glob.glob(os.path.join(self.directory, f"{self.prefix}-*{SEGMENT_EXT}")))
+        segments = []
+        for path in paths:
+            try:
+                segment = Segment(path)
+            except Exception as e:
+                logger.warning(f"Skipping {path}: {e}")
+                continue
+            if segment.count:
+                segments.append(segment)
+        return segments
+
+    def ranges(self, start_ms, end_ms):
+        """
+        Per-segment contiguous record slices (zero-copy memmap views) that
+        contain every window in [start_ms, end_ms). Slices may include a few
+        neighbouring windows; filter on "timestamp_ms" for exact bounds.
+        """
+        slices = []
+        for segment in self.segments():
+            if segment.end_ms < start_ms:
+                continue
+            lo, hi = segment.span(start_ms, end_ms, self.slack_ms)
+            if hi > lo:
+                slices.append(segment.records[lo:hi])
+        return slices
+
+    def windows(self, start_ms, end_ms, machine_id=None):
+        """
+        Yields the records with start_ms <= timestamp_ms < end_ms (optionally
+        of one machine) as structured views with timestamp_ms, rms, seq,
+        machine_id and data fields.
+        """
+        machine = machine_id.encode("utf-8")[:MACHINE_ID_BYTES] if machine_id is not None else None
+        for records in self.ranges(start_ms, end_ms):
+            ts = records["timestamp_ms"]
+            mask = (ts >= start_ms) & (ts < end_ms)
+            if machine is not None:
+                mask &= records["machine_id"] == machine
+            for i in np.flatnonzero(mask):
+                yield records[i]
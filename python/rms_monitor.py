@@ -11,29 +11,41 @@ Usage
 -----
     python rms_monitor.py                     # default endpoint
     python rms_monitor.py tcp://192.168.1.5:5555   # custom endpoint
+    python rms_monitor.py --headless          # no display: stats to stdout
+    python rms_monitor.py --headless --log rms.csv   # … and to a rotating log
 
 Expected ZMQ multipart message (sent by broadcaster.cpp):
-    Frame 0  – JSON header  {"timestamp_ms": …, "bins": …, "frames": …, "dtype": "float32"}
+    Frame 0  – header  {"timestamp_ms": …, "seq": …, "bins": …, "frames": …, "dtype": "float32"}
+               (JSON, or a SpectrogramHeader from schema/spectrogram.proto)
     Frame 1  – raw float32 tensor bytes  (bins × frames floats)
 
 What to look for:
     • Tap sensor   → sharp RMS spike
     • Run motor    → sustained elevated RMS
     • Idle         → RMS ≈ 0
+
+Headless mode receives every message (nothing is conflated) and prints one
+line per --interval with the message rate, RMS min/mean/max, the
+inter-arrival jitter (mean/std/p99/max), the windows lost upstream (gaps in
+the header seq) and the latency since Node A stamped each window
+(mean/p99/max, including any clock offset between the hosts), so a sensor
+can be verified on the line without a display. With --log the same rows go to a CSV file (or, for
+a .bin path, fixed-size little-endian records, see STATS_RECORD) that is
+rotated once it reaches --rotate-mb, keeping --keep old files.
 """
 
-import sys
-import json
+import os
 import struct
 import math
 import time
+import argparse
 from collections import deque
 
+import numpy as np
 import zmq
-import matplotlib
-matplotlib.use("TkAgg")  # lightweight backend, no web server
-import matplotlib.pyplot as plt
-import matplotlib.animation as animation
+
+from utils.codec import decode_spectrogram_header
+from utils.tracing import SequenceTracker
 
 # ─── Configuration ───────────────────────────────────────────────────────────
 
@@ -41,13 +53,23 @@ DEFAULT_ENDPOINT = "tcp://127.0.0.1:5555"
 RING_SIZE        = 300        # number of samples kept in the scrolling window
 POLL_TIMEOUT_MS  = 10         # zmq.poll timeout  → <50 ms refresh target
 ANIM_INTERVAL_MS = 30         # matplotlib timer  → ~33 fps redraw
+X_WINDOW_S       = 15.0       # visible time span
+HEADLESS_HWM     = 10000      # headless: queue instead of dropping bursts
+
+# Binary stats log record: wall time (s), messages, rate (Hz),
+# rms min/mean/max, jitter mean/std/p99/max (ms), windows lost,
+# latency mean/p99/max (ms)
+STATS_RECORD = struct.Struct("<dIf3f4fI3f")
+STATS_FIELDS = ("time", "messages", "rate_hz", "rms_min", "rms_mean", "rms_max",
+                "jitter_mean_ms", "jitter_std_ms", "jitter_p99_ms", "jitter_max_ms",
+                "lost", "latency_mean_ms", "latency_p99_ms", "latency_max_ms")
 
 # ─── ZMQ Setup ───────────────────────────────────────────────────────────────
 # We use a SUB socket that subscribes to ALL messages (empty topic filter).
 # zmq.CONFLATE = 1 tells ZMQ to keep only the *latest* message in the receive
 # buffer, which prevents stale-data buildup when the plot can't keep up.
 
-def create_subscriber(endpoint: str) -> zmq.Socket:
+def create_subscriber(endpoint: str, hwm: int = 4) -> zmq.Socket:
     """Create and connect a ZMQ SUB socket to the broadcaster."""
     ctx = zmq.Context()
     sock = ctx.socket(zmq.SUB)
@@ -55,8 +77,9 @@ def create_subscriber(endpoint: str) -> zmq.Socket:
     # NOTE: zmq.CONFLATE cannot be used here — it is incompatible with
     # multipart messages (causes assertion `!_more` crash).  Instead we
     # keep RCVHWM small and drain all queued messages in poll_and_update(),
-    # always using only the latest value.
-    sock.setsockopt(zmq.RCVHWM, 4)            # small receive high-water mark
+    # always using only the latest value.  Headless mode passes a large hwm
+    # so every message is counted.
+    sock.setsockopt(zmq.RCVHWM, hwm)
     sock.connect(endpoint)
     print(f"[rms_monitor] SUB connected → {endpoint}")
     return sock
@@ -66,15 +89,34 @@ def create_subscriber(endpoint: str) -> zmq.Socket:
 # We compute RMS ourselves from the raw float32 tensor:
 #     RMS = sqrt( (1/N) * Σ x² )
 
-def compute_rms(raw_bytes: bytes, n_floats: int) -> float:
-    """Compute RMS from raw little-endian float32 tensor bytes."""
+def compute_rms(raw, n_floats: int) -> float:
+    """
+    Compute RMS from raw little-endian float32 tensor data. `raw` may be
+    bytes or any buffer (e.g. a zmq.Frame's); it is read in place.
+    """
     if n_floats == 0:
         return 0.0
-    # Unpack all floats at once (little-endian float32 = '<f')
-    fmt = f"<{n_floats}f"
-    values = struct.unpack(fmt, raw_bytes[:n_floats * 4])
-    sum_sq = sum(v * v for v in values)
-    return math.sqrt(sum_sq / n_floats)
+    values = np.frombuffer(raw, dtype="<f4", count=n_floats)
+    return math.sqrt(float(np.dot(values, values)) / n_floats)
+
+
+def parse_message(frames):
+    """Returns (header, rms) for a [header, tensor] message, or None if malformed."""
+    if len(frames) < 2:
+        return None   # malformed message, skip
+
+    # ── Parse header (Frame 0): SpectrogramHeader protobuf or legacy JSON ──
+    try:
+        header = decode_spectrogram_header(frames[0].bytes)
+    except Exception:
+        return None
+
+    # ── If header already contains an rms field, use it directly ──
+    if "rms" in header:
+        return header, float(header["rms"])
+    # Compute from raw tensor (Frame 1)
+    n_floats = header.get("bins", 0) * header.get("frames", 0)
+    return header, compute_rms(frames[1].buffer, n_floats)
 
 # ─── Ring Buffers ─────────────────────────────────────────────────────────────
 
@@ -84,38 +126,29 @@ time_buf = deque([0.0] * RING_SIZE, maxlen=RING_SIZE)   # x-axis: elapsed sec
 t_start     = time.monotonic()
 msg_count   = 0
 last_rms    = 0.0
+last_latency_ms = None
+sequences   = SequenceTracker()    # per machine_id: windows lost upstream
 
 # ─── Receive + Update ────────────────────────────────────────────────────────
 
 def poll_and_update(sock: zmq.Socket) -> None:
     """Non-blocking poll: drain all available messages, keep latest RMS."""
-    global msg_count, last_rms
+    global msg_count, last_rms, last_latency_ms
 
     while sock.poll(POLL_TIMEOUT_MS, zmq.POLLIN):
         try:
-            frames = sock.recv_multipart(zmq.NOBLOCK)
+            frames = sock.recv_multipart(zmq.NOBLOCK, copy=False)
         except zmq.Again:
             break
 
-        if len(frames) < 2:
-            continue   # malformed message, skip
-
-        # ── Parse JSON header (Frame 0) ──
-        try:
-            header = json.loads(frames[0])
-        except json.JSONDecodeError:
+        parsed = parse_message(frames)
+        if parsed is None:
             continue
-
-        bins   = header.get("bins", 0)
-        n_frames = header.get("frames", 0)
-        n_floats = bins * n_frames
-
-        # ── If header already contains an rms field, use it directly ──
-        if "rms" in header:
-            rms = float(header["rms"])
-        else:
-            # Compute from raw tensor (Frame 1)
-            rms = compute_rms(frames[1], n_floats)
+        header, rms = parsed
+        # The small RCVHWM drops bursts here, so "lost" includes our own drops
+        _, latency_ms = sequences.update(header.get("machine_id"), header.get("seq"), header.get("timestamp_ms"))
+        if latency_ms is not None:
+            last_latency_ms = latency_ms
 
         last_rms = rms
         msg_count += 1
@@ -128,6 +161,8 @@ def poll_and_update(sock: zmq.Socket) -> None:
 
 def build_figure():
     """Create the matplotlib figure and axes."""
+    import matplotlib.pyplot as plt
+
     fig, ax = plt.subplots(figsize=(10, 4))
     fig.patch.set_facecolor("#1e1e2e")
     ax.set_facecolor("#1e1e2e")
@@ -143,6 +178,8 @@ def build_figure():
         spine.set_color("#313244")
 
     ax.grid(True, color="#313244", linewidth=0.5, alpha=0.6)
+    ax.set_xlim(0, X_WINDOW_S)
+    ax.set_ylim(0, 0.01)
 
     # Status text (top-left corner)
     status_text = ax.text(
@@ -154,39 +191,210 @@ def build_figure():
     return fig, ax, line, status_text
 
 
+def nice_ceil(value: float) -> float:
+    """Smallest 1/2/5 × 10^k step that is >= value."""
+    if value <= 0:
+        return 0.01
+    exponent = math.floor(math.log10(value))
+    for step in (1, 2, 5, 10):
+        if step * 10 ** exponent >= value:
+            return step * 10 ** exponent
+
+
 def make_update_fn(sock, ax, line, status_text):
-    """Return the animation callback bound to the socket + plot elements."""
+    """
+    Return the animation callback bound to the socket + plot elements.
+
+    Frames are blitted: only the line and status text are redrawn. Axis
+    limits move in steps (x by half a window once the data reaches the right
+    edge, y to the next 1/2/5 step when the data outgrows it or falls below a
+    quarter of it), and only those steps trigger a full redraw.
+    """
 
     def update(_frame_number):
         poll_and_update(sock)
 
-        xs = list(time_buf)
-        ys = list(rms_buf)
+        xs = np.fromiter(time_buf, dtype=float, count=len(time_buf))
+        ys = np.fromiter(rms_buf, dtype=float, count=len(rms_buf))
         line.set_data(xs, ys)
 
-        if xs[-1] > 0:
-            ax.set_xlim(max(0, xs[-1] - 15), xs[-1] + 0.5)
-
-        if ys:
-            y_max = max(ys) * 1.25 or 0.01
-            ax.set_ylim(0, y_max)
-
+        rescale = False
+        x_min, x_max = ax.get_xlim()
+        if xs[-1] > x_max:
+            x_max = xs[-1] + X_WINDOW_S / 2
+            ax.set_xlim(x_max - X_WINDOW_S, x_max)
+            rescale = True
+
+        visible = ys[xs >= ax.get_xlim()[0]]
+        y_peak = float(visible.max()) * 1.25 if visible.size else 0.0
+        y_max = ax.get_ylim()[1]
+        if y_peak > y_max or (y_peak < y_max / 4 and y_max > 0.01):
+            ax.set_ylim(0, nice_ceil(y_peak))
+            rescale = True
+
+        if rescale:
+            # New ticks: redraw the static background once, blitting resumes
+            ax.figure.canvas.draw()
+
+        latency = f"{last_latency_ms:.1f} ms" if last_latency_ms is not None else "n/a"
         status_text.set_text(
-            f"msgs: {msg_count:>6}   rms: {last_rms:.6f}"
+            f"msgs: {msg_count:>6}   rms: {last_rms:.6f}   "
+            f"lost: {sequences.totals()['lost']}   latency: {latency}"
         )
         return (line, status_text)
 
     return update
 
+# ─── Headless Mode ───────────────────────────────────────────────────────────
+
+class RotatingStatsLog:
+    """Stats rows to a CSV (or binary, for *.bin) file, rotated by size."""
+
+    def __init__(self, path: str, max_bytes: int, keep: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.keep = keep
+        self.binary = path.endswith(".bin")
+        self.file = None
+        self._open()
+
+    def _open(self):
+        new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        self.file = open(self.path, "ab" if self.binary else "a")
+        if new and not self.binary:
+            self.file.write(",".join(STATS_FIELDS) + "\n")
+            self.file.flush()
+
+    def _rotate(self):
+        self.file.close()
+        for i in range(self.keep - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.keep > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._open()
+
+    def write(self, row):
+        if self.binary:
+            self.file.write(STATS_RECORD.pack(*row))
+        else:
+            self.file.write(f"{row[0]:.3f},{row[1]}," + ",".join(f"{v:.6g}" for v in row[2:]) + "\n")
+        self.file.flush()
+        if self.file.tell() >= self.max_bytes:
+            self._rotate()
+
+    def close(self):
+        self.file.close()
+
+
+def interval_stats(now, elapsed, rms_values, gaps_ms, lost, latencies_ms):
+    """One STATS_FIELDS row for a reporting interval."""
+    rms = np.asarray(rms_values, dtype=np.float64)
+    gaps = np.asarray(gaps_ms, dtype=np.float64)
+    latencies = np.asarray(latencies_ms, dtype=np.float64)
+    if not rms.size:
+        rms = np.zeros(1)
+    if not gaps.size:
+        gaps = np.zeros(1)
+    if not latencies.size:
+        latencies = np.zeros(1)
+    return (
+        now, len(rms_values), len(rms_values) / elapsed,
+        rms.min(), rms.mean(), rms.max(),
+        gaps.mean(), gaps.std(), np.percentile(gaps, 99), gaps.max(),
+        lost, latencies.mean(), np.percentile(latencies, 99), latencies.max(),
+    )
+
+
+def run_headless(sock: zmq.Socket, interval: float, log) -> None:
+    """
+    Receives every message with a blocking poll and reports per-interval
+    statistics. Work per message is a JSON parse and (without an rms header
+    field) one dot product over the tensor buffer, so this keeps up with
+    the full broadcaster rate.
+    """
+    rms_values, gaps_ms, latencies_ms = [], [], []
+    lost = 0
+    last_arrival = None
+    window_start = time.monotonic()
+    total = 0
+
+    while True:
+        if sock.poll(100, zmq.POLLIN):
+            frames = sock.recv_multipart(copy=False)
+            arrival = time.monotonic()
+            parsed = parse_message(frames)
+            if parsed is not None:
+                header, rms = parsed
+                rms_values.append(rms)
+                missing, latency_ms = sequences.update(header.get("machine_id"), header.get("seq"),
+                                                       header.get("timestamp_ms"), time.time())
+                lost += missing
+                if latency_ms is not None:
+                    latencies_ms.append(latency_ms)
+                if last_arrival is not None:
+                    gaps_ms.append((arrival - last_arrival) * 1000)
+                last_arrival = arrival
+
+        now = time.monotonic()
+        if now - window_start >= interval:
+            row = interval_stats(time.time(), now - window_start, rms_values, gaps_ms, lost, latencies_ms)
+            total += row[1]
+            print(f"[rms_monitor] {row[1]:>5} msgs  {row[2]:>7.1f} Hz  "
+                  f"rms {row[3]:.6f}/{row[4]:.6f}/{row[5]:.6f}  "
+                  f"jitter {row[6]:.2f}±{row[7]:.2f} ms (p99 {row[8]:.2f}, max {row[9]:.2f})  "
+                  f"lost {row[10]}  latency {row[11]:.1f} ms (p99 {row[12]:.1f}, max {row[13]:.1f})  "
+                  f"total {total}", flush=True)
+            if log is not None:
+                log.write(row)
+            rms_values, gaps_ms, latencies_ms = [], [], []
+            lost = 0
+            window_start = now
+
 # ─── Main ─────────────────────────────────────────────────────────────────────
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Resonance Hardware Verification Tool")
+    parser.add_argument("endpoint", nargs="?", default=DEFAULT_ENDPOINT)
+    parser.add_argument("--headless", action="store_true",
+                        help="No display: receive every message and print statistics")
+    parser.add_argument("--interval", type=float, default=1.0, help="Headless reporting interval (s)")
+    parser.add_argument("--log", default=None, help="Headless stats log (.csv, or .bin for binary records)")
+    parser.add_argument("--rotate-mb", type=float, default=10.0, help="Rotate the log at this size")
+    parser.add_argument("--keep", type=int, default=5, help="Rotated logs to keep")
+    return parser.parse_args()
+
+
 def main():
-    endpoint = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_ENDPOINT
+    args = parse_args()
+    endpoint = args.endpoint
     print(f"[rms_monitor] Resonance Hardware Verification Tool")
-    print(f"[rms_monitor] Ring buffer : {RING_SIZE} samples")
+    if not args.headless:
+        print(f"[rms_monitor] Ring buffer : {RING_SIZE} samples")
     print(f"[rms_monitor] Connecting  : {endpoint}")
     print(f"[rms_monitor] Ctrl+C to quit.\n")
 
+    if args.headless:
+        sock = create_subscriber(endpoint, hwm=HEADLESS_HWM)
+        log = RotatingStatsLog(args.log, int(args.rotate_mb * 2**20), args.keep) if args.log else None
+        try:
+            run_headless(sock, args.interval, log)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if log is not None:
+                log.close()
+            sock.close()
+            print("\n[rms_monitor] Shut down.")
+        return
+
+    import matplotlib
+    matplotlib.use("TkAgg")  # lightweight backend, no web server
+    import matplotlib.pyplot as plt
+    import matplotlib.animation as animation
+
     sock = create_subscriber(endpoint)
     fig, ax, line, status_text = build_figure()
 
@@ -194,7 +402,7 @@ def main():
         fig,
         make_update_fn(sock, ax, line, status_text),
         interval=ANIM_INTERVAL_MS,
-        blit=False,       # full redraw needed for dynamic xlim/ylim
+        blit=True,        # limits change in steps, see make_update_fn
         cache_frame_data=False,
     )
 
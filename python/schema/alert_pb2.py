@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+# Generated by the protocol buffer compiler.  DO NOT EDIT!
+# source: schema/alert.proto
+"""Generated protocol buffer code."""
+from google.protobuf.internal import builder as _builder
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf import symbol_database as _symbol_database
+# @@protoc_insertion_point(imports)
+
+_sym_db = _symbol_database.Default()
+
+
+from schema import spectrogram_pb2 as schema_dot_spectrogram__pb2
+
+
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x12schema/alert.proto\x12\tresonance\x1a\x18schema/spectrogram.proto\"\x8e\x01\n\x11SpectrogramFormat\x12\x1f\n\x05\x64type\x18\x01 \x01(\x0e\x32\x10.resonance.DType\x12\x0c\n\x04\x62ins\x18\x02 \x01(\r\x12\x0e\n\x06\x66rames\x18\x03 \x01(\r\x12\x0f\n\x07\x63olumns\x18\x04 \x01(\r\x12\r\n\x05scale\x18\x07 \x03(\x02\x12\x0e\n\x06offset\x18\x08 \x03(\x02J\x04\x08\x05\x10\x06J\x04\x08\x06\x10\x07\"\xe7\x03\n\x06Result\x12\x11\n\ttimestamp\x18\x01 \x01(\x01\x12\x12\n\nmachine_id\x18\x02 \x01(\t\x12\x10\n\x08sequence\x18\x03 \x01(\x04\x12 \n\x13origin_timestamp_ms\x18\x04 \x01(\x04H\x00\x88\x01\x01\x12\x10\n\x03mse\x18\x05 \x01(\x01H\x01\x88\x01\x01\x12%\n\x08severity\x18\x06 \x01(\x0e\x32\x13.resonance.Severity\x12\x12\n\x05\x61lert\x18\x07 \x01(\tH\x02\x88\x01\x01\x12\x15\n\x08\x61lert_id\x18\x08 \x01(\tH\x03\x88\x01\x01\x12=\n\x12spectrogram_format\x18\t \x01(\x0b\x32\x1c.resonance.SpectrogramFormatH\x04\x88\x01\x01\x12\x17\n\norigin_seq\x18\n \x01(\x04H\x05\x88\x01\x01\x12\x36\n\x0b\x62\x61nd_errors\x18\x0b \x03(\x0b\x32!.resonance.Result.BandErrorsEntry\x1a\x31\n\x0f\x42\x61ndErrorsEntry\x12\x0b\n\x03key\x18\x01 \x01(\t\x12\r\n\x05value\x18\x02 \x01(\x02:\x02\x38\x01\x42\x16\n\x14_origin_timestamp_msB\x06\n\x04_mseB\x08\n\x06_alertB\x0b\n\t_alert_idB\x15\n\x13_spectrogram_formatB\r\n\x0b_origin_seq\"\x86\x01\n\x0b\x41lertUpdate\x12\x10\n\x08\x61lert_id\x18\x01 \x01(\t\x12\x12\n\nmachine_id\x18\x02 \x01(\t\x12%\n\x08severity\x18\x03 \x01(\x0e\x32\x13.resonance.Severity\x12\r\n\x05\x61lert\x18\x04 \x01(\t\x12\x0c\n\x04\x64one\x18\x05 \x01(\x08\x12\r\n\x05\x65rror\x18\x06 \x01(\x08\"\x80\x01\n\x10\x44\x61shboardMessage\x12\x0f\n\x07version\x18\x01 \x01(\r\x12#\n\x06result\x18\x02 \x01(\x0b\x32\x11.resonance.ResultH\x00\x12.\n\x0c\x61lert_update\x18\x03 \x01(\x0b\x32\x16.resonance.AlertUpdateH\x00\x42\x06\n\x04\x62ody*5\n\x08Severity\x12\n\n\x06NORMAL\x10\x00\x12\x07\n\x03LOW\x10\x01\x12\n\n\x06MEDIUM\x10\x02\x12\x08\n\x04HIGH\x10\x03\x62\x06proto3')
+
+_builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, globals())
+_builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'schema.alert_pb2', globals())
+if _descriptor._USE_C_DESCRIPTORS == False:
+
+  DESCRIPTOR._options = None
+  _RESULT_BANDERRORSENTRY._options = None
+  _RESULT_BANDERRORSENTRY._serialized_options = b'8\001'
+  _SEVERITY._serialized_start=962
+  _SEVERITY._serialized_end=1015
+  _SPECTROGRAMFORMAT._serialized_start=60
+  _SPECTROGRAMFORMAT._serialized_end=202
+  _RESULT._serialized_start=205
+  _RESULT._serialized_end=692
+  _RESULT_BANDERRORSENTRY._serialized_start=550
+  _RESULT_BANDERRORSENTRY._serialized_end=599
+  _ALERTUPDATE._serialized_start=695
+  _ALERTUPDATE._serialized_end=829
+  _DASHBOARDMESSAGE._serialized_start=832
+  _DASHBOARDMESSAGE._serialized_end=960
+# @@protoc_insertion_point(module_scope)
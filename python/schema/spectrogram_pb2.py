@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+# Generated by the protocol buffer compiler.  DO NOT EDIT!
+# source: schema/spectrogram.proto
+"""Generated protocol buffer code."""
+from google.protobuf.internal import builder as _builder
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf import symbol_database as _symbol_database
+# @@protoc_insertion_point(imports)
+
+_sym_db = _symbol_database.Default()
+
+
+
+
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x18schema/spectrogram.proto\x12\tresonance\"\xb4\x01\n\x11SpectrogramHeader\x12\x0f\n\x07version\x18\x01 \x01(\r\x12\x14\n\x0ctimestamp_ms\x18\x02 \x01(\x04\x12\x0b\n\x03rms\x18\x03 \x01(\x02\x12\x0c\n\x04\x62ins\x18\x04 \x01(\r\x12\x0e\n\x06\x66rames\x18\x05 \x01(\r\x12\x1f\n\x05\x64type\x18\x06 \x01(\x0e\x32\x10.resonance.DType\x12\x12\n\nmachine_id\x18\x07 \x01(\t\x12\x10\n\x03seq\x18\x08 \x01(\x04H\x00\x88\x01\x01\x42\x06\n\x04_seq*,\n\x05\x44Type\x12\x0b\n\x07\x46LOAT32\x10\x00\x12\x0b\n\x07\x46LOAT16\x10\x01\x12\t\n\x05UINT8\x10\x02\x62\x06proto3')
+
+_builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, globals())
+_builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'schema.spectrogram_pb2', globals())
+if _descriptor._USE_C_DESCRIPTORS == False:
+
+  DESCRIPTOR._options = None
+  _DTYPE._serialized_start=222
+  _DTYPE._serialized_end=266
+  _SPECTROGRAMHEADER._serialized_start=40
+  _SPECTROGRAMHEADER._serialized_end=220
+# @@protoc_insertion_point(module_scope)
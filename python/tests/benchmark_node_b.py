@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+benchmark_node_b.py — End-to-end throughput & latency benchmark for Node B
+==========================================================================
+
+Starts the real InferenceNode (python/inference/main.py) as a subprocess,
+drives it through a local ZMQ publisher in Node A's message format and
+subscribes to its results on port 5557.
+
+For every rate step it reports:
+    • messages/s sustained (results received / duration)
+    • p50 / p95 / p99 end-to-end latency (publish → result received)
+    • windows sent without a matching result, split into intended skips
+      (scoring stride, duplicates, DASHBOARD_FPS decimation, read from Node
+      B's /metrics) and real drops (queue overflows and anything unaccounted for)
+    • CPU usage of Node B (+ worker processes), total and per busy core
+    • peak RSS of Node B plus its workers, sampled during the step
+
+Usage
+-----
+    python python/tests/benchmark_node_b.py --rates 50,100,200 --sensors 4
+    python python/tests/benchmark_node_b.py --rates 400 --env INFERENCE_WORKERS=2 --env BATCH_MAX_SIZE=8
+    python python/tests/benchmark_node_b.py --output bench/$(git rev-parse --short HEAD).json
+
+Results are written as JSON (one entry per rate step) so runs can be diffed
+between commits.
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import resource
+import platform
+import subprocess
+import threading
+import urllib.request
+
+import numpy as np
+import zmq
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from utils.codec import HEADER_FORMATS, JSON_HEADER, decode_dashboard_message, encode_spectrogram_header
+
+NODE_B_MAIN = os.path.join(os.path.dirname(__file__), "..", "inference", "main.py")
+RSS_POLL_S = 0.25      # how often the Node B process tree RSS is sampled
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark Node B end to end.")
+    parser.add_argument("--rates", default="50,100,200",
+                        help="Comma-separated total message rates (msgs/s) to test, one step each")
+    parser.add_argument("--sensors", type=int, default=1, help="Simulated sensors (machine_id per sensor)")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of load per step")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Seconds to wait for Node B to start")
+    parser.add_argument("--drain", type=float, default=2.0, help="Seconds to wait for late results")
+    parser.add_argument("--bins", type=int, default=1024)
+    parser.add_argument("--frames", type=int, default=64)
+    parser.add_argument("--pool", type=int, default=16, help="Pregenerated payloads per sensor")
+    parser.add_argument("--port", type=int, default=5555, help="Port the benchmark publishes on")
+    parser.add_argument("--results", default="tcp://localhost:5557", help="Node B results endpoint")
+    parser.add_argument("--header", choices=HEADER_FORMATS, default=JSON_HEADER,
+                        help="Header format of the messages sent to Node B")
+    parser.add_argument("--env", action="append", default=[],
+                        help="KEY=VALUE passed to Node B (repeatable), e.g. BATCH_MAX_SIZE=8")
+    parser.add_argument("--output", default="benchmark_node_b.json", help="JSON results file")
+    return parser.parse_args()
+
+# ─── CPU / Memory ────────────────────────────────────────────────────────────
+
+def read_cpu_times():
+    """Per-core (busy, total) jiffies from /proc/stat, or None off Linux."""
+    try:
+        with open("/proc/stat") as f:
+            lines = [l.split() for l in f if l.startswith("cpu") and l[3].isdigit()]
+    except OSError:
+        return None
+    times = []
+    for fields in lines:
+        values = [int(v) for v in fields[1:]]
+        idle = values[3] + (values[4] if len(values) > 4 else 0)
+        times.append((sum(values) - idle, sum(values)))
+    return times
+
+
+def per_core_utilisation(before, after):
+    if before is None or after is None:
+        return None
+    return [round(100.0 * (b1 - b0) / max(t1 - t0, 1), 1) for (b0, t0), (b1, t1) in zip(before, after)]
+
+# ─── Load Generation ─────────────────────────────────────────────────────────
+
+class LoadGenerator(threading.Thread):
+    """
+    Publishes Node A style multipart messages at a fixed total rate,
+    round-robin over sensors. Payloads are pregenerated so the generator is
+    never the bottleneck. timestamp_ms is strictly increasing per sensor and
+    doubles as the key used to match results back to send times.
+    """
+
+    def __init__(self, socket, rate, duration, sensors, bins, frames, pool, header=JSON_HEADER):
+        super().__init__(daemon=True)
+        self.header = header
+        self.socket = socket
+        self.rate = rate
+        self.duration = duration
+        self.sensors = [f"bench-{i}" for i in range(sensors)]
+        self.bins = bins
+        self.frames = frames
+        rng = np.random.default_rng(0)
+        self.payloads = [rng.random((bins, frames), dtype=np.float32).tobytes() for _ in range(pool)]
+        self.sent = {}                      # (machine_id, timestamp_ms) -> send time
+        self.last_ts = {m: 0 for m in self.sensors}
+        self.seq = {m: 0 for m in self.sensors}
+        self.late_sends = 0                 # sends that missed their schedule by > 1 period
+
+    def run(self):
+        period = 1.0 / self.rate
+        start = time.perf_counter()
+        n = 0
+        while True:
+            target = start + n * period
+            if target - start >= self.duration:
+                break
+            delay = target - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            elif -delay > period:
+                self.late_sends += 1
+
+            machine_id = self.sensors[n % len(self.sensors)]
+            now = time.time()
+            ts = max(int(now * 1000), self.last_ts[machine_id] + 1)
+            self.last_ts[machine_id] = ts
+            header = encode_spectrogram_header({
+                "timestamp_ms": ts,
+                "seq": self.seq[machine_id],
+                "rms": 0.0,
+                "bins": self.bins,
+                "frames": self.frames,
+                "dtype": "float32",
+                "machine_id": machine_id,
+            }, self.header)
+            self.seq[machine_id] += 1
+            self.sent[(machine_id, ts)] = now
+            self.socket.send_multipart([header, self.payloads[n % len(self.payloads)]], copy=False)
+            n += 1
+
+# ─── One Benchmark Step ──────────────────────────────────────────────────────
+
+def process_tree(pid):
+    """pid plus all of its descendants (Linux /proc)."""
+    pids = [pid]
+    for p in pids:
+        try:
+            for task in os.listdir(f"/proc/{p}/task"):
+                with open(f"/proc/{p}/task/{task}/children") as f:
+                    pids.extend(int(c) for c in f.read().split())
+        except OSError:
+            pass
+    return pids
+
+
+def tree_rss_bytes(pid):
+    """Current VmRSS of a process and its descendants, or None off Linux."""
+    total = None
+    for p in process_tree(pid):
+        try:
+            with open(f"/proc/{p}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total = (total or 0) + int(line.split()[1]) * 1024
+                        break
+        except OSError:
+            pass
+    return total
+
+
+def scrape_counts(port):
+    """
+    {metric: total over all labels} of the *_total counters on Node B's
+    /metrics, plus {"dropped_by_reason": {...}}; None if metrics are off.
+    """
+    if not port:
+        return None
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=2) as response:
+            text = response.read().decode("utf-8")
+    except OSError:
+        return None
+    counts = {"dropped_by_reason": {}}
+    for line in text.splitlines():
+        if line.startswith("#") or "_total" not in line:
+            continue
+        name_labels, _, value = line.rpartition(" ")
+        name = name_labels.split("{")[0]
+        counts[name] = counts.get(name, 0) + float(value)
+        if name == "nodeb_messages_dropped_total" and 'reason="' in name_labels:
+            reason = name_labels.split('reason="')[1].split('"')[0]
+            counts["dropped_by_reason"][reason] = counts["dropped_by_reason"].get(reason, 0) + int(float(value))
+    return counts
+
+
+def run_step(args, rate, env):
+    ctx = zmq.Context()
+    pub = ctx.socket(zmq.PUB)
+    pub.setsockopt(zmq.SNDHWM, 10000)
+    pub.bind(f"tcp://*:{args.port}")
+    sub = ctx.socket(zmq.SUB)
+    sub.setsockopt(zmq.RCVHWM, 100000)
+    sub.setsockopt(zmq.SUBSCRIBE, b"")
+    sub.connect(args.results)
+
+    usage_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    node = subprocess.Popen([sys.executable, NODE_B_MAIN], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    time.sleep(args.warmup)
+    if node.poll() is not None:
+        raise RuntimeError(f"Node B exited during startup (code {node.returncode})")
+
+    gen = LoadGenerator(pub, rate, args.duration, args.sensors, args.bins, args.frames, args.pool, args.header)
+    latencies = []
+    received = 0
+    unmatched = 0
+
+    cpu_before = read_cpu_times()
+    t0 = time.time()
+    gen.start()
+    deadline = None
+    peak_rss = tree_rss_bytes(node.pid)
+    next_rss = time.monotonic() + RSS_POLL_S
+    while True:
+        if time.monotonic() >= next_rss:
+            rss = tree_rss_bytes(node.pid)
+            if rss is not None:
+                peak_rss = max(peak_rss or 0, rss)
+            next_rss = time.monotonic() + RSS_POLL_S
+        if deadline is None and not gen.is_alive():
+            deadline = time.time() + args.drain
+            cpu_after = read_cpu_times()
+            load_end = time.time()
+        if deadline is not None and time.time() > deadline:
+            break
+        if not sub.poll(50, zmq.POLLIN):
+            continue
+        frames = sub.recv_multipart()
+        recv_time = time.time()
+        header = decode_dashboard_message(frames[0])
+        if header.get("type") == "alert_update":
+            continue
+        key = (header.get("machine_id"), header.get("origin_timestamp_ms"))
+        sent_at = gen.sent.get(key)
+        if sent_at is None:
+            unmatched += 1
+            continue
+        received += 1
+        latencies.append((recv_time - sent_at) * 1000)
+
+    # Node B's own counters, read while it is still up
+    counts = scrape_counts(int(env.get("METRICS_PORT", 9108)))
+    node.send_signal(signal.SIGTERM)
+    try:
+        node.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        node.kill()
+        node.wait()
+    usage_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    sub.close()
+    pub.close()
+    ctx.term()
+
+    elapsed = load_end - t0
+    sent = len(gen.sent)
+    cpu_seconds = (usage_after.ru_utime - usage_before.ru_utime) + (usage_after.ru_stime - usage_before.ru_stime)
+    lat = np.array(latencies) if latencies else np.array([np.nan])
+    if counts is not None:
+        skipped = {
+            "stride": int(counts.get("nodeb_messages_skipped_total", 0)),
+            "duplicate": int(counts.get("nodeb_messages_duplicate_total", 0)),
+            "fps": int(counts.get("nodeb_messages_decimated_total", 0)),
+        }
+        # Whatever is neither an intended skip nor a counted drop was lost in transit
+        dropped = sent - received - sum(skipped.values())
+        dropped_by_reason = counts["dropped_by_reason"]
+    else:
+        skipped, dropped, dropped_by_reason = None, sent - received, None
+
+    return {
+        "target_rate": rate,
+        "sensors": args.sensors,
+        "payload_shape": [args.bins, args.frames],
+        "duration_s": round(elapsed, 3),
+        "sent": sent,
+        "received": received,
+        # Intended: scoring stride, re-delivered windows, DASHBOARD_FPS decimation
+        # (None if Node B's metrics endpoint is disabled; "dropped" then includes them)
+        "skipped": skipped,
+        # Real losses: queue / worker ring overflows (by reason) and the unexplained rest
+        "dropped": dropped,
+        "dropped_by_reason": dropped_by_reason,
+        "unmatched_results": unmatched,
+        "generator_late_sends": gen.late_sends,
+        "sent_per_s": round(sent / elapsed, 1),
+        "received_per_s": round(received / elapsed, 1),
+        "latency_ms_p50": round(float(np.nanpercentile(lat, 50)), 3),
+        "latency_ms_p95": round(float(np.nanpercentile(lat, 95)), 3),
+        "latency_ms_p99": round(float(np.nanpercentile(lat, 99)), 3),
+        "latency_ms_max": round(float(np.nanmax(lat)), 3),
+        # CPU of Node B and its workers over the whole run (incl. startup), in cores
+        "node_cpu_seconds": round(cpu_seconds, 3),
+        "node_cpu_cores_avg": round(cpu_seconds / (elapsed + args.warmup + args.drain), 3),
+        # System-wide busy % per core during the load phase
+        "cpu_per_core_pct": per_core_utilisation(cpu_before, cpu_after),
+        # Largest sampled VmRSS of Node B plus its workers during this step
+        "peak_rss_mb": round(peak_rss / 2**20, 1) if peak_rss is not None else None,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(__file__),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def main():
+    args = parse_args()
+    env = dict(os.environ)
+    env["ZMQ_ENDPOINTS"] = f"tcp://localhost:{args.port}"
+    env.setdefault("LOG_LEVEL", "WARNING")
+    overrides = dict(item.partition("=")[::2] for item in args.env)
+    env.update(overrides)
+
+    rates = [float(r) for r in args.rates.split(",") if r.strip()]
+    print(f"[benchmark] Node B: {os.path.normpath(NODE_B_MAIN)}")
+    print(f"[benchmark] sensors={args.sensors} payload={args.bins}x{args.frames} "
+          f"duration={args.duration}s rates={rates}")
+
+    steps = []
+    for rate in rates:
+        result = run_step(args, rate, env)
+        steps.append(result)
+        print(f"[benchmark] rate {rate:>7.1f}/s → {result['received_per_s']:>7.1f}/s sustained, "
+              f"p50 {result['latency_ms_p50']:.2f} ms, p95 {result['latency_ms_p95']:.2f} ms, "
+              f"p99 {result['latency_ms_p99']:.2f} ms, "
+              f"skipped {sum(result['skipped'].values()) if result['skipped'] else 'n/a'}, "
+              f"dropped {result['dropped']}, "
+              f"cpu {result['node_cpu_cores_avg']:.2f} cores, rss {result['peak_rss_mb']} MB")
+
+    report = {
+        "commit": git_commit(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "host": {"platform": platform.platform(), "cpus": os.cpu_count()},
+        "node_env": overrides,
+        "steps": steps,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"[benchmark] Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
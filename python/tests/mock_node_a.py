@@ -1,50 +1,304 @@
-import zmq
+"""
+mock_node_a.py — Node A simulator and load generator
+====================================================
+
+Publishes multipart messages in Node A's format (see src/broadcaster.cpp):
+a header {timestamp_ms, seq, rms, bins, frames, dtype, machine_id}, as JSON or
+with --header proto as a SpectrogramHeader (schema/spectrogram.proto), and
+a float32 (bins x frames) tensor.
+
+Usage
+-----
+    python python/tests/mock_node_a.py                          # 1 sensor, real time
+    python python/tests/mock_node_a.py --sensors 8 --speed 4    # 8 sensors, 4x real time
+    python python/tests/mock_node_a.py --endpoints tcp://*:5555,tcp://*:5565 --sensors 4
+    python python/tests/mock_node_a.py --fault harmonic --fault-sensors 0 --fault-after 30
+    python python/tests/mock_node_a.py --replay data/raw/recordings --speed 20
+
+Real time is one window per FFT hop (512 samples at 44.1 kHz, ~86 windows/s)
+per sensor. Synthetic payloads are pregenerated per sensor, so sending costs
+no more than the ZMQ call; replayed windows are read from the recorder's
+memory-mapped segments (python/recorder) and converted block by block.
+"""
+import os
+import sys
 import time
-import numpy as np
-import json
 import logging
+import argparse
+
+import numpy as np
+import zmq
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from utils.codec import HEADER_FORMATS, JSON_HEADER, encode_spectrogram_header
+
+FS = 44100
+HOP = 512
+REALTIME_RATE = FS / HOP   # windows per second per sensor
+FAULTS = ("harmonic", "impulse", "broadband")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Simulate one or more Node A sensors.")
+    parser.add_argument("--endpoints", default="tcp://*:5555",
+                        help="Comma-separated endpoints to bind; sensors are spread over them round-robin")
+    parser.add_argument("--sensors", type=int, default=1, help="Simulated sensors (one machine_id each)")
+    parser.add_argument("--machine-prefix", default="mock", help="machine_id prefix, e.g. mock-0, mock-1")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Multiple of real time (per sensor, or of the recording with --replay)")
+    parser.add_argument("--rate", type=float, default=None,
+                        help="Windows/s per sensor, overrides --speed for synthetic data")
+    parser.add_argument("--duration", type=float, default=0.0, help="Seconds to run (0 = until Ctrl+C)")
+    parser.add_argument("--bins", type=int, default=1024)
+    parser.add_argument("--frames", type=int, default=64)
+    parser.add_argument("--pool", type=int, default=32, help="Pregenerated payloads per sensor")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fault", choices=FAULTS, default=None, help="Synthetic fault signature to inject")
+    parser.add_argument("--fault-sensors", default=None,
+                        help="Comma-separated sensor indices that get the fault (default: all)")
+    parser.add_argument("--fault-after", type=float, default=0.0, help="Seconds before the fault starts")
+    parser.add_argument("--fault-duration", type=float, default=0.0, help="Seconds the fault lasts (0 = until the end)")
+    parser.add_argument("--replay", default=None, help="Recorder directory to replay instead of synthetic data")
+    parser.add_argument("--start-ms", type=int, default=0, help="Replay: first timestamp_ms")
+    parser.add_argument("--end-ms", type=int, default=2**62, help="Replay: timestamp_ms to stop before")
+    parser.add_argument("--loop", action="store_true", help="Replay: start over at the end of the range")
+    parser.add_argument("--cache-mb", type=float, default=1024,
+                        help="Replay: keep converted windows in memory for --loop if they fit")
+    parser.add_argument("--keep-timestamps", action="store_true",
+                        help="Replay: send the recorded timestamp_ms and seq instead of the current time")
+    parser.add_argument("--header", choices=HEADER_FORMATS, default=JSON_HEADER, help="Header frame format")
+    parser.add_argument("--hwm", type=int, default=1000, help="PUB send high-water mark")
+    return parser.parse_args()
+
+# ─── Synthetic Payloads ──────────────────────────────────────────────────────
+
+def normal_pool(rng, size, bins, frames, sensor):
+    """Harmonic structure that differs slightly per sensor, plus noise."""
+    f = np.linspace(0, 1, bins, dtype=np.float32)[:, None]
+    t = np.linspace(0, 1, frames, dtype=np.float32)
+    base = (0.5 + 0.5 * np.sin(2 * np.pi * (5 + sensor) * t)) * np.exp(-3 * f)
+    fundamental = 20 + 3 * sensor
+    for k in range(1, 6):
+        base[fundamental * k:fundamental * k + 2] += 0.4 / k
+    pool = base + 0.05 * rng.standard_normal((size, bins, frames), dtype=np.float32)
+    return np.clip(pool, 0, None, out=pool)
+
+
+def inject_fault(pool, kind, rng):
+    """Adds a fault signature to every window of a (copied) pool."""
+    pool = pool.copy()
+    size, bins, frames = pool.shape
+    if kind == "harmonic":
+        # Sidebands / extra harmonics of a defect frequency
+        defect = bins // 16
+        for k in range(1, bins // defect):
+            pool[:, defect * k] += 0.6 / np.sqrt(k)
+    elif kind == "impulse":
+        # Periodic broadband impacts, e.g. a spalled bearing race
+        offsets = rng.integers(0, 8, size)
+        for i, offset in enumerate(offsets):
+            pool[i, :, offset::8] += 0.5 * np.exp(-np.linspace(0, 2, bins, dtype=np.float32))[:, None]
+    elif kind == "broadband":
+        # Raised noise floor, e.g. cavitation or looseness
+        pool += 0.3 * np.abs(rng.standard_normal(pool.shape, dtype=np.float32))
+    return pool
+
+
+def to_payloads(pool):
+    """(rms, bytes) per window, ready to send."""
+    rms = np.sqrt(np.mean(np.square(pool, dtype=np.float32), axis=(1, 2)))
+    return [(float(r), np.ascontiguousarray(w, dtype=np.float32).tobytes()) for r, w in zip(rms, pool)]
+
+# ─── Publishing ──────────────────────────────────────────────────────────────
+
+class Publisher:
+    def __init__(self, endpoints, hwm, header=JSON_HEADER):
+        self.header = header
+        self.context = zmq.Context()
+        self.sockets = []
+        for endpoint in endpoints:
+            socket = self.context.socket(zmq.PUB)
+            socket.setsockopt(zmq.SNDHWM, hwm)
+            socket.bind(endpoint)
+            self.sockets.append(socket)
+            logging.info(f"Mock Node A publishing to {endpoint}")
+        self.sent = 0
+        self.late = 0
+
+    def send(self, socket_index, machine_id, timestamp_ms, seq, rms, bins, frames, payload):
+        header = encode_spectrogram_header({
+            "timestamp_ms": timestamp_ms,
+            "seq": seq,
+            "rms": rms,
+            "bins": bins,
+            "frames": frames,
+            "dtype": "float32",
+            "machine_id": machine_id,
+        }, self.header)
+        self.sockets[socket_index].send_multipart([header, payload], copy=False)
+        self.sent += 1
+
+    def pace(self, target):
+        """Sleeps until `target` (perf_counter); counts sends more than 10 ms behind."""
+        delay = target - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        elif delay < -0.01:
+            self.late += 1
+
+    def close(self):
+        for socket in self.sockets:
+            socket.close(linger=0)
+        self.context.term()
+
+
+class Progress:
+    def __init__(self, publisher, interval=5.0):
+        self.publisher = publisher
+        self.interval = interval
+        self.start = self.last = time.perf_counter()
+        self.last_sent = 0
+
+    def check(self):
+        now = time.perf_counter()
+        if now - self.last >= self.interval:
+            sent = self.publisher.sent
+            logging.info(f"Sent {sent} windows ({(sent - self.last_sent) / (now - self.last):.1f}/s), "
+                         f"late: {self.publisher.late}")
+            self.last, self.last_sent = now, sent
+
+    def done(self):
+        elapsed = time.perf_counter() - self.start
+        logging.info(f"Sent {self.publisher.sent} windows in {elapsed:.1f}s "
+                     f"({self.publisher.sent / max(elapsed, 1e-9):.1f}/s), late: {self.publisher.late}")
+
+
+def run_synthetic(args, publisher):
+    rng = np.random.default_rng(args.seed)
+    sensors = [f"{args.machine_prefix}-{i}" for i in range(args.sensors)]
+    faulty = set(range(args.sensors)) if args.fault_sensors is None else \
+        {int(i) for i in args.fault_sensors.split(",") if i.strip()}
+    normal, fault = [], []
+    for i in range(args.sensors):
+        pool = normal_pool(rng, args.pool, args.bins, args.frames, i)
+        normal.append(to_payloads(pool))
+        fault.append(to_payloads(inject_fault(pool, args.fault, rng)) if args.fault and i in faulty else None)
+    logging.info(f"Pregenerated {args.pool} payload(s) for each of {args.sensors} sensor(s)"
+                 f"{f', {args.fault} fault on sensors {sorted(faulty)}' if args.fault else ''}")
+
+    rate = args.rate or REALTIME_RATE * args.speed
+    period = 1.0 / (rate * args.sensors)
+    logging.info(f"{rate:.1f} windows/s per sensor ({rate / REALTIME_RATE:.2f}x real time), "
+                 f"{rate * args.sensors:.1f}/s total")
+    fault_end = args.fault_after + args.fault_duration if args.fault_duration else float("inf")
+    last_ts = [0] * args.sensors
+    progress = Progress(publisher)
+    start = time.perf_counter()
+    n = 0
+    while True:
+        target = n * period
+        if args.duration and target >= args.duration:
+            break
+        publisher.pace(start + target)
+        sensor = n % args.sensors
+        payloads = fault[sensor] if fault[sensor] and args.fault_after <= target < fault_end else normal[sensor]
+        rms, payload = payloads[(n // args.sensors) % len(payloads)]
+        # Strictly increasing per sensor, even above 1000 windows/s
+        ts = max(int(time.time() * 1000), last_ts[sensor] + 1)
+        last_ts[sensor] = ts
+        publisher.send(sensor % len(publisher.sockets), sensors[sensor], ts, n // args.sensors, rms,
+                       args.bins, args.frames, payload)
+        n += 1
+        progress.check()
+    progress.done()
+
+
+def replay_blocks(reader, start_ms, end_ms, block=256):
+    """
+    Yields (timestamps, machine_ids, rms, data, seqs) per block of recorded
+    windows, data converted to float32 in one call per block.
+    """
+    for records in reader.ranges(start_ms, end_ms):
+        for lo in range(0, len(records), block):
+            chunk = records[lo:lo + block]
+            ts = chunk["timestamp_ms"]
+            keep = (ts >= start_ms) & (ts < end_ms)
+            if not keep.all():
+                chunk = chunk[keep]
+            if len(chunk):
+                yield (chunk["timestamp_ms"].astype(np.int64), [m.decode("utf-8") for m in chunk["machine_id"]],
+                       chunk["rms"].astype(float), chunk["data"].astype(np.float32), chunk["seq"].tolist())
+
+
+def run_replay(args, publisher):
+    from recorder.segments import SegmentReader
+
+    reader = SegmentReader(args.replay)
+    endpoints = {}   # machine_id -> socket index, assigned on first sight
+    last_ts = {}     # machine_id -> last timestamp_ms sent
+    next_seq = {}    # machine_id -> next sequence number
+    # Converted blocks are kept for later loops while they fit in --cache-mb,
+    # so looping over a short recording costs no conversions at all
+    cache, cache_bytes, cached = [], 0, False
+    cache_limit = args.cache_mb * 2**20 if args.loop else 0
+    progress = Progress(publisher)
+    while True:
+        blocks = cache if cached else replay_blocks(reader, args.start_ms, args.end_ms)
+        first_ts = None
+        start = time.perf_counter()
+        for block in blocks:
+            if not cached:
+                cache_bytes += block[3].nbytes
+                if cache_bytes <= cache_limit:
+                    cache.append(block)
+            timestamps, machine_ids, rms, data, seqs = block
+            bins, frames = data.shape[1:]
+            for i, ts in enumerate(timestamps.tolist()):
+                if first_ts is None:
+                    first_ts = ts
+                # Keep the recorded spacing, compressed by --speed
+                publisher.pace(start + (ts - first_ts) / 1000.0 / args.speed)
+                machine_id = machine_ids[i]
+                socket_index = endpoints.setdefault(machine_id, len(endpoints) % len(publisher.sockets))
+                # A fresh, gapless sequence per sensor (looping would otherwise
+                # look like a sender restart), unless replaying as recorded
+                seq = seqs[i]
+                if not args.keep_timestamps:
+                    ts = max(int(time.time() * 1000), last_ts.get(machine_id, 0) + 1)
+                    last_ts[machine_id] = ts
+                    seq = next_seq.get(machine_id, 0)
+                    next_seq[machine_id] = seq + 1
+                publisher.send(socket_index, machine_id, ts, seq, rms[i], bins, frames, data[i])
+                progress.check()
+                if args.duration and time.perf_counter() - progress.start >= args.duration:
+                    progress.done()
+                    return
+        if first_ts is None:
+            logging.error(f"No recorded windows in {args.replay} for the requested range")
+            return
+        if not args.loop:
+            break
+        cached = cached or cache_bytes <= cache_limit
+    progress.done()
+
 
 def mock_node_a():
     logging.basicConfig(level=logging.INFO)
-    context = zmq.Context()
-    socket = context.socket(zmq.PUB)
-    socket.bind("tcp://*:5555")
-    
-    logging.info("Mock Node A started. Publishing to tcp://*:5555")
-    
+    args = parse_args()
+    if not 1 <= args.speed <= 100 and args.replay:
+        logging.warning(f"Replay speed {args.speed}x is outside the supported 1x-100x range")
+    publisher = Publisher([e.strip() for e in args.endpoints.split(",") if e.strip()], args.hwm, args.header)
+    # Give subscribers a moment to connect before the first message
+    time.sleep(0.5)
     try:
-        while True:
-            # Simulate processing time
-            time.sleep(1.0) 
-            
-            # Generate fake spectrogram
-            # Shape: (1024, 64)
-            # Create some "structure" so it's not just white noise
-            t = np.linspace(0, 1, 64)
-            f = np.linspace(0, 1, 1024).reshape(-1, 1)
-            spectrogram = np.sin(2 * np.pi * 5 * t) * np.exp(-f) # Dummy pattern
-            spectrogram = spectrogram + 0.1 * np.random.randn(1024, 64) # Add noise
-            spectrogram = spectrogram.astype(np.float32)
-            
-            # Create metadata
-            metadata = {
-                "timestamp": time.time(),
-                "source": "MockSensor",
-                "shape": [1024, 64],
-                "dtype": "float32"
-            }
-            
-            # Send multipart
-            socket.send_json(metadata, flags=zmq.SNDMORE)
-            socket.send(spectrogram.tobytes())
-            
-            logging.info("Published spectrogram data.")
-            
+        if args.replay:
+            run_replay(args, publisher)
+        else:
+            run_synthetic(args, publisher)
     except KeyboardInterrupt:
         logging.info("Stopping Mock Node A...")
     finally:
-        socket.close()
-        context.term()
+        publisher.close()
 
 if __name__ == "__main__":
     mock_node_a()
@@ -0,0 +1,57 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from inference.dashboard import SpectrogramEncoder, BINARY_MODE
+from utils.codec import PROTO_HEADER, decode_dashboard_message
+
+BINS, FRAMES = 1024, 64
+
+
+def result(machine_id="m1"):
+    return {"timestamp": 0.0, "machine_id": machine_id, "sequence": 0, "severity": "NORMAL"}
+
+
+def decode_uint8(frames):
+    header = decode_dashboard_message(frames[0])
+    fmt = header["spectrogram_format"]
+    q = np.frombuffer(frames[1], dtype=np.uint8).reshape(fmt["bins"], fmt["columns"])
+    return q * np.array(fmt["scale"], dtype=np.float32) + np.array(fmt["offset"], dtype=np.float32), fmt
+
+
+def test_uint8_scales_each_column_separately():
+    rng = np.random.default_rng(0)
+    window = rng.random((BINS, FRAMES), dtype=np.float32) * 0.01
+    # One loud hop must not flatten the quiet ones
+    window[:, 10] *= 1000.0
+    encoder = SpectrogramEncoder(mode=BINARY_MODE, dtype="uint8", header=PROTO_HEADER)
+
+    values, fmt = decode_uint8(encoder.encode(result(), {"timestamp_ms": 1000}, window.ravel()))
+
+    assert len(fmt["scale"]) == len(fmt["offset"]) == FRAMES
+    span = window.max(axis=0) - window.min(axis=0)
+    # Rounding error is at most half a step of each column's own range
+    assert np.all(np.abs(values - window) <= span / 255.0 / 2 + 1e-6)
+
+
+def test_delta_sends_the_newest_columns():
+    # Chronological, frequency-major stream as Node A publishes it: column t
+    # of every window is FFT hop t, tagged with its hop index
+    hops = 80
+    stream = np.tile(np.arange(hops, dtype=np.float32), (BINS, 1))
+    encoder = SpectrogramEncoder(mode=BINARY_MODE, dtype="float16", delta=True, header=PROTO_HEADER)
+
+    sent = []
+    for end in (FRAMES, FRAMES + 1, FRAMES + 4, hops):
+        window = np.ascontiguousarray(stream[:, end - FRAMES:end])
+        frames = encoder.encode(result(), {"timestamp_ms": int(end * encoder.hop_ms)}, window.ravel())
+        columns = decode_dashboard_message(frames[0])["spectrogram_format"]["columns"]
+        values = np.frombuffer(frames[1], dtype=np.float16).reshape(BINS, columns)
+        sent.append(values[0].astype(int).tolist())
+
+    assert sent[0] == list(range(FRAMES))
+    assert sent[1] == [FRAMES]
+    assert sent[2] == [FRAMES + 1, FRAMES + 2, FRAMES + 3]
+    assert sent[3] == list(range(FRAMES + 4, hops))
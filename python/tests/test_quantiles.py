@@ -0,0 +1,73 @@
+import os
+import sys
+import importlib
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from utils.quantiles import P2Quantile, QuantileSketch
+
+SAMPLES = {
+    "exponential": lambda rng: rng.exponential(1.0, 20000),
+    "normal": lambda rng: rng.normal(5.0, 1.0, 20000),
+    "lognormal": lambda rng: rng.lognormal(0.0, 0.5, 20000),
+}
+
+
+@pytest.mark.parametrize("distribution", SAMPLES)
+@pytest.mark.parametrize("p, rtol", [(0.5, 0.02), (0.95, 0.02), (0.99, 0.02), (0.999, 0.05)])
+def test_p2_tracks_numpy_quantile(distribution, p, rtol):
+    x = SAMPLES[distribution](np.random.default_rng(0))
+    estimator = P2Quantile(p)
+    for v in x:
+        estimator.update(float(v))
+    assert estimator.value() == pytest.approx(np.quantile(x, p), rel=rtol)
+
+
+def test_p2_is_exact_until_the_markers_are_initialized():
+    estimator = P2Quantile(0.5)
+    assert estimator.value() is None
+    for v in (3.0, 1.0, 2.0):
+        estimator.update(v)
+    assert estimator.value() == 2.0
+
+
+def test_sketch_snapshot_resumes_where_it_left_off():
+    x = np.random.default_rng(1).exponential(1.0, 4000)
+    sketch = QuantileSketch([0.5, 0.99])
+    for v in x[:2000]:
+        sketch.update(float(v))
+    restored = QuantileSketch.from_dict(sketch.to_dict())
+    for v in x[2000:]:
+        sketch.update(float(v))
+        restored.update(float(v))
+    assert restored.count == sketch.count == len(x)
+    for p in (0.5, 0.99):
+        assert restored.quantile(p) == sketch.quantile(p)
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("0.9,0.99,0.999,", [0.9, 0.99, 0.999]),
+    ("0.9, 0.99 ,0.999", [0.9, 0.99, 0.999]),
+])
+def test_threshold_quantiles_parse(monkeypatch, value, expected):
+    from utils import config
+    monkeypatch.setenv("THRESHOLD_QUANTILES", value)
+    try:
+        assert importlib.reload(config).THRESHOLD_QUANTILES == expected
+    finally:
+        monkeypatch.undo()
+        importlib.reload(config)
+
+
+@pytest.mark.parametrize("value", ["0.95,0.99,", "0.9,0.99,0.999,0.9999", "0.9,0.99,1.0"])
+def test_threshold_quantiles_reject_bad_values(monkeypatch, value):
+    from utils import config
+    monkeypatch.setenv("THRESHOLD_QUANTILES", value)
+    try:
+        with pytest.raises(ValueError):
+            importlib.reload(config)
+    finally:
+        monkeypatch.undo()
+        importlib.reload(config)
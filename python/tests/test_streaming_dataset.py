@@ -0,0 +1,37 @@
+import os
+import sys
+
+import numpy as np
+from torch.utils.data import DataLoader
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from training.dataset import StreamingSpectrogramDataset
+
+
+def make_shards(directory, count=4, samples=8):
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"shard_{i}.npy")
+        # Every sample is tagged with its global index in [0, 0, 0]
+        data = np.zeros((samples, 1024, 64), dtype=np.float32)
+        data[:, 0, 0] = np.arange(i * samples, (i + 1) * samples)
+        np.save(path, data)
+        paths.append(path)
+    return paths
+
+
+def epoch_order(loader, dataset, epoch):
+    dataset.set_epoch(epoch)
+    return [int(v) for batch in loader for v in batch[:, 0, 0, 0]]
+
+
+def test_persistent_workers_follow_set_epoch(tmp_path):
+    dataset = StreamingSpectrogramDataset(make_shards(str(tmp_path)), shuffle_buffer=8, prefetch=4, seed=0)
+    loader = DataLoader(dataset, batch_size=4, num_workers=2, persistent_workers=True)
+
+    first = epoch_order(loader, dataset, 0)
+    second = epoch_order(loader, dataset, 1)
+    assert sorted(first) == sorted(second) == list(range(32))
+    assert first != second
+    # The order is a function of (seed, epoch) only
+    assert epoch_order(loader, dataset, 0) == first
@@ -0,0 +1,67 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from inference.workers import WorkerPool
+
+SHAPE = (1, 1024, 64)
+
+
+@pytest.fixture
+def model_path(tmp_path):
+    """Identity "autoencoder": every window scores an MSE of 0."""
+    onnx = pytest.importorskip("onnx")
+    from onnx import helper, TensorProto
+
+    dims = ["batch_size", *SHAPE]
+    graph = helper.make_graph(
+        [helper.make_node("Identity", ["input"], ["output"])], "identity",
+        [helper.make_tensor_value_info("input", TensorProto.FLOAT, dims)],
+        [helper.make_tensor_value_info("output", TensorProto.FLOAT, dims)],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 11)])
+    model.ir_version = 7
+    path = str(tmp_path / "identity.onnx")
+    onnx.save(model, path)
+    return path
+
+
+def kill(pool, worker):
+    pool.processes[worker].kill()
+    pool.processes[worker].join()
+
+
+def collect(pool, count, timeout=60.0):
+    results = []
+    deadline = time.monotonic() + timeout
+    while len(results) < count and time.monotonic() < deadline:
+        results += pool.results(0.2)
+    return results
+
+
+def test_dead_worker_is_restarted_and_its_windows_written_off(model_path):
+    pool = WorkerPool(1, 4, SHAPE, model_path, max_restarts=1)
+    try:
+        window = np.zeros(SHAPE, dtype=np.float32)
+        kill(pool, 0)
+        assert [pool.submit({"machine_id": f"m{i}"}, window) for i in range(5)] == [True] * 4 + [False]
+
+        lost = pool.check_workers()
+        assert sorted(m["machine_id"] for m in lost) == ["m0", "m1", "m2", "m3"]
+        assert pool.processes[0].is_alive()
+
+        # The ring is free again and the new worker scores
+        assert all(pool.submit({"machine_id": f"n{i}"}, window) for i in range(4))
+        results = collect(pool, 4)
+        assert sorted(m["machine_id"] for m, _, _, _ in results) == ["n0", "n1", "n2", "n3"]
+        assert all(mse == 0.0 for _, _, mse, _ in results)
+
+        kill(pool, 0)
+        with pytest.raises(RuntimeError):
+            pool.check_workers()
+    finally:
+        pool.close()
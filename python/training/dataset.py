@@ -1,8 +1,15 @@
 import os
 import glob
+import json
+import time
+import queue
+import hashlib
+import threading
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import numpy as np
 import scipy.io
-from torch.utils.data import Dataset
+from torch.utils.data import Dataset, IterableDataset, get_worker_info
 import logging
 
 # Add parent dir to path to allow imports
@@ -10,92 +17,363 @@ import sys
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 from utils import dsp
 
+# DSP parameters of the training windows. Together with the source file hash
+# they key the on-disk cache, so changing any of them rebuilds it.
+FS = 12000
+N_FFT = 2048
+HOP_LENGTH = 512
+# (64 frames - 1) * 512 hop + 2048 n_fft = 34304 samples per (1024, 64) window
+CHUNK_SIZE = 34304
+STRIDE = 16384 # 50% overlap for data augmentation
+NORMALIZATION = "minmax"
+
+CACHE_DTYPES = ("float32", "float16")
+
+def file_hash(fpath, block_size=1 << 20):
+    """SHA-1 of the file contents."""
+    h = hashlib.sha1()
+    with open(fpath, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def dsp_params():
+    return {
+        "fs": FS,
+        "n_fft": N_FFT,
+        "hop_length": HOP_LENGTH,
+        "chunk_size": CHUNK_SIZE,
+        "stride": STRIDE,
+        "normalization": NORMALIZATION,
+        "stft": "whole-signal",
+    }
+
+def load_signal(fpath):
+    """Returns the vibration time series stored in a CWRU .mat file, or None."""
+    mat = scipy.io.loadmat(fpath)
+
+    # Find time series key (DE or FE)
+    key = None
+    for k in mat.keys():
+        if k.endswith("_DE_time"):
+            key = k
+            break
+        elif k.endswith("_FE_time"):
+            key = k # Fallback
+
+    if key is None:
+        # Fallback for weirdly named files (like raw arrays)
+        # Use largest array?
+        # Or specific to Normal_*.mat if they are custom.
+        # Let's inspect shapes.
+        for k in mat.keys():
+            if not k.startswith("__") and isinstance(mat[k], np.ndarray):
+                if mat[k].ndim == 2 and (mat[k].shape[0] > 10000 or mat[k].shape[1] > 10000):
+                    key = k
+                    break
+
+    return mat[key].flatten() if key else None
+
+def process_signal(signal):
+    """
+    Returns the (N, 1024, 64) normalized spectrograms of the overlapping
+    CHUNK_SIZE chunks of a signal, one every STRIDE samples.
+
+    The STFT is computed once over the whole signal and the windows are
+    strided views into it, so frames shared by overlapping chunks are not
+    recomputed. Frames at a chunk's left edge therefore see the real
+    preceding samples rather than zero padding.
+    """
+    count = len(range(0, len(signal) - CHUNK_SIZE, STRIDE))
+    spec = dsp.stft_log_magnitude(signal, n_fft=N_FFT, hop_length=HOP_LENGTH)
+    windows = dsp.spectrogram_windows(spec, frames=64, stride=STRIDE // HOP_LENGTH)[:count]
+    return dsp.normalize_spectrogram_batch(windows)
+
+# Whole recordings kept out of training, so evaluation (select_model.py,
+# export_onnx.py --quantize) scores windows the model never saw
+HOLDOUT_FILES = 1
+
+def split_files(files, holdout_files=HOLDOUT_FILES):
+    """
+    (train, held_out) split of a sorted file list. The held-out files are
+    spread evenly over the list; at least one file is always left for
+    training.
+    """
+    count = min(max(0, int(holdout_files)), len(files) - 1)
+    if count <= 0:
+        return list(files), []
+    picks = set(np.linspace(0, len(files) - 1, count).round().astype(int).tolist())
+    return [f for i, f in enumerate(files) if i not in picks], [files[i] for i in sorted(picks)]
+
+def cache_path(fpath, cache_dir, cache_dtype):
+    params = dict(dsp_params(), dtype=cache_dtype)
+    digest = hashlib.sha1(file_hash(fpath).encode("utf-8"))
+    digest.update(json.dumps(params, sort_keys=True).encode("utf-8"))
+    name = os.path.splitext(os.path.basename(fpath))[0]
+    return os.path.join(cache_dir, f"{name}.{digest.hexdigest()[:16]}.npy")
+
+def remove_stale(path):
+    """Deletes cache entries of the same recording built from other contents or parameters."""
+    cache_dir, base = os.path.split(path)
+    name = base.split(".")[0]
+    for stale in glob.glob(os.path.join(cache_dir, f"{name}.*.npy")):
+        if stale != path:
+            os.remove(stale)
+
+def build_file(fpath, cache_dir, cache_dtype, use_cache=True):
+    """
+    Loads one recording and computes its spectrograms, going through the
+    on-disk cache when `use_cache` is set. Module-level so it can run in a
+    worker process.
+
+    Returns (specs, seconds, cached). With the cache, specs is the path of
+    the cache entry (cheap to send back from a worker, the caller memmaps
+    it); without, the (N, 1024, 64) array. specs is None for files without
+    a time series.
+    """
+    start = time.perf_counter()
+    path = cache_path(fpath, cache_dir, cache_dtype) if use_cache else None
+    if path is not None and os.path.exists(path):
+        return path, time.perf_counter() - start, True
+
+    signal = load_signal(fpath)
+    if signal is None:
+        logging.warning(f"Could not find time-series data in {fpath}")
+        return None, time.perf_counter() - start, False
+    specs = process_signal(signal).astype(cache_dtype)
+    if path is None:
+        return specs, time.perf_counter() - start, False
+
+    os.makedirs(cache_dir, exist_ok=True)
+    remove_stale(path)
+    # Write then rename, so an interrupted build never leaves a valid-looking entry
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, specs)
+    os.replace(tmp_path, path)
+    return path, time.perf_counter() - start, False
+
 class CWRUDataset(Dataset):
-    def __init__(self, data_dir, transform=None):
+    """
+    Normal-operation spectrograms from the CWRU recordings (or, with another
+    `pattern`, e.g. "[IBO]*.mat", from the fault recordings). With `split`
+    set to "train" or "holdout", only that side of split_files(files,
+    `holdout_files`) is loaded.
+
+    Spectrograms are computed once per recording and stored under
+    `cache_dir` (default: data/processed next to `data_dir`) as one
+    contiguous .npy array per file. Later constructions open these with
+    np.memmap instead of recomputing, so startup is fast and samples live in
+    the page cache rather than on the Python heap. Cache files are named
+    after the source file hash and the DSP parameters, so editing a
+    recording or changing a parameter rebuilds the entry.
+
+    With `workers` > 1 (0: one per CPU), files missing from the cache are loaded and
+    transformed in a process pool. Samples keep the sorted file order either
+    way, and a file that fails is logged and skipped.
+    """
+
+    def __init__(self, data_dir, transform=None, cache_dir=None, cache_dtype="float32", use_cache=True,
+                 workers=1, pattern="Normal_*.mat", split=None, holdout_files=HOLDOUT_FILES):
+        if cache_dtype not in CACHE_DTYPES:
+            raise ValueError(f"Unsupported cache dtype '{cache_dtype}'")
         self.data_dir = data_dir
-        self.files = glob.glob(os.path.join(data_dir, "Normal_*.mat"))
-        self.samples = []
+        self.files = sorted(glob.glob(os.path.join(data_dir, pattern)))
+        if split is not None:
+            if split not in ("train", "holdout"):
+                raise ValueError(f"Unknown split '{split}' (expected 'train' or 'holdout')")
+            train_files, holdout = split_files(self.files, holdout_files)
+            self.files = train_files if split == "train" else holdout
+        self.cache_dir = cache_dir or os.path.join(data_dir, "..", "processed")
+        self.cache_dtype = cache_dtype
+        self.use_cache = use_cache
+        self.workers = max(1, int(workers or os.cpu_count() or 1))
+        self.arrays = []
+        self.index = np.empty((0, 2), dtype=np.int64)
         self.transform = transform
-        
+
         if not self.files:
-            logging.warning(f"No Normal_*.mat files found in {data_dir}")
+            logging.warning(f"No {pattern} files{f' in the {split} split' if split else ''} found in {data_dir}")
         else:
             self._load_data()
 
     def _load_data(self):
-        logging.info(f"Loading data from {len(self.files)} files...")
-        
-        for fpath in self.files:
-            try:
-                mat = scipy.io.loadmat(fpath)
-                
-                # Find time series key (DE or FE)
-                key = None
-                for k in mat.keys():
-                    if k.endswith("_DE_time"):
-                        key = k
-                        break
-                    elif k.endswith("_FE_time"):
-                        key = k # Fallback
-                
-                if key is None:
-                    # Fallback for weirdly named files (like raw arrays)
-                    # Use largest array?
-                    # Or specific to Normal_*.mat if they are custom.
-                    # Let's inspect shapes.
-                    for k in mat.keys():
-                        if not k.startswith("__") and isinstance(mat[k], np.ndarray):
-                            if mat[k].ndim == 2 and (mat[k].shape[0] > 10000 or mat[k].shape[1] > 10000):
-                                key = k
-                                break
-                
-                if key:
-                    signal = mat[key].flatten()
-                    self._process_signal(signal)
-                else:
-                    logging.warning(f"Could not find time-series data in {fpath}")
-
-            except Exception as e:
-                logging.error(f"Error loading {fpath}: {e}")
-        
-        logging.info(f"Loaded {len(self.samples)} samples.")
-
-    def _process_signal(self, signal):
-        # We need chunks that produce (1024, 64) spectrograms.
-        # DSP uses n_fft=2048, hop=512.
-        # (64 frames) * 512 hop + (2048 - 512) = 32768 + 1536 = 34304 samples approx?
-        # Let's verify: 
-        # t = (N_frames - 1) * hop + n_fft
-        # Samples needed = (64 - 1) * 512 + 2048 = 32256 + 2048 = 34304.
-        
-        chunk_size = 34304
-        stride = 16384 # 50% overlap for data augmentation
-        
-        for i in range(0, len(signal) - chunk_size, stride):
-            chunk = signal[i:i+chunk_size]
-            
-            # Generate Spectrogram
-            spec = dsp.compute_spectrogram(chunk, fs=12000, n_fft=2048, hop_length=512)
-            
-            # Normalize
-            spec = dsp.normalize_spectrogram(spec)
-            
-            # Check shape (should be 1024, 64)
-            if spec.shape == (1024, 64):
-                self.samples.append(spec)
+        workers = min(self.workers, len(self.files))
+        logging.info(f"Loading data from {len(self.files)} files"
+                     f"{f' with {workers} worker processes' if workers > 1 else ''}...")
+        start = time.perf_counter()
+
+        # One slot per file, filled in whatever order files finish, so the
+        # sample order only depends on the sorted file list
+        results = [None] * len(self.files)
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {
+                    pool.submit(build_file, fpath, self.cache_dir, self.cache_dtype, self.use_cache): i
+                    for i, fpath in enumerate(self.files)
+                }
+                for done, future in enumerate(as_completed(futures), 1):
+                    i = futures[future]
+                    results[i] = self._collect(i, future.result, done)
+        else:
+            for i, fpath in enumerate(self.files):
+                results[i] = self._collect(
+                    i, lambda: build_file(fpath, self.cache_dir, self.cache_dtype, self.use_cache), i + 1)
+
+        index = []
+        for specs in results:
+            if specs is not None and len(specs):
+                index.append(np.stack([np.full(len(specs), len(self.arrays)), np.arange(len(specs))], axis=1))
+                self.arrays.append(specs)
+
+        if index:
+            self.index = np.concatenate(index).astype(np.int64)
+        logging.info(f"Loaded {len(self)} samples in {time.perf_counter() - start:.1f}s.")
+
+    def _collect(self, i, result, done):
+        """Unpacks one file's build result; a failing file is logged and skipped."""
+        fpath = self.files[i]
+        try:
+            specs, elapsed, cached = result()
+            if isinstance(specs, str):
+                specs = np.load(specs, mmap_mode="r")
+        except Exception as e:
+            logging.error(f"[{done}/{len(self.files)}] Error loading {fpath}: {e}")
+            return None
+        count = 0 if specs is None else len(specs)
+        logging.info(f"[{done}/{len(self.files)}] {os.path.basename(fpath)}: {count} samples in {elapsed:.2f}s"
+                     f"{' (cached)' if cached else ''}")
+        return specs
+
+    @property
+    def shards(self):
+        """Paths of the cache entries backing this dataset, in sample order."""
+        return [a.filename for a in self.arrays if isinstance(a, np.memmap)]
 
     def __len__(self):
-        return len(self.samples)
+        return len(self.index)
 
     def __getitem__(self, idx):
         # Returns (1, 1024, 64) tensor
-        spec = self.samples[idx]
-        return np.expand_dims(spec, axis=0).astype(np.float32)
+        file_idx, row = self.index[idx]
+        spec = np.array(self.arrays[file_idx][row], dtype=np.float32)
+        spec = np.expand_dims(spec, axis=0)
+        if self.transform:
+            spec = self.transform(spec)
+        return spec
+
+class StreamingSpectrogramDataset(IterableDataset):
+    """
+    Streams (1, 1024, 64) samples from sharded spectrogram files, for corpora
+    that do not fit in memory. A shard is any .npy array of shape
+    (N, 1024, 64), e.g. the CWRUDataset cache entries.
+
+    Shards are split across DataLoader workers (shard i goes to worker
+    i % num_workers) and read sequentially through a memmap. A background
+    thread keeps `prefetch` samples ready, and a shuffle buffer of
+    `shuffle_buffer` samples randomizes their order. Memory use is bounded
+    by those two sizes, whatever the size of the corpus. Call set_epoch()
+    before each epoch to get a different shard order and shuffle. The epoch
+    lives in shared memory, so persistent DataLoader workers (which keep the
+    dataset copy they were started with) see it too.
+    """
+
+    def __init__(self, shards, shuffle_buffer=1024, prefetch=256, seed=0, transform=None):
+        if isinstance(shards, str):
+            shards = sorted(glob.glob(os.path.join(shards, "*.npy")))
+        self.shards = list(shards)
+        self.shuffle_buffer = max(0, int(shuffle_buffer))
+        self.prefetch = max(1, int(prefetch))
+        self.seed = seed
+        self._epoch = mp.Value("q", 0, lock=False)
+        self.transform = transform
+        # Only the headers are read here
+        self.lengths = [len(np.load(path, mmap_mode="r")) for path in self.shards]
+
+    @property
+    def epoch(self):
+        return self._epoch.value
+
+    def set_epoch(self, epoch):
+        self._epoch.value = epoch
+
+    def __len__(self):
+        return sum(self.lengths)
+
+    def _worker_shards(self, rng):
+        order = rng.permutation(len(self.shards)) if self.shuffle_buffer else np.arange(len(self.shards))
+        info = get_worker_info()
+        if info is not None:
+            # Split after the (seed-identical) permutation so workers never overlap
+            order = order[info.id::info.num_workers]
+        return [self.shards[i] for i in order]
+
+    @staticmethod
+    def _put(out, item, stop):
+        """Blocking put that gives up once the consumer has gone away."""
+        while not stop.is_set():
+            try:
+                out.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _read(self, shards, out, stop):
+        """Prefetch thread: pushes float32 samples, then a None sentinel (or the exception)."""
+        try:
+            for path in shards:
+                for spec in np.load(path, mmap_mode="r"):
+                    sample = np.array(spec, dtype=np.float32)[np.newaxis]
+                    if not self._put(out, sample, stop):
+                        return
+            self._put(out, None, stop)
+        except Exception as e:
+            logging.error(f"Error streaming shards: {e}")
+            self._put(out, e, stop)
+
+    def _samples(self, shards):
+        out = queue.Queue(maxsize=self.prefetch)
+        stop = threading.Event()
+        reader = threading.Thread(target=self._read, args=(shards, out, stop), daemon=True)
+        reader.start()
+        try:
+            while True:
+                sample = out.get()
+                if sample is None:
+                    return
+                if isinstance(sample, Exception):
+                    raise sample
+                yield sample
+        finally:
+            stop.set()
+            reader.join()
+
+    def __iter__(self):
+        info = get_worker_info()
+        rng = np.random.default_rng((self.seed, self.epoch))
+        shards = self._worker_shards(rng)
+        # Per-worker stream for the shuffle buffer
+        local_rng = np.random.default_rng((self.seed, self.epoch, info.id if info else 0))
+
+        buffer = []
+        for sample in self._samples(shards):
+            if len(buffer) < self.shuffle_buffer:
+                buffer.append(sample)
+                continue
+            if self.shuffle_buffer:
+                i = local_rng.integers(len(buffer))
+                buffer[i], sample = sample, buffer[i]
+            yield self.transform(sample) if self.transform else sample
+
+        local_rng.shuffle(buffer)
+        for sample in buffer:
+            yield self.transform(sample) if self.transform else sample
 
 if __name__=="__main__":
     # Test
     logging.basicConfig(level=logging.INFO)
-    ds = CWRUDataset("python/data/cwru")
+    ds = CWRUDataset("python/data/cwru", workers=int(sys.argv[1]) if len(sys.argv) > 1 else 1)
     if len(ds) > 0:
         print(f"Sample shape: {ds[0].shape}")
     else:
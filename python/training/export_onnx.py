@@ -2,38 +2,53 @@ import torch
 import torch.onnx
 import os
 import sys
+import json
+import time
+import argparse
+import importlib.util
+import numpy as np
 
 # Adjust path to import model
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-from training.model import ConvAutoencoder
+from training.model import MODEL_VARIANTS, build_model, artifact_name
+from training.dataset import HOLDOUT_FILES
 
-def export():
+ONNX_DIR = os.path.join(os.path.dirname(__file__), "..", "onnx")
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "cwru")
+WEIGHTS_DIR = os.path.join(os.path.dirname(__file__), "..", "weights")
+
+def weights_path(variant="base"):
+    return os.path.join(WEIGHTS_DIR, f"{artifact_name(variant)}.pth")
+
+def onnx_path(variant="base"):
+    return os.path.join(ONNX_DIR, f"{artifact_name(variant)}.onnx")
+
+def export(variant="base"):
     # Paths
-    weights_path = os.path.join(os.path.dirname(__file__), "..", "weights", "autoencoder.pth")
-    onnx_dir = os.path.join(os.path.dirname(__file__), "..", "onnx")
-    os.makedirs(onnx_dir, exist_ok=True)
-    onnx_path = os.path.join(onnx_dir, "autoencoder.onnx")
-    
+    variant_weights = weights_path(variant)
+    os.makedirs(ONNX_DIR, exist_ok=True)
+    variant_onnx = onnx_path(variant)
+
     # Load Model
-    model = ConvAutoencoder()
-    if os.path.exists(weights_path):
-        print(f"Loading weights from {weights_path}")
-        model.load_state_dict(torch.load(weights_path))
+    model = build_model(variant)
+    if os.path.exists(variant_weights):
+        print(f"Loading weights from {variant_weights}")
+        model.load_state_dict(torch.load(variant_weights))
     else:
-        print(f"Warning: No weights found at {weights_path}. Exporting random initialized model.")
-    
+        print(f"Warning: No weights found at {variant_weights}. Exporting random initialized model.")
+
     model.eval()
-    
+
     # Dummy input for tracing
     dummy_input = torch.randn(1, 1, 1024, 64)
-    
+
     # Export
-    print(f"Exporting to {onnx_path}...")
+    print(f"Exporting '{variant}' to {variant_onnx}...")
     try:
         torch.onnx.export(
             model,
             dummy_input,
-            onnx_path,
+            variant_onnx,
             export_params=True,
             opset_version=11,
             do_constant_folding=True,
@@ -42,14 +57,410 @@ def export():
             dynamic_axes={'input': {0: 'batch_size'}, 'output': {0: 'batch_size'}}
         )
         print("Export complete.")
+        return variant_onnx
     except Exception as e:
         print(f"EXPORT FAILED: {e}")
         import traceback
         traceback.print_exc()
+        return None
+
+# ─── INT8 Static Quantization ────────────────────────────────────────────────
+
+def load_spectrograms(calib_samples, eval_samples, holdout_files=HOLDOUT_FILES):
+    """
+    Returns (calibration, held_out, held_out_source): arrays of (1, 1024, 64)
+    float32 samples. Calibration samples are spread over the recordings
+    train.py trains on; evaluation samples come from the Normal recordings it
+    held out (see load_holdout_spectrograms for `held_out_source`). Falls
+    back to random data (like train.py) if no recordings are available,
+    which is only useful to exercise the pipeline - the report is
+    meaningless then.
+    """
+    calibration = None
+    try:
+        from training.dataset import CWRUDataset
+        dataset = CWRUDataset(DATA_DIR, split="train", holdout_files=holdout_files)
+        # Spread the picks across the whole dataset (and thus across files)
+        count = min(len(dataset), calib_samples)
+        if count > 0:
+            picks = np.linspace(0, len(dataset) - 1, count).astype(int)
+            calibration = np.stack([dataset[i] for i in picks]).astype(np.float32)
+    except Exception as e:
+        print(f"Error loading real data: {e}")
+
+    if calibration is None:
+        print("Warning: No real data found. Calibrating on random data for demonstration.")
+        calibration = np.random.default_rng(1).random((calib_samples, 1, 1024, 64), dtype=np.float32)
+
+    held_out, held_out_source = load_holdout_spectrograms(eval_samples, holdout_files)
+    return calibration, held_out, held_out_source
+
+def load_holdout_spectrograms(count, holdout_files):
+    """
+    Up to `count` (1, 1024, 64) float32 samples from the Normal recordings
+    that train.py --holdout-files kept out of training. Returns
+    (samples, source): "held_out_recordings", or "training_recordings" if
+    nothing was held out (scores are then optimistic), or "random" without
+    any recordings.
+    """
+    try:
+        from training.dataset import CWRUDataset
+        for split, source in (("holdout", "held_out_recordings"), (None, "training_recordings")):
+            dataset = CWRUDataset(DATA_DIR, split=split, holdout_files=holdout_files)
+            if len(dataset):
+                if source != "held_out_recordings":
+                    print("Warning: No held-out Normal recordings; evaluating on training windows.")
+                picks = np.linspace(0, len(dataset) - 1, min(len(dataset), count)).astype(int)
+                return np.stack([dataset[i] for i in picks]).astype(np.float32), source
+    except Exception as e:
+        print(f"Error loading real data: {e}")
+    print("Warning: No real data found. Evaluating on random data for demonstration.")
+    return np.random.default_rng(0).random((count, 1, 1024, 64), dtype=np.float32), "random"
+
+def quantize(onnx_path, calibration, per_channel=True):
+    """Static INT8 quantization (QDQ format) calibrated on normal spectrograms."""
+    import onnx
+    from onnx import version_converter
+    from onnxruntime.quantization import (
+        quantize_static, quant_pre_process, CalibrationDataReader,
+        QuantFormat, QuantType, CalibrationMethod,
+    )
+
+    class SpectrogramReader(CalibrationDataReader):
+        def __init__(self, samples):
+            self.iterator = iter(samples)
+
+        def get_next(self):
+            sample = next(self.iterator, None)
+            return None if sample is None else {"input": sample[np.newaxis]}
+
+    stem, _ = os.path.splitext(onnx_path)
+    prep_path = f"{stem}.prep.onnx"
+    int8_path = f"{stem}.int8.onnx"
+
+    # QDQ needs opset >= 13 for per-channel (axis) quantization; the runtime
+    # export stays at opset 11, only the quantized copy is upgraded.
+    source = onnx_path
+    model = onnx.load(onnx_path)
+    opset = next(o.version for o in model.opset_import if o.domain in ("", "ai.onnx"))
+    if opset < 13:
+        onnx.save(version_converter.convert_version(model, 13), prep_path)
+        source = prep_path
+
+    # Shape inference + graph cleanup recommended before static quantization
+    try:
+        quant_pre_process(source, prep_path)
+        source = prep_path
+    except Exception as e:
+        print(f"Warning: pre-processing failed ({e}), quantizing without it")
+
+    print(f"Quantizing to {int8_path} ({len(calibration)} calibration samples)...")
+    try:
+        quantize_static(
+            source,
+            int8_path,
+            SpectrogramReader(calibration),
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            per_channel=per_channel,
+            calibrate_method=CalibrationMethod.MinMax,
+        )
+    finally:
+        if os.path.exists(prep_path):
+            os.remove(prep_path)
+    print("Quantization complete.")
+    return int8_path
+
+def reconstruction_errors(session, samples, batch_size=16):
+    """Per-sample MSE of an autoencoder (or scoring graph) session over (N, 1, 1024, 64) samples."""
+    name = session.get_inputs()[0].name
+    scoring = session.get_outputs()[0].name == "mse"
+    mse = []
+    for i in range(0, len(samples), batch_size):
+        x = samples[i:i + batch_size]
+        if scoring:
+            mse.append(session.run(["mse"], {name: x})[0])
+            continue
+        reconstruction = session.run(None, {name: x})[0]
+        mse.append(np.mean((x - reconstruction) ** 2, axis=(1, 2, 3)))
+    return np.concatenate(mse)
+
+def benchmark(model_path, held_out, runs=50, batch_size=16, threads=0):
+    """
+    Latency at batch 1, throughput at batch_size, and per-sample MSE on
+    held-out data. `threads` sets ORT's intra-op threads (0: ORT default).
+    """
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = threads
+    session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+    name = session.get_inputs()[0].name
+
+    single = held_out[:1]
+    for _ in range(5):
+        session.run(None, {name: single})
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        session.run(None, {name: single})
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    batch = held_out[:batch_size]
+    if len(batch) < batch_size:
+        batch = np.resize(held_out, (batch_size,) + held_out.shape[1:])
+    session.run(None, {name: batch})
+    start = time.perf_counter()
+    for _ in range(max(1, runs // 5)):
+        session.run(None, {name: batch})
+    elapsed = time.perf_counter() - start
+
+    mse = reconstruction_errors(session, held_out, batch_size)
+
+    return {
+        "model": os.path.basename(model_path),
+        "size_bytes": os.path.getsize(model_path),
+        "latency_ms_p50": float(np.percentile(latencies, 50)),
+        "latency_ms_p95": float(np.percentile(latencies, 95)),
+        "throughput_samples_per_s": float(batch_size * max(1, runs // 5) / elapsed),
+        "mse_mean": float(mse.mean()),
+        "mse_std": float(mse.std()),
+        "mse_p50": float(np.percentile(mse, 50)),
+        "mse_p95": float(np.percentile(mse, 95)),
+        "mse_p99": float(np.percentile(mse, 99)),
+    }, mse
+
+def compare(fp32_path, int8_path, held_out, report_path, held_out_source="held_out_recordings", scoring_checks=None):
+    """Writes an fp32 vs int8 comparison report (JSON) and prints a summary."""
+    fp32, fp32_mse = benchmark(fp32_path, held_out)
+    int8, int8_mse = benchmark(int8_path, held_out)
+
+    drift = int8_mse - fp32_mse
+    report = {
+        "held_out_samples": int(len(held_out)),
+        # "held_out_recordings": Normal recordings train.py never saw;
+        # "training_recordings": training windows (nothing was held out)
+        "held_out_source": held_out_source,
+        "fp32": fp32,
+        "int8": int8,
+        "size_ratio": int8["size_bytes"] / fp32["size_bytes"],
+        "latency_speedup": fp32["latency_ms_p50"] / int8["latency_ms_p50"],
+        "throughput_speedup": int8["throughput_samples_per_s"] / fp32["throughput_samples_per_s"],
+        "mse_drift": {
+            "mean_abs": float(np.abs(drift).mean()),
+            "max_abs": float(np.abs(drift).max()),
+            "mean_relative": float(np.mean(np.abs(drift) / np.maximum(fp32_mse, 1e-12))),
+            "p99_shift": int8["mse_p99"] - fp32["mse_p99"],
+            # Thresholds are set on the MSE distribution; its ranking must survive
+            "correlation": float(np.corrcoef(fp32_mse, int8_mse)[0, 1]) if len(drift) > 1 else 1.0,
+        },
+    }
+    if scoring_checks:
+        # check_scoring results for the *.scoring.onnx graphs, by precision
+        report["scoring_check"] = scoring_checks
+
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n{'':<24}{'fp32':>14}{'int8':>14}")
+    print(f"{'size (KB)':<24}{fp32['size_bytes'] / 1024:>14.1f}{int8['size_bytes'] / 1024:>14.1f}")
+    print(f"{'latency p50 (ms)':<24}{fp32['latency_ms_p50']:>14.3f}{int8['latency_ms_p50']:>14.3f}")
+    print(f"{'latency p95 (ms)':<24}{fp32['latency_ms_p95']:>14.3f}{int8['latency_ms_p95']:>14.3f}")
+    print(f"{'throughput (samples/s)':<24}{fp32['throughput_samples_per_s']:>14.1f}{int8['throughput_samples_per_s']:>14.1f}")
+    print(f"{'MSE mean':<24}{fp32['mse_mean']:>14.6f}{int8['mse_mean']:>14.6f}")
+    print(f"{'MSE p99':<24}{fp32['mse_p99']:>14.6f}{int8['mse_p99']:>14.6f}")
+    print(f"MSE drift: mean |d| {report['mse_drift']['mean_abs']:.6f}, "
+          f"relative {report['mse_drift']['mean_relative'] * 100:.2f}%, "
+          f"correlation {report['mse_drift']['correlation']:.4f}")
+    print(f"Report written to {report_path}")
+    return report
+
+# ─── Fused Scoring Graph ─────────────────────────────────────────────────────
+
+# Node A: 44.1 kHz audio, 2048-point FFT, bins 1..1024 (DC dropped)
+SAMPLE_RATE = 44100
+N_FFT = 2048
+
+def band_weights(edges_hz, bins=1024, sample_rate=SAMPLE_RATE, n_fft=N_FFT):
+    """
+    (bins, B) matrix averaging per-bin errors into the frequency bands split
+    at `edges_hz`, plus the band names. Bin i is at (i + 1) * sample_rate / n_fft.
+    """
+    freqs = (np.arange(bins) + 1) * sample_rate / n_fft
+    bounds = [0.0] + sorted(float(e) for e in edges_hz) + [float("inf")]
+    weights = np.zeros((bins, len(bounds) - 1), dtype=np.float32)
+    names = []
+    for b, (lo, hi) in enumerate(zip(bounds[:-1], bounds[1:])):
+        members = (freqs >= lo) & (freqs < hi)
+        if not members.any():
+            raise ValueError(f"No spectrogram bins between {lo:g} and {hi:g} Hz")
+        weights[members, b] = 1.0 / members.sum()
+        names.append(f"{lo:g}-{hi:g}Hz" if hi != float("inf") else f">{lo:g}Hz")
+    return weights, names
+
+def append_scoring(model_path, edges_hz=(1000, 5000), normalize=False, sample_rate=SAMPLE_RATE, n_fft=N_FFT):
+    """
+    Appends anomaly scoring to an exported autoencoder (fp32 or int8): optional
+    per-sample min-max input normalization (as utils.dsp.normalize_spectrogram),
+    the squared reconstruction error, and its reductions to a per-sample MSE
+    ("mse", (N,)) and mean error per frequency band ("band_errors", (N, B)).
+    The reconstruction stays internal, so callers only get N * (B + 1) floats
+    back. Band names are stored in the model metadata ("resonance.bands").
+    Writes <model>.scoring.onnx and returns its path.
+    """
+    import onnx
+    from onnx import helper, numpy_helper, TensorProto
+
+    model = onnx.load(model_path)
+    graph = model.graph
+    input_name = graph.input[0].name
+    output = graph.output[0]
+    bins = output.type.tensor_type.shape.dim[2].dim_value or 1024
+    weights, names = band_weights(edges_hz, bins, sample_rate, n_fft)
+
+    before, after = [], []
+    x = input_name
+    if normalize:
+        # Every consumer of the raw input now reads the normalized tensor
+        x = "scoring_normalized"
+        for node in graph.node:
+            for i, name in enumerate(node.input):
+                if name == input_name:
+                    node.input[i] = x
+        graph.initializer.extend([
+            numpy_helper.from_array(np.array(1e-6, dtype=np.float32), "scoring_eps"),
+            numpy_helper.from_array(np.array(1.0, dtype=np.float32), "scoring_one"),
+        ])
+        before += [
+            helper.make_node("ReduceMin", [input_name], ["scoring_min"], axes=[1, 2, 3], keepdims=1),
+            helper.make_node("ReduceMax", [input_name], ["scoring_max"], axes=[1, 2, 3], keepdims=1),
+            helper.make_node("Sub", ["scoring_max", "scoring_min"], ["scoring_span"]),
+            # Flat spectrograms are only shifted
+            helper.make_node("Less", ["scoring_span", "scoring_eps"], ["scoring_flat"]),
+            helper.make_node("Where", ["scoring_flat", "scoring_one", "scoring_span"], ["scoring_scale"]),
+            helper.make_node("Sub", [input_name, "scoring_min"], ["scoring_shifted"]),
+            helper.make_node("Div", ["scoring_shifted", "scoring_scale"], [x]),
+        ]
+
+    graph.initializer.append(numpy_helper.from_array(weights, "scoring_band_weights"))
+    after += [
+        helper.make_node("Sub", [x, output.name], ["scoring_diff"]),
+        helper.make_node("Mul", ["scoring_diff", "scoring_diff"], ["scoring_squared"]),
+        # (N, 1, bins, frames) -> (N, bins): error per frequency bin
+        helper.make_node("ReduceMean", ["scoring_squared"], ["scoring_per_bin"], axes=[1, 3], keepdims=0),
+        helper.make_node("ReduceMean", ["scoring_per_bin"], ["mse"], axes=[1], keepdims=0),
+        helper.make_node("MatMul", ["scoring_per_bin", "scoring_band_weights"], ["band_errors"]),
+    ]
+    model_nodes = list(graph.node)
+    del graph.node[:]
+    graph.node.extend(before + model_nodes + after)
+    graph.output.remove(output)
+    graph.output.extend([
+        helper.make_tensor_value_info("mse", TensorProto.FLOAT, ["batch_size"]),
+        helper.make_tensor_value_info("band_errors", TensorProto.FLOAT, ["batch_size", len(names)]),
+    ])
+    helper.set_model_props(model, {
+        **{p.key: p.value for p in model.metadata_props},
+        "resonance.bands": json.dumps(names),
+        "resonance.normalize": "minmax" if normalize else "none",
+    })
+    onnx.checker.check_model(model)
+
+    stem, _ = os.path.splitext(model_path)
+    scoring_path = f"{stem}.scoring.onnx"
+    onnx.save(model, scoring_path)
+    print(f"Scoring graph written to {scoring_path} (bands: {', '.join(names)}"
+          f"{', min-max normalized input' if normalize else ''})")
+    return scoring_path
+
+def check_scoring(model_path, scoring_path, samples, normalize=False, rtol=1e-4, atol=1e-6):
+    """
+    Scores `samples` through the scoring graph and checks its "mse" against
+    reconstruction_errors on the model it was appended to (on normalized
+    samples if the graph normalizes). Raises ValueError on a mismatch and
+    returns {"samples", "max_abs_diff"} otherwise.
+    """
+    import onnxruntime as ort
+
+    base = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+    scoring = ort.InferenceSession(scoring_path, providers=["CPUExecutionProvider"])
+    expected_input = samples
+    if normalize:
+        from utils.dsp import normalize_spectrogram_batch
+        expected_input = normalize_spectrogram_batch(samples[:, 0])[:, None]
+    expected = reconstruction_errors(base, expected_input)
+    actual = reconstruction_errors(scoring, samples)
+
+    max_abs_diff = float(np.abs(actual - expected).max())
+    if not np.allclose(actual, expected, rtol=rtol, atol=atol):
+        raise ValueError(f"{scoring_path}: mse differs from {model_path} by up to {max_abs_diff:.3g} "
+                         f"on {len(samples)} samples")
+    print(f"Scoring graph check passed on {len(samples)} samples (max |d| {max_abs_diff:.3g})")
+    return {"samples": int(len(samples)), "max_abs_diff": max_abs_diff}
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Export the autoencoder to ONNX, optionally with INT8 quantization.")
+    parser.add_argument("--variant", default="base",
+                        help=f"Model variant to export, comma-separated list or 'all' ({', '.join(MODEL_VARIANTS)})")
+    parser.add_argument("--quantize", action="store_true",
+                        help="Also produce a static INT8 model calibrated on CWRU normal data")
+    parser.add_argument("--calib-samples", type=int, default=200,
+                        help="Spectrograms used for calibration")
+    parser.add_argument("--eval-samples", type=int, default=200,
+                        help="Held-out spectrograms used for the comparison report")
+    parser.add_argument("--check-samples", type=int, default=32,
+                        help="Scoring: held-out spectrograms scored to check each scoring graph")
+    parser.add_argument("--holdout-files", type=int, default=HOLDOUT_FILES,
+                        help="Normal recordings held out by train.py --holdout-files; the report is "
+                             "computed on them (must match training)")
+    parser.add_argument("--per-tensor", action="store_true",
+                        help="Per-tensor instead of per-channel weight quantization")
+    parser.add_argument("--scoring", action="store_true",
+                        help="Also write *.scoring.onnx graphs that return MSE and per-band error instead of "
+                             "the reconstruction (for Node B)")
+    parser.add_argument("--bands", default="1000,5000",
+                        help="Scoring: band edges in Hz, comma-separated")
+    parser.add_argument("--normalize", action="store_true",
+                        help="Scoring: min-max normalize each input spectrogram inside the graph")
+    return parser.parse_args()
+
+def parse_variants(spec):
+    variants = list(MODEL_VARIANTS) if spec == "all" else [v.strip() for v in spec.split(",") if v.strip()]
+    unknown = [v for v in variants if v not in MODEL_VARIANTS]
+    if unknown:
+        raise SystemExit(f"Unknown model variant(s): {', '.join(unknown)} (expected {', '.join(MODEL_VARIANTS)})")
+    return variants
 
 if __name__ == "__main__":
+    args = parse_args()
+    # Checked up front so a missing package does not surface only after the export
+    if (args.scoring or args.quantize) and importlib.util.find_spec("onnx") is None:
+        raise SystemExit("--scoring and --quantize need the onnx package (pip install -r python/requirements.txt)")
     try:
-        export()
+        calibration = held_out = held_out_source = None
+        edges = [float(e) for e in args.bands.split(",") if e.strip()]
+        for variant in parse_variants(args.variant):
+            exported = export(variant)
+            if not exported:
+                continue
+            if held_out is None and args.quantize:
+                calibration, held_out, held_out_source = load_spectrograms(
+                    args.calib_samples, args.eval_samples, args.holdout_files)
+            elif held_out is None and args.scoring:
+                held_out, held_out_source = load_holdout_spectrograms(args.eval_samples, args.holdout_files)
+            checks = {}
+            if args.scoring:
+                scoring_path = append_scoring(exported, edges, args.normalize)
+                checks["fp32"] = check_scoring(exported, scoring_path, held_out[:args.check_samples], args.normalize)
+            if args.quantize:
+                int8_path = quantize(exported, calibration, per_channel=not args.per_tensor)
+                if args.scoring:
+                    scoring_path = append_scoring(int8_path, edges, args.normalize)
+                    checks["int8"] = check_scoring(int8_path, scoring_path, held_out[:args.check_samples],
+                                                   args.normalize)
+                report_path = os.path.splitext(int8_path)[0] + ".report.json"
+                compare(exported, int8_path, held_out, report_path, held_out_source, checks)
     except Exception as e:
         print(f"SCRIPT FAILED: {e}")
         import traceback
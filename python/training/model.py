@@ -1,41 +1,105 @@
 import torch
 import torch.nn as nn
 
+# Encoder channels per level at width 1.0; the decoder mirrors them
+BASE_CHANNELS = (16, 32, 64, 128, 256, 512)
+DOWNSAMPLING = ("stride", "pool")
+
+# Named points of the model family. "base" is the original 16/32/64
+# autoencoder and loads its weights unchanged; the others trade accuracy
+# for latency on slower edge CPUs (see training/select_model.py).
+MODEL_VARIANTS = {
+    "base": {},
+    "slim": {"width": 0.5},
+    "wide": {"width": 2.0},
+    "deep": {"depth": 4},
+    "pooled": {"downsample": "pool"},
+    "separable": {"separable": True},
+    "slim-separable": {"width": 0.5, "separable": True},
+    "deep-separable": {"depth": 4, "separable": True},
+}
+
 class ConvAutoencoder(nn.Module):
-    def __init__(self):
+    """
+    Convolutional autoencoder over (1, 1024, 64) spectrograms.
+
+    Every encoder level halves both axes, either with a strided 3x3 conv or
+    with a 3x3 conv followed by 2x2 max pooling (`downsample`), and the
+    decoder mirrors it with transposed convs. `width` scales the channel
+    counts of BASE_CHANNELS and `depth` sets the number of levels (1-6).
+    With `separable`, 3x3 convs after the first layer are split into a
+    depthwise 3x3 and a pointwise 1x1 conv, and the decoder upsamples
+    (nearest) before them instead of using transposed convs.
+
+    The defaults build the original model, with the same state_dict keys.
+    """
+
+    def __init__(self, width=1.0, depth=3, separable=False, downsample="stride"):
         super(ConvAutoencoder, self).__init__()
-        
-        # Encoder
-        self.encoder = nn.Sequential(
-            # Input: (1, 1024, 64)
-            nn.Conv2d(1, 16, kernel_size=3, stride=2, padding=1),  # (16, 512, 32)
-            nn.ReLU(),
-            nn.Conv2d(16, 32, kernel_size=3, stride=2, padding=1), # (32, 256, 16)
-            nn.ReLU(),
-            nn.Conv2d(32, 64, kernel_size=3, stride=2, padding=1), # (64, 128, 8)
-            nn.ReLU()
-        )
-        
-        # Decoder
-        self.decoder = nn.Sequential(
-            nn.ConvTranspose2d(64, 32, kernel_size=3, stride=2, padding=1, output_padding=1), # (32, 256, 16)
-            nn.ReLU(),
-            nn.ConvTranspose2d(32, 16, kernel_size=3, stride=2, padding=1, output_padding=1), # (16, 512, 32)
-            nn.ReLU(),
-            nn.ConvTranspose2d(16, 1, kernel_size=3, stride=2, padding=1, output_padding=1),  # (1, 1024, 64)
-            nn.Sigmoid() # Normalize output to [0, 1] if input is normalized
-        )
+        if not 1 <= depth <= len(BASE_CHANNELS):
+            raise ValueError(f"depth must be between 1 and {len(BASE_CHANNELS)}, got {depth}")
+        if downsample not in DOWNSAMPLING:
+            raise ValueError(f"downsample must be one of {DOWNSAMPLING}, got '{downsample}'")
+        if width <= 0:
+            raise ValueError(f"width must be positive, got {width}")
+        self.config = {"width": width, "depth": depth, "separable": separable, "downsample": downsample}
+
+        channels = [1] + [max(1, int(round(c * width))) for c in BASE_CHANNELS[:depth]]
+        pool = downsample == "pool"
+
+        # Encoder: (1, 1024, 64) -> (channels[-1], 1024 / 2^depth, 64 / 2^depth)
+        encoder = []
+        for c_in, c_out in zip(channels[:-1], channels[1:]):
+            stride = 1 if pool else 2
+            if separable and c_in > 1:
+                encoder += [
+                    nn.Conv2d(c_in, c_in, kernel_size=3, stride=stride, padding=1, groups=c_in),
+                    nn.Conv2d(c_in, c_out, kernel_size=1),
+                ]
+            else:
+                encoder.append(nn.Conv2d(c_in, c_out, kernel_size=3, stride=stride, padding=1))
+            encoder.append(nn.ReLU())
+            if pool:
+                encoder.append(nn.MaxPool2d(2))
+        self.encoder = nn.Sequential(*encoder)
+
+        # Decoder: back to (1, 1024, 64)
+        decoder = []
+        for c_in, c_out in zip(channels[:0:-1], channels[-2::-1]):
+            if separable:
+                decoder += [
+                    nn.Upsample(scale_factor=2, mode="nearest"),
+                    nn.Conv2d(c_in, c_in, kernel_size=3, padding=1, groups=c_in),
+                    nn.Conv2d(c_in, c_out, kernel_size=1),
+                ]
+            else:
+                decoder.append(nn.ConvTranspose2d(c_in, c_out, kernel_size=3, stride=2, padding=1, output_padding=1))
+            decoder.append(nn.ReLU() if c_out > 1 else nn.Sigmoid()) # Normalize output to [0, 1] if input is normalized
+        self.decoder = nn.Sequential(*decoder)
 
     def forward(self, x):
         x = self.encoder(x)
         x = self.decoder(x)
         return x
 
+def build_model(variant="base"):
+    """ConvAutoencoder for a MODEL_VARIANTS name."""
+    if variant not in MODEL_VARIANTS:
+        raise ValueError(f"Unknown model variant '{variant}' (expected one of {', '.join(MODEL_VARIANTS)})")
+    return ConvAutoencoder(**MODEL_VARIANTS[variant])
+
+def artifact_name(variant="base"):
+    """File stem for a variant's weights and ONNX exports ("autoencoder" for base, as before)."""
+    return "autoencoder" if variant == "base" else f"autoencoder_{variant}"
+
+def count_parameters(model):
+    return sum(p.numel() for p in model.parameters())
+
 if __name__ == "__main__":
-    # Test model shape
-    model = ConvAutoencoder()
+    # Test model shapes
     dummy_input = torch.randn(1, 1, 1024, 64)
-    output = model(dummy_input)
-    print(f"Input shape: {dummy_input.shape}")
-    print(f"Output shape: {output.shape}")
-    assert dummy_input.shape == output.shape, "Shape mismatch!"
+    for name in MODEL_VARIANTS:
+        model = build_model(name)
+        output = model(dummy_input)
+        print(f"{name:<16} {count_parameters(model):>9,} params  {dummy_input.shape} -> {output.shape}")
+        assert dummy_input.shape == output.shape, f"Shape mismatch for {name}!"
@@ -0,0 +1,235 @@
+"""
+Benchmarks every exported model variant on this machine and recommends the
+most accurate one that fits a per-window latency budget.
+
+    python training/select_model.py --budget-ms 5
+    python training/select_model.py --sensors 8 --variants base,slim,separable
+
+Edge boxes differ a lot in CPU, so run this on (a box like) the target.
+For each variant (training/model.py) the ONNX export is benchmarked with
+ONNX Runtime on the local CPU at batch 1, and its reconstruction error is
+compared between held-out normal spectrograms and fault spectrograms. Fault
+samples come from the CWRU fault recordings (--fault-pattern) when present,
+otherwise from synthetic fault signatures added to the normal samples.
+Normal samples come from the recordings train.py held out (--holdout-files,
+same value as for training), so larger variants cannot score well by having
+memorised their training windows.
+
+Accuracy is the ROC AUC of the MSE (normal vs fault), with the share of
+faults above the normal p99 MSE (where Node B thresholds usually sit) as a
+tie-breaker. A variant fits if its p95 latency is within --budget-ms
+divided by --sensors. Variants without trained weights are exported with
+random weights; they are benchmarked and listed but not eligible for the
+recommendation unless --include-untrained is given. The full report is
+written as JSON.
+"""
+import os
+import sys
+import json
+import argparse
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from training.model import MODEL_VARIANTS, build_model, count_parameters
+from training.dataset import HOLDOUT_FILES
+from training.export_onnx import (
+    ONNX_DIR, DATA_DIR, export, onnx_path, weights_path, load_holdout_spectrograms, benchmark,
+    reconstruction_errors, parse_variants,
+)
+
+# One FFT hop (512 samples at 44.1 kHz): the time Node A takes per window
+WINDOW_MS = 512 / 44100 * 1000
+
+def load_faults(count, pattern, normal, seed=0):
+    """
+    Up to `count` fault spectrograms from the CWRU recordings matching
+    `pattern`, or synthetic ones derived from `normal` if there are none.
+    Returns (samples, source).
+    """
+    try:
+        from training.dataset import CWRUDataset
+        dataset = CWRUDataset(DATA_DIR, pattern=pattern)
+        if len(dataset):
+            picks = np.linspace(0, len(dataset) - 1, min(len(dataset), count)).astype(int)
+            return np.stack([dataset[i] for i in picks]).astype(np.float32), "recordings"
+    except Exception as e:
+        print(f"Error loading fault data: {e}")
+    print(f"Warning: No {pattern} recordings found. Using synthetic fault signatures.")
+    return synthetic_faults(normal[:count], np.random.default_rng(seed)), "synthetic"
+
+def synthetic_faults(normal, rng):
+    """
+    Harmonic, impulsive and broadband fault signatures (as in the Node A
+    simulator) added in turn to copies of normalized (N, 1, 1024, 64) samples.
+    """
+    faults = normal.copy()
+    bins = faults.shape[2]
+    decay = np.exp(-np.linspace(0, 2, bins, dtype=np.float32))[:, None]
+    for i, sample in enumerate(faults[:, 0]):
+        kind = i % 3
+        if kind == 0:
+            # Sidebands / extra harmonics of a defect frequency
+            defect = bins // 16
+            for k in range(1, bins // defect):
+                sample[defect * k] += 0.3 / np.sqrt(k)
+        elif kind == 1:
+            # Periodic broadband impacts, e.g. a spalled bearing race
+            sample[:, rng.integers(0, 8)::8] += 0.25 * decay
+        else:
+            # Raised noise floor, e.g. cavitation or looseness
+            sample += 0.15 * np.abs(rng.standard_normal(sample.shape, dtype=np.float32))
+    return np.clip(faults, 0.0, 1.0, out=faults)
+
+def separation(normal_mse, fault_mse):
+    """How well the MSE tells fault from normal samples."""
+    ranked = np.sort(normal_mse)
+    # AUC = P(fault MSE > normal MSE), ties counted half
+    below = np.searchsorted(ranked, fault_mse, side="left")
+    not_above = np.searchsorted(ranked, fault_mse, side="right")
+    auc = float(np.mean((below + not_above) / 2) / len(ranked))
+    threshold = float(np.percentile(normal_mse, 99))
+    return {
+        "auc": auc,
+        "normal_mse_p99": threshold,
+        "fault_mse_p50": float(np.percentile(fault_mse, 50)),
+        "detection_rate_at_p99": float(np.mean(fault_mse > threshold)),
+        # Median fault MSE in multiples of the normal p99
+        "separation_ratio": float(np.percentile(fault_mse, 50) / max(threshold, 1e-12)),
+    }
+
+def evaluate(variant, normal, faults, threads, runs, reexport):
+    import onnxruntime as ort
+
+    path = onnx_path(variant)
+    if reexport or not os.path.exists(path):
+        path = export(variant)
+        if path is None:
+            return None
+    stats, normal_mse = benchmark(path, normal, runs=runs, threads=threads)
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = threads
+    session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+    fault_mse = reconstruction_errors(session, faults)
+    return {
+        "variant": variant,
+        "config": build_model(variant).config,
+        "parameters": count_parameters(build_model(variant)),
+        "trained": os.path.exists(weights_path(variant)),
+        "onnx_path": os.path.relpath(path),
+        **stats,
+        **separation(normal_mse, fault_mse),
+    }
+
+def recommend(results, budget_ms):
+    """Most accurate eligible variant whose p95 latency fits the budget, or None."""
+    fitting = [r for r in results if r["eligible"] and r["latency_ms_p95"] <= budget_ms]
+    if not fitting:
+        return None
+    return max(fitting, key=lambda r: (r["auc"], r["detection_rate_at_p99"], -r["latency_ms_p95"]))
+
+def print_table(results, budget_ms):
+    print(f"\n{'variant':<16}{'params':>10}{'p50 ms':>9}{'p95 ms':>9}{'AUC':>8}{'det@p99':>9}{'ratio':>8}  fits")
+    for r in results:
+        print(f"{r['variant']:<16}{r['parameters']:>10,}{r['latency_ms_p50']:>9.3f}{r['latency_ms_p95']:>9.3f}"
+              f"{r['auc']:>8.3f}{r['detection_rate_at_p99'] * 100:>8.1f}%{r['separation_ratio']:>8.2f}  "
+              f"{'yes' if r['latency_ms_p95'] <= budget_ms else 'no'}"
+              f"{'' if r['trained'] else '  (untrained' + ('' if r['eligible'] else ', not eligible') + ')'}")
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
+def positive_float(value):
+    number = float(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"must be positive, got {value}")
+    return number
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Pick the most accurate model variant that fits a latency budget.")
+    parser.add_argument("--variants", default="all",
+                        help=f"Comma-separated variants or 'all' ({', '.join(MODEL_VARIANTS)})")
+    parser.add_argument("--budget-ms", type=positive_float, default=WINDOW_MS,
+                        help="Per-window latency budget in ms (default: one FFT hop, real time for one sensor)")
+    parser.add_argument("--sensors", type=positive_int, default=1,
+                        help="Sensors scored by this box; the budget is shared between them")
+    parser.add_argument("--threads", type=int, default=0,
+                        help="ORT intra-op threads, as ORT_INTRA_OP_THREADS on Node B (0: ORT default)")
+    parser.add_argument("--eval-samples", type=positive_int, default=200,
+                        help="Held-out normal spectrograms (and at most as many fault spectrograms)")
+    parser.add_argument("--holdout-files", type=int, default=HOLDOUT_FILES,
+                        help="Normal recordings held out by train.py --holdout-files (must match training)")
+    parser.add_argument("--fault-pattern", default="[IBO]*.mat",
+                        help="CWRU fault recordings in data/cwru (inner race, ball, outer race)")
+    parser.add_argument("--runs", type=positive_int, default=50, help="Timed runs per variant")
+    parser.add_argument("--include-untrained", action="store_true",
+                        help="Allow recommending variants without trained weights (random weights; testing only)")
+    parser.add_argument("--export", action="store_true",
+                        help="Re-export every variant from its weights instead of reusing existing ONNX files")
+    parser.add_argument("--report", default=os.path.join(ONNX_DIR, "model_selection.json"),
+                        help="JSON report path")
+    return parser.parse_args()
+
+def main(args):
+    variants = parse_variants(args.variants)
+    budget_ms = args.budget_ms / args.sensors
+    normal, normal_source = load_holdout_spectrograms(args.eval_samples, args.holdout_files)
+    faults, fault_source = load_faults(len(normal), args.fault_pattern, normal)
+    print(f"Evaluating {len(variants)} variant(s) on {len(normal)} normal ({normal_source}) and {len(faults)} "
+          f"{fault_source} fault spectrograms, budget {budget_ms:.3f} ms per window")
+
+    results = []
+    for variant in variants:
+        print(f"\n--- {variant} ---")
+        result = evaluate(variant, normal, faults, args.threads, args.runs, args.export)
+        if result is not None:
+            result["eligible"] = result["trained"] or args.include_untrained
+            results.append(result)
+    if not results:
+        print("No variant could be evaluated.")
+        return None
+
+    print_table(results, budget_ms)
+    best = recommend(results, budget_ms)
+    report = {
+        "budget_ms": budget_ms,
+        "sensors": args.sensors,
+        "threads": args.threads,
+        "normal_samples": int(len(normal)),
+        "normal_source": normal_source,
+        "fault_samples": int(len(faults)),
+        "fault_source": fault_source,
+        "variants": results,
+        "not_eligible": [r["variant"] for r in results if not r["eligible"]],
+        "recommended": best["variant"] if best else None,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.report)), exist_ok=True)
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+
+    eligible = [r for r in results if r["eligible"]]
+    if not eligible:
+        print("\nNo evaluated variant has trained weights; train one with "
+              "`python training/train.py --variant <name>` (or pass --include-untrained).")
+    elif best is None:
+        fastest = min(eligible, key=lambda r: r["latency_ms_p95"])
+        print(f"\nNo eligible variant fits {budget_ms:.3f} ms; the fastest is '{fastest['variant']}' "
+              f"at {fastest['latency_ms_p95']:.3f} ms p95.")
+    else:
+        print(f"\nRecommended: '{best['variant']}' (AUC {best['auc']:.3f}, {best['latency_ms_p95']:.3f} ms p95)")
+        print(f"Deploy with MODEL_PATH_ONNX={best['onnx_path']}")
+        if not best["trained"]:
+            print(f"Warning: '{best['variant']}' has no trained weights; train it with "
+                  f"`python training/train.py --variant {best['variant']}` and re-run with --export.")
+    print(f"Report written to {args.report}")
+    return report
+
+if __name__ == "__main__":
+    try:
+        main(parse_args())
+    except Exception as e:
+        print(f"SCRIPT FAILED: {e}")
+        import traceback
+        traceback.print_exc()
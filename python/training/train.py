@@ -1,14 +1,17 @@
 import torch
 import torch.nn as nn
 import torch.optim as optim
-from torch.utils.data import DataLoader, Dataset
+from torch.utils.data import DataLoader, Dataset, IterableDataset
 import os
+import time
+import argparse
 import numpy as np
 
 # Adjust path to import model
 import sys
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-from training.model import ConvAutoencoder
+from training.model import MODEL_VARIANTS, build_model, artifact_name, count_parameters
+from training.dataset import HOLDOUT_FILES
 
 # Dummy Dataset class since we don't have CWRU data
 class DummyDataset(Dataset):
@@ -23,63 +26,161 @@ class DummyDataset(Dataset):
         # Valid range [0, 1] for Sigmoid output
         return torch.rand(1, 1024, 64).float()
 
-def train():
-    # settings
-    BATCH_SIZE = 4
-    EPOCHS = 1 # Keep it short for demo
-    LR = 1e-3
-    DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    
-    # Check paths
-    weights_dir = os.path.join(os.path.dirname(__file__), "..", "weights")
-    os.makedirs(weights_dir, exist_ok=True)
-    
-    # Data
+def parse_args():
+    parser = argparse.ArgumentParser(description="Train the ConvAutoencoder on CWRU normal data.")
+    parser.add_argument("--variant", default="base", choices=list(MODEL_VARIANTS),
+                        help="Model family variant (see training/model.py); weights go to weights/<name>.pth")
+    parser.add_argument("--epochs", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--lr", type=float, default=1e-3)
+    parser.add_argument("--accum-steps", type=int, default=1,
+                        help="Batches whose gradients are accumulated per optimizer step")
+    parser.add_argument("--workers", type=int, default=0, help="DataLoader worker processes")
+    parser.add_argument("--prefetch-factor", type=int, default=2,
+                        help="Batches prefetched per DataLoader worker")
+    parser.add_argument("--build-workers", type=int, default=1,
+                        help="Processes used to build the spectrogram cache (0: one per CPU)")
+    parser.add_argument("--threads", type=int, default=0, help="Torch intra-op threads (0: torch default)")
+    parser.add_argument("--bf16", action="store_true", help="bfloat16 autocast (CPU or CUDA)")
+    parser.add_argument("--compile", action="store_true", help="Wrap the model in torch.compile")
+    parser.add_argument("--channels-last", action="store_true", help="Use the channels_last memory format")
+    parser.add_argument("--checkpoint", default=None,
+                        help="Checkpoint path (default: weights/checkpoint.pt, checkpoint_<variant>.pt for other variants)")
+    parser.add_argument("--resume", action="store_true", help="Resume from the checkpoint if it exists")
+    parser.add_argument("--log-every", type=int, default=50, help="Batches between progress lines (0: off)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--holdout-files", type=int, default=HOLDOUT_FILES,
+                        help="Normal recordings kept out of training for evaluation (use the same value "
+                             "for select_model.py and export_onnx.py)")
+    parser.add_argument("--streaming", action="store_true",
+                        help="Stream samples from the spectrogram cache instead of indexing them in memory")
+    parser.add_argument("--shuffle-buffer", type=int, default=1024,
+                        help="Samples held in the streaming shuffle buffer")
+    return parser.parse_args()
+
+def load_dataset(args):
     print("Initializing dataset...")
     # Try to load real data
     try:
         from training.dataset import CWRUDataset
         data_dir = os.path.join(os.path.dirname(__file__), "..", "data", "cwru")
-        train_dataset = CWRUDataset(data_dir)
+        # Held-out recordings are left for select_model.py / export_onnx.py
+        train_dataset = CWRUDataset(data_dir, workers=args.build_workers, split="train",
+                                    holdout_files=args.holdout_files)
         if len(train_dataset) == 0:
             print("Warning: No real data found. Using dummy data for demonstration.")
             train_dataset = DummyDataset()
+        elif args.streaming:
+            # CWRUDataset above only (re)built the cache; stream from its shards
+            from training.dataset import StreamingSpectrogramDataset
+            train_dataset = StreamingSpectrogramDataset(train_dataset.shards, shuffle_buffer=args.shuffle_buffer,
+                                                        seed=args.seed)
     except Exception as e:
         print(f"Error loading real data: {e}. Using dummy data.")
         train_dataset = DummyDataset()
-        
-    train_loader = DataLoader(train_dataset, batch_size=BATCH_SIZE, shuffle=True)
-    
+    return train_dataset
+
+def save_checkpoint(path, model, optimizer, epoch, args):
+    # Write then rename, so a crash mid-save keeps the previous checkpoint
+    tmp_path = f"{path}.tmp"
+    torch.save({
+        "epoch": epoch,
+        "model": model.state_dict(),
+        "optimizer": optimizer.state_dict(),
+        "args": vars(args),
+        "model_config": model.config,
+    }, tmp_path)
+    os.replace(tmp_path, path)
+
+def train(args):
+    # settings
+    DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    torch.manual_seed(args.seed)
+    if args.threads > 0:
+        torch.set_num_threads(args.threads)
+    memory_format = torch.channels_last if args.channels_last else torch.contiguous_format
+
+    # Check paths
+    weights_dir = os.path.join(os.path.dirname(__file__), "..", "weights")
+    os.makedirs(weights_dir, exist_ok=True)
+    suffix = "" if args.variant == "base" else f"_{args.variant}"
+    checkpoint_path = args.checkpoint or os.path.join(weights_dir, f"checkpoint{suffix}.pt")
+
+    # Data
+    train_dataset = load_dataset(args)
+    streaming = isinstance(train_dataset, IterableDataset)
+    loader_options = {}
+    if args.workers > 0:
+        loader_options = {"prefetch_factor": args.prefetch_factor, "persistent_workers": True}
+    # Iterable datasets shuffle through their own buffer
+    train_loader = DataLoader(train_dataset, batch_size=args.batch_size, shuffle=not streaming,
+                              num_workers=args.workers, pin_memory=DEVICE.type == "cuda", **loader_options)
+
     # Model
-    model = ConvAutoencoder().to(DEVICE)
+    model = build_model(args.variant).to(DEVICE, memory_format=memory_format)
     criterion = nn.MSELoss()
-    optimizer = optim.Adam(model.parameters(), lr=LR)
-    
+    optimizer = optim.Adam(model.parameters(), lr=args.lr)
+
+    start_epoch = 0
+    if args.resume and os.path.exists(checkpoint_path):
+        checkpoint = torch.load(checkpoint_path, map_location=DEVICE)
+        model.load_state_dict(checkpoint["model"])
+        optimizer.load_state_dict(checkpoint["optimizer"])
+        start_epoch = checkpoint["epoch"] + 1
+        print(f"Resumed from {checkpoint_path} (epoch {start_epoch}/{args.epochs} done)")
+
+    # The compiled wrapper shares parameters with `model`, which is what gets saved
+    step_model = torch.compile(model) if args.compile else model
+
     # Loop
-    print(f"Starting training on {DEVICE} with {len(train_dataset)} samples...")
+    print(f"Model variant '{args.variant}' ({count_parameters(model):,} parameters, {model.config})")
+    print(f"Starting training on {DEVICE} with {len(train_dataset)} samples "
+          f"(batch {args.batch_size} x {args.accum_steps} accumulation, workers={args.workers}, "
+          f"bf16={args.bf16}, compile={args.compile}, channels_last={args.channels_last})...")
     model.train()
-    for epoch in range(EPOCHS):
+    for epoch in range(start_epoch, args.epochs):
+        if streaming:
+            train_dataset.set_epoch(epoch)
         total_loss = 0
         batch_count = 0
+        sample_count = 0
+        epoch_start = time.perf_counter()
+        optimizer.zero_grad(set_to_none=True)
         for batch_idx, data in enumerate(train_loader):
-            data = data.to(DEVICE)
-            
-            optimizer.zero_grad()
-            output = model(data)
-            loss = criterion(output, data)
-            loss.backward()
-            optimizer.step()
-            
+            data = data.to(DEVICE, non_blocking=True, memory_format=memory_format)
+
+            with torch.autocast(device_type=DEVICE.type, dtype=torch.bfloat16, enabled=args.bf16):
+                output = step_model(data)
+            # Loss in float32 even under autocast
+            loss = criterion(output.float(), data)
+            (loss / args.accum_steps).backward()
+            if (batch_idx + 1) % args.accum_steps == 0:
+                optimizer.step()
+                optimizer.zero_grad(set_to_none=True)
+
             total_loss += loss.item()
             batch_count += 1
-            
+            sample_count += len(data)
+            if args.log_every and batch_count % args.log_every == 0:
+                elapsed = time.perf_counter() - epoch_start
+                print(f"  [{epoch+1}/{args.epochs}] batch {batch_count}, loss {total_loss/batch_count:.6f}, "
+                      f"{sample_count/elapsed:.1f} samples/s")
+
+        # Flush gradients of a trailing partial accumulation
+        if batch_count % args.accum_steps:
+            optimizer.step()
+            optimizer.zero_grad(set_to_none=True)
+
+        epoch_time = time.perf_counter() - epoch_start
         avg_loss = total_loss/batch_count if batch_count > 0 else 0
-        print(f"Epoch {epoch+1}/{EPOCHS}, Loss: {avg_loss:.6f}")
-        
+        print(f"Epoch {epoch+1}/{args.epochs}, Loss: {avg_loss:.6f}, Time: {epoch_time:.1f}s, "
+              f"{sample_count/epoch_time if epoch_time > 0 else 0:.1f} samples/s")
+        save_checkpoint(checkpoint_path, model, optimizer, epoch, args)
+
     # Save
-    save_path = os.path.join(weights_dir, "autoencoder.pth")
+    save_path = os.path.join(weights_dir, f"{artifact_name(args.variant)}.pth")
     torch.save(model.state_dict(), save_path)
     print(f"Model saved to {save_path}")
 
 if __name__ == "__main__":
-    train()
+    train(parse_args())
@@ -0,0 +1,146 @@
+import json
+
+from schema import spectrogram_pb2, alert_pb2
+
+# Message headers are defined in schema/*.proto. During the rollout every
+# decoder also accepts the legacy JSON headers, told apart by their first
+# byte: a JSON object starts with '{', a protobuf message with a field tag.
+SCHEMA_VERSION = 1
+JSON_HEADER = "json"
+PROTO_HEADER = "proto"
+HEADER_FORMATS = (JSON_HEADER, PROTO_HEADER)
+
+_DTYPES = {"float32": spectrogram_pb2.FLOAT32, "float16": spectrogram_pb2.FLOAT16, "uint8": spectrogram_pb2.UINT8}
+_DTYPE_NAMES = {v: k for k, v in _DTYPES.items()}
+_SEVERITY_NAMES = {v: k for k, v in alert_pb2.Severity.items()}
+# Result fields that may be None (proto3 optional)
+_OPTIONAL_RESULT_FIELDS = ("origin_timestamp_ms", "origin_seq", "mse", "alert", "alert_id")
+
+
+def is_json(frame):
+    return bytes(frame[:1]) == b"{"
+
+
+def _check_version(version):
+    if version > SCHEMA_VERSION:
+        raise ValueError(f"Unsupported header schema version {version} (expected <= {SCHEMA_VERSION})")
+
+# ─── Node A -> Node B ────────────────────────────────────────────────────────
+
+def encode_spectrogram_header(metadata, fmt=PROTO_HEADER):
+    if fmt == JSON_HEADER:
+        return json.dumps(metadata).encode("utf-8")
+    return spectrogram_pb2.SpectrogramHeader(
+        version=SCHEMA_VERSION,
+        timestamp_ms=int(metadata.get("timestamp_ms") or 0),
+        rms=metadata.get("rms") or 0.0,
+        bins=metadata.get("bins", 0),
+        frames=metadata.get("frames", 0),
+        dtype=_DTYPES[metadata.get("dtype", "float32")],
+        machine_id=metadata.get("machine_id", ""),
+        seq=metadata.get("seq"),
+    ).SerializeToString()
+
+
+def decode_spectrogram_header(frame):
+    """Header frame (bytes or buffer) -> metadata dict with the legacy JSON keys."""
+    if is_json(frame):
+        return json.loads(bytes(frame))
+    header = spectrogram_pb2.SpectrogramHeader.FromString(bytes(frame))
+    _check_version(header.version)
+    metadata = {
+        "timestamp_ms": header.timestamp_ms,
+        "rms": header.rms,
+        "bins": header.bins,
+        "frames": header.frames,
+        "dtype": _DTYPE_NAMES[header.dtype],
+    }
+    if header.machine_id:
+        metadata["machine_id"] = header.machine_id
+    if header.HasField("seq"):
+        metadata["seq"] = header.seq
+    return metadata
+
+# ─── Node B -> Dashboard ─────────────────────────────────────────────────────
+
+def encode_result(result, fmt=PROTO_HEADER):
+    """Encodes a result dict (see InferenceNode.build_result), including an optional spectrogram_format."""
+    if fmt == JSON_HEADER:
+        return json.dumps(result).encode("utf-8")
+    message = alert_pb2.DashboardMessage(version=SCHEMA_VERSION)
+    body = message.result
+    body.timestamp = result["timestamp"]
+    body.machine_id = result["machine_id"]
+    body.sequence = result["sequence"]
+    body.severity = alert_pb2.Severity.Value(result["severity"])
+    for key in _OPTIONAL_RESULT_FIELDS:
+        if result.get(key) is not None:
+            setattr(body, key, result[key])
+    if result.get("band_errors"):
+        body.band_errors.update(result["band_errors"])
+    spec = result.get("spectrogram_format")
+    if spec is not None:
+        body.spectrogram_format.dtype = _DTYPES[spec["dtype"]]
+        body.spectrogram_format.bins = spec["bins"]
+        body.spectrogram_format.frames = spec["frames"]
+        body.spectrogram_format.columns = spec["columns"]
+        body.spectrogram_format.scale.extend(spec["scale"])
+        body.spectrogram_format.offset.extend(spec["offset"])
+    return message.SerializeToString()
+
+
+def encode_alert_update(update, fmt=PROTO_HEADER):
+    """Encodes an alert update dict (see AlertDispatcher._publish)."""
+    if fmt == JSON_HEADER:
+        return json.dumps(update).encode("utf-8")
+    return alert_pb2.DashboardMessage(
+        version=SCHEMA_VERSION,
+        alert_update=alert_pb2.AlertUpdate(
+            alert_id=update["alert_id"],
+            machine_id=update["machine_id"],
+            severity=alert_pb2.Severity.Value(update["severity"]),
+            alert=update["alert"] or "",
+            done=update["done"],
+            error=update["error"],
+        ),
+    ).SerializeToString()
+
+
+def decode_dashboard_message(frame):
+    """First frame of a 5557 message -> the dict the legacy JSON message would have held."""
+    if is_json(frame):
+        return json.loads(bytes(frame))
+    message = alert_pb2.DashboardMessage.FromString(bytes(frame))
+    _check_version(message.version)
+    if message.HasField("alert_update"):
+        update = message.alert_update
+        return {
+            "type": "alert_update",
+            "alert_id": update.alert_id,
+            "machine_id": update.machine_id,
+            "severity": _SEVERITY_NAMES[update.severity],
+            "alert": update.alert,
+            "done": update.done,
+            "error": update.error,
+        }
+    body = message.result
+    result = {
+        "timestamp": body.timestamp,
+        "machine_id": body.machine_id,
+        "sequence": body.sequence,
+        "severity": _SEVERITY_NAMES[body.severity],
+    }
+    for key in _OPTIONAL_RESULT_FIELDS:
+        result[key] = getattr(body, key) if body.HasField(key) else None
+    result["band_errors"] = dict(body.band_errors) or None
+    if body.HasField("spectrogram_format"):
+        spec = body.spectrogram_format
+        result["spectrogram_format"] = {
+            "dtype": _DTYPE_NAMES[spec.dtype],
+            "bins": spec.bins,
+            "frames": spec.frames,
+            "columns": spec.columns,
+            "scale": list(spec.scale),
+            "offset": list(spec.offset),
+        }
+    return result
@@ -1,26 +1,168 @@
 import os
+import json
 
 # ZeroMQ Settings
 # In Docker, use "tcp://host.docker.internal:5555" to connect to host
 ZMQ_ENDPOINT = os.environ.get("ZMQ_ENDPOINT", "tcp://localhost:5555")
+# Multi-sensor fan-in: comma-separated list of Node A endpoints (defaults to ZMQ_ENDPOINT)
+ZMQ_ENDPOINTS = [e.strip() for e in os.environ.get("ZMQ_ENDPOINTS", ZMQ_ENDPOINT).split(",") if e.strip()]
+# Optional comma-separated topic filters, for Node A publishers that send a topic frame
+ZMQ_TOPICS = [t.strip() for t in os.environ.get("ZMQ_TOPICS", "").split(",") if t.strip()]
+# Receive tensor frames without copying them into bytes objects
+ZMQ_ZERO_COPY = os.environ.get("ZMQ_ZERO_COPY", "1") == "1"
 
 # Model Settings
 INPUT_SHAPE = (1, 1024, 64)  # C, H, W (Channels, Frequency Bins, Time Frames)
 LATENT_DIM = 128
+# Duration of one Node A FFT hop (512 samples at 44.1 kHz), i.e. one spectrogram column
+HOP_MS = 512 / 44100 * 1000
 MODEL_PATH_PTH = os.path.join(os.path.dirname(__file__), "..", "weights", "autoencoder.pth")
-MODEL_PATH_ONNX = os.path.join(os.path.dirname(__file__), "..", "onnx", "autoencoder.onnx")
+MODEL_PATH_ONNX = os.environ.get("MODEL_PATH_ONNX", os.path.join(os.path.dirname(__file__), "..", "onnx", "autoencoder.onnx"))
+
+# ONNX Runtime Session
+ORT_PROVIDERS = [p.strip() for p in os.environ.get("ORT_PROVIDERS", "CPUExecutionProvider").split(",") if p.strip()]
+ORT_INTRA_OP_THREADS = int(os.environ.get("ORT_INTRA_OP_THREADS", 0))  # 0 = ORT default (all cores)
+ORT_INTER_OP_THREADS = int(os.environ.get("ORT_INTER_OP_THREADS", 0))
+ORT_GRAPH_OPT_LEVEL = os.environ.get("ORT_GRAPH_OPT_LEVEL", "all")  # disable | basic | extended | all
+ORT_EXECUTION_MODE = os.environ.get("ORT_EXECUTION_MODE", "sequential")  # sequential | parallel
+# Persist the optimized graph next to the ONNX file and reuse it on later starts
+ORT_MODEL_CACHE = os.environ.get("ORT_MODEL_CACHE", "1") == "1"
+ORT_MODEL_CACHE_FORMAT = os.environ.get("ORT_MODEL_CACHE_FORMAT", "onnx")  # onnx | ort
+# Inferences run at startup, before Node B reports ready
+ORT_WARMUP_RUNS = int(os.environ.get("ORT_WARMUP_RUNS", 3))
 
 # Anomaly Detection
 # These thresholds should be calibrated based on normal operating data
 THRESHOLD_LOW = float(os.environ.get("THRESHOLD_LOW", 0.05))
 THRESHOLD_MEDIUM = float(os.environ.get("THRESHOLD_MEDIUM", 0.10))
 THRESHOLD_HIGH = float(os.environ.get("THRESHOLD_HIGH", 0.20))
+# Per-machine overrides as JSON, e.g. '{"pump-1": [0.04, 0.08, 0.15]}' (low, medium, high)
+MACHINE_THRESHOLDS = json.loads(os.environ.get("MACHINE_THRESHOLDS", "{}"))
+
+# Online Threshold Calibration
+# Each machine keeps a constant-memory (P²) sketch of its MSE at MSE_QUANTILES.
+# With ADAPTIVE_THRESHOLDS=1 its low/medium/high thresholds follow the
+# THRESHOLD_QUANTILES of that sketch after ADAPTIVE_MIN_SAMPLES scores (the
+# static thresholds apply until then; MACHINE_THRESHOLDS overrides never adapt).
+def _quantiles(name, default):
+    quantiles = [float(p) for p in os.environ.get(name, default).split(",") if p.strip()]
+    for p in quantiles:
+        if not 0.0 < p < 1.0:
+            raise ValueError(f"{name}: quantiles must be in (0, 1), got {p}")
+    return quantiles
+
+MSE_QUANTILES = _quantiles("MSE_QUANTILES", "0.5,0.95,0.99")
+ADAPTIVE_THRESHOLDS = os.environ.get("ADAPTIVE_THRESHOLDS", "0") == "1"
+# One quantile each for the low, medium and high thresholds
+THRESHOLD_QUANTILES = _quantiles("THRESHOLD_QUANTILES", "0.95,0.99,0.999")
+if len(THRESHOLD_QUANTILES) != 3:
+    raise ValueError(f"THRESHOLD_QUANTILES needs 3 quantiles (low, medium, high), got {len(THRESHOLD_QUANTILES)}")
+ADAPTIVE_MIN_SAMPLES = int(os.environ.get("ADAPTIVE_MIN_SAMPLES", 1000))
+# Sketches are saved here every QUANTILE_SNAPSHOT_INTERVAL_S and on shutdown,
+# and restored on startup. Empty disables persistence.
+QUANTILE_SNAPSHOT_PATH = os.environ.get("QUANTILE_SNAPSHOT_PATH", "")
+QUANTILE_SNAPSHOT_INTERVAL_S = float(os.environ.get("QUANTILE_SNAPSHOT_INTERVAL_S", 60))
+
+# Inference Batching
+# Messages are collected until BATCH_MAX_SIZE is reached or the oldest one has
+# waited BATCH_MAX_WAIT_MS, then scored in a single ORT call.
+# BATCH_MAX_SIZE=1 scores every message on its own (no added latency).
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", 1))
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", 20))
+# Bind preallocated input/output buffers to ORT (no per-message tensor allocations)
+USE_IO_BINDING = os.environ.get("USE_IO_BINDING", "1") == "1"
+
+# Inference Workers
+# INFERENCE_WORKERS > 0 shards machines across that many worker processes,
+# fed through a shared-memory ring of WORKER_RING_SLOTS tensors each.
+# 0 scores in the Node B process itself. A worker that dies is restarted
+# (its queued windows count as dropped, reason "worker_died"); after
+# WORKER_MAX_RESTARTS restarts Node B exits instead.
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", 0))
+WORKER_RING_SLOTS = int(os.environ.get("WORKER_RING_SLOTS", 32))
+WORKER_MAX_RESTARTS = int(os.environ.get("WORKER_MAX_RESTARTS", 3))
+
+# Scoring Scheduler
+# Consecutive Node A windows overlap by 63/64. Score one window every
+# SCORE_STRIDE_HOPS hops (or every SCORE_STRIDE_MS ms if set); with
+# SCORE_ESCALATE, every window is scored while a machine's last MSE is above
+# THRESHOLD_LOW. Windows with an already seen timestamp_ms are dropped.
+SCORE_STRIDE_HOPS = int(os.environ.get("SCORE_STRIDE_HOPS", 1))
+SCORE_STRIDE_MS = float(os.environ.get("SCORE_STRIDE_MS", 0))
+SCORE_ESCALATE = os.environ.get("SCORE_ESCALATE", "1") == "1"
+
+# Pipeline
+# Node B runs as receive -> inference -> publish stages joined by bounded queues.
+# Overflow policy when a queue is full: "drop_oldest", "drop_newest" or "latest"
+# (keep only the most recent message).
+INPUT_QUEUE_SIZE = int(os.environ.get("INPUT_QUEUE_SIZE", 64))
+INPUT_QUEUE_POLICY = os.environ.get("INPUT_QUEUE_POLICY", "drop_oldest")
+OUTPUT_QUEUE_SIZE = int(os.environ.get("OUTPUT_QUEUE_SIZE", 64))
+OUTPUT_QUEUE_POLICY = os.environ.get("OUTPUT_QUEUE_POLICY", "drop_oldest")
+RECEIVE_POLL_MS = int(os.environ.get("RECEIVE_POLL_MS", 100))
+
+# Dashboard Stream (port 5557)
+# "json": spectrogram as base64 float32 inside the JSON result (legacy)
+# "binary": [JSON header, quantized spectrogram bytes] multipart message
+DASHBOARD_STREAM = os.environ.get("DASHBOARD_STREAM", "json")
+DASHBOARD_DTYPE = os.environ.get("DASHBOARD_DTYPE", "float16")  # "float16" or "uint8"
+# Binary mode only: send just the waterfall columns appended since the last frame
+DASHBOARD_DELTA = os.environ.get("DASHBOARD_DELTA", "0") == "1"
+# Maximum dashboard frame rate for NORMAL results (0 = forward every result)
+DASHBOARD_FPS = float(os.environ.get("DASHBOARD_FPS", 0))
+# Header format of results and alert updates: "json" or "proto" (schema/alert.proto,
+# binary stream mode only). The dashboard server decodes both.
+DASHBOARD_HEADER = os.environ.get("DASHBOARD_HEADER", "json")
 
 # LLM Settings
 # In Docker, use "http://host.docker.internal:11434/api/generate"
 OLLAMA_URL = os.environ.get("OLLAMA_URL", "http://localhost:11434/api/generate")
 # OLLAMA_MODEL = "phi3" 
 OLLAMA_MODEL = os.environ.get("OLLAMA_MODEL", "llama3")
+# Timeout (s) for connecting and for each read while the alert is generated
+OLLAMA_TIMEOUT_S = float(os.environ.get("OLLAMA_TIMEOUT_S", 30))
+# Alerts are generated on a background thread: results carry fallback text at
+# once, and the LLM text follows as "alert_update" messages on port 5557,
+# streamed at most every ALERT_UPDATE_INTERVAL_MS with ALERT_STREAM=1.
+# Alerts of the same or lower severity from a machine are coalesced while one
+# is in flight and for ALERT_COOLDOWN_S after it finished.
+ALERT_LLM = os.environ.get("ALERT_LLM", "1") == "1"
+ALERT_STREAM = os.environ.get("ALERT_STREAM", "1") == "1"
+ALERT_UPDATE_INTERVAL_MS = float(os.environ.get("ALERT_UPDATE_INTERVAL_MS", 100))
+ALERT_COOLDOWN_S = float(os.environ.get("ALERT_COOLDOWN_S", 30))
+# Alert texts only depend on (severity, fault, language): generated ones are
+# kept in an LRU (ALERT_CACHE_SIZE entries, expiring after ALERT_CACHE_TTL_S),
+# backed by a persisted table of pre-generated templates (llm/templates.py).
+# ALERT_TEMPLATES_PREFILL=1 generates missing templates for
+# ALERT_TEMPLATE_LANGUAGES in the background while no alert is pending.
+ALERT_LANGUAGE = os.environ.get("ALERT_LANGUAGE", "English")
+ALERT_CACHE_SIZE = int(os.environ.get("ALERT_CACHE_SIZE", 256))
+ALERT_CACHE_TTL_S = float(os.environ.get("ALERT_CACHE_TTL_S", 3600))
+ALERT_TEMPLATES_PATH = os.environ.get("ALERT_TEMPLATES_PATH", os.path.join(os.path.dirname(__file__), "..", "llm", "alert_templates.json"))
+ALERT_TEMPLATES_PREFILL = os.environ.get("ALERT_TEMPLATES_PREFILL", "0") == "1"
+ALERT_TEMPLATE_LANGUAGES = [l.strip() for l in os.environ.get("ALERT_TEMPLATE_LANGUAGES", ALERT_LANGUAGE).split(",") if l.strip()]
+
+# Metrics
+# Node B serves Prometheus metrics on http://METRICS_HOST:METRICS_PORT/metrics
+# (0 disables). METRICS_PROFILING=1 adds /profile?seconds=N, which samples the
+# stacks of all threads and returns them folded for a flame graph.
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("METRICS_PORT", 9108))
+METRICS_PROFILING = os.environ.get("METRICS_PROFILING", "0") == "1"
+
+# Recorder (python/recorder/main.py)
+# Appends every Node A window to memory-mapped segment files (RECORDER_DTYPE
+# payload plus timestamp, RMS, seq and machine ID) with a time index per segment.
+# Segments rotate at RECORDER_SEGMENT_MB or after RECORDER_SEGMENT_S; the oldest
+# are deleted beyond RECORDER_RETENTION_GB or RECORDER_RETENTION_H (0 = keep).
+RECORDER_DIR = os.environ.get("RECORDER_DIR", os.path.join(os.path.dirname(__file__), "..", "..", "data", "raw", "recordings"))
+RECORDER_DTYPE = os.environ.get("RECORDER_DTYPE", "float16")  # float16 | float32
+RECORDER_SEGMENT_MB = float(os.environ.get("RECORDER_SEGMENT_MB", 256))
+RECORDER_SEGMENT_S = float(os.environ.get("RECORDER_SEGMENT_S", 3600))
+RECORDER_RETENTION_GB = float(os.environ.get("RECORDER_RETENTION_GB", 0))
+RECORDER_RETENTION_H = float(os.environ.get("RECORDER_RETENTION_H", 0))
+RECORDER_FLUSH_S = float(os.environ.get("RECORDER_FLUSH_S", 1.0))
+RECORDER_QUEUE_SIZE = int(os.environ.get("RECORDER_QUEUE_SIZE", 1024))
 
 # System
 LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
@@ -1,5 +1,7 @@
 import numpy as np
+import scipy.fft
 import scipy.signal
+from numpy.lib.stride_tricks import sliding_window_view
 
 def compute_spectrogram(signal, fs=12000, n_fft=2048, hop_length=512, n_mels=None):
     """
@@ -47,3 +49,58 @@ def normalize_spectrogram(spec):
         return spec - min_val
         
     return (spec - min_val) / (max_val - min_val)
+
+
+# ─── Batched whole-signal path ───────────────────────────────────────────────
+
+def stft_log_magnitude(signal, n_fft=2048, hop_length=512, n_bins=1024, block_frames=1024):
+    """
+    Log-magnitude STFT of a whole signal in float32, shaped (n_bins, T).
+
+    Uses the same conventions as compute_spectrogram (scipy.signal.stft
+    defaults: periodic Hann window, n_fft // 2 zeros of boundary padding,
+    'spectrum' scaling by 1 / window.sum()), so frame t is centred on
+    sample t * hop_length. Frames are taken as a strided view of the padded
+    signal and transformed block_frames at a time, which bounds the
+    temporary complex buffer regardless of signal length.
+    """
+    x = np.asarray(signal, dtype=np.float32).ravel()
+    pad = n_fft // 2
+    x = np.pad(x, (pad, pad))
+    frames = sliding_window_view(x, n_fft)[::hop_length]
+
+    window = scipy.signal.get_window("hann", n_fft).astype(np.float32)
+    scale = np.float32(1.0 / window.sum())
+
+    out = np.empty((n_bins, len(frames)), dtype=np.float32)
+    for start in range(0, len(frames), block_frames):
+        block = frames[start:start + block_frames] * window
+        mag = np.abs(scipy.fft.rfft(block, axis=-1)[:, :n_bins])
+        mag *= scale
+        mag += np.float32(1e-6)
+        out[:, start:start + len(block)] = np.log10(mag).T
+    return out
+
+def spectrogram_windows(spec, frames=64, stride=1):
+    """
+    All `frames`-wide windows of an (n_bins, T) spectrogram, every `stride`
+    frames, as a zero-copy (N, n_bins, frames) strided view.
+    Windows overlap in memory: copy before writing to them.
+    """
+    if spec.shape[1] < frames:
+        return np.empty((0, spec.shape[0], frames), dtype=spec.dtype)
+    windows = sliding_window_view(spec, frames, axis=1)[:, ::stride]
+    return windows.transpose(1, 0, 2)
+
+def normalize_spectrogram_batch(specs):
+    """
+    normalize_spectrogram applied to every (n_bins, frames) spectrogram of an
+    (N, n_bins, frames) batch in one pass. Returns a new float32 array.
+    """
+    min_val = specs.min(axis=(1, 2), keepdims=True)
+    span = specs.max(axis=(1, 2), keepdims=True) - min_val
+    # Flat spectrograms are only shifted, like normalize_spectrogram
+    span[span < 1e-6] = 1.0
+    out = np.subtract(specs, min_val, dtype=np.float32)
+    out /= span
+    return out
@@ -0,0 +1,115 @@
+from bisect import bisect_right
+
+
+class P2Quantile:
+    """
+    Streaming estimate of a single quantile with the P² algorithm (Jain &
+    Chlamtac, 1985). Keeps five markers whatever the number of observations,
+    so memory and update cost are constant.
+    """
+
+    def __init__(self, p):
+        if not 0.0 < p < 1.0:
+            raise ValueError(f"Quantile must be in (0, 1), got {p}")
+        self.p = p
+        self.count = 0
+        self.heights = []
+        # Actual and desired marker positions (0-based) and desired increments
+        self.positions = [0, 1, 2, 3, 4]
+        self.desired = [0.0, 2 * p, 4 * p, 2 + 2 * p, 4.0]
+        self.increments = [0.0, p / 2, p, (1 + p) / 2, 1.0]
+
+    def update(self, x):
+        self.count += 1
+        q = self.heights
+        if self.count <= 5:
+            q.insert(bisect_right(q, x), x)
+            return
+
+        n = self.positions
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = bisect_right(q, x) - 1
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        # Move the middle markers towards their desired positions
+        for i in (1, 2, 3):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                height = self._parabolic(i, d)
+                if not q[i - 1] < height < q[i + 1]:
+                    height = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = height
+                n[i] += d
+
+    def _parabolic(self, i, d):
+        q, n = self.heights, self.positions
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def value(self):
+        """Current estimate, or None before the first observation."""
+        if not self.heights:
+            return None
+        if self.count <= 5:
+            # Exact (nearest rank) until the markers are initialized
+            return self.heights[min(len(self.heights) - 1, int(round(self.p * (len(self.heights) - 1))))]
+        return self.heights[2]
+
+    def to_dict(self):
+        return {
+            "p": self.p,
+            "count": self.count,
+            "heights": list(self.heights),
+            "positions": list(self.positions),
+            "desired": list(self.desired),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        estimator = cls(data["p"])
+        estimator.count = int(data["count"])
+        estimator.heights = [float(h) for h in data["heights"]]
+        estimator.positions = [int(n) for n in data["positions"]]
+        estimator.desired = [float(d) for d in data["desired"]]
+        return estimator
+
+
+class QuantileSketch:
+    """A set of P² estimators fed from the same stream, e.g. the MSE of one machine."""
+
+    def __init__(self, quantiles):
+        self.estimators = {p: P2Quantile(p) for p in quantiles}
+
+    @property
+    def count(self):
+        return next(iter(self.estimators.values())).count if self.estimators else 0
+
+    def update(self, x):
+        for estimator in self.estimators.values():
+            estimator.update(x)
+
+    def quantile(self, p):
+        return self.estimators[p].value()
+
+    def to_dict(self):
+        return {"estimators": [e.to_dict() for e in self.estimators.values()]}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls([])
+        for item in data["estimators"]:
+            estimator = P2Quantile.from_dict(item)
+            sketch.estimators[estimator.p] = estimator
+        return sketch
@@ -0,0 +1,67 @@
+import time
+
+
+class SequenceTracker:
+    """
+    Per-sensor accounting of Node A sequence numbers and timestamps, so a
+    subscriber can tell how many windows never reached it and how old the
+    ones that did were.
+
+    update() classifies each message against the last sequence number seen
+    for its sensor: the next one, one after a gap (the skipped windows count
+    as lost), or an earlier one (counted as reordered; lost is not reduced,
+    so it stays monotonic for the metrics). A sequence number
+    more than `restart_threshold` behind, or 0, means the sender restarted
+    and starts a new run. Messages without "seq" only contribute latency.
+
+    Latency is measured from Node A's timestamp_ms to the arrival time, so it
+    includes any clock offset between the two hosts.
+    """
+
+    def __init__(self, restart_threshold=1000):
+        self.restart_threshold = restart_threshold
+        self._sensors = {}
+
+    def _sensor(self, key):
+        sensor = self._sensors.get(key)
+        if sensor is None:
+            sensor = self._sensors[key] = {
+                "last_seq": None, "received": 0, "lost": 0, "reordered": 0, "restarts": 0,
+            }
+        return sensor
+
+    def update(self, key, seq=None, timestamp_ms=None, received_at=None):
+        """Returns (lost, latency_ms): windows missing before this one, and its age (None if unstamped)."""
+        sensor = self._sensor(key)
+        sensor["received"] += 1
+        lost = 0
+        if seq is not None:
+            last = sensor["last_seq"]
+            if last is None or seq == last + 1:
+                sensor["last_seq"] = seq
+            elif seq > last:
+                lost = seq - last - 1
+                sensor["lost"] += lost
+                sensor["last_seq"] = seq
+            elif seq == 0 or last - seq > self.restart_threshold:
+                sensor["restarts"] += 1
+                sensor["last_seq"] = seq
+            else:
+                sensor["reordered"] += 1
+
+        latency_ms = None
+        if timestamp_ms:
+            arrival = received_at if received_at is not None else time.time()
+            latency_ms = arrival * 1000.0 - timestamp_ms
+        return lost, latency_ms
+
+    def stats(self):
+        """{key: {"last_seq", "received", "lost", "reordered", "restarts"}} per sensor."""
+        return {key: dict(sensor) for key, sensor in list(self._sensors.items())}
+
+    def totals(self):
+        totals = {"received": 0, "lost": 0, "reordered": 0, "restarts": 0}
+        for sensor in list(self._sensors.values()):
+            for field in totals:
+                totals[field] += sensor[field]
+        return totals
@@ -1,39 +1,92 @@
+import time
 import zmq
 import numpy as np
-import json
 import logging
 
+from utils.codec import decode_spectrogram_header
+
 class ZMQSubscriber:
-    def __init__(self, endpoint="tcp://localhost:5555"):
-        self.endpoint = endpoint
+    def __init__(self, endpoint="tcp://localhost:5555", copy=True, topics=None):
+        # endpoint may be a single address or a list of Node A addresses.
+        # Each endpoint gets its own SUB socket so messages can be attributed
+        # to the sensor they came from.
+        self.endpoints = [endpoint] if isinstance(endpoint, str) else list(endpoint)
+        self.endpoint = self.endpoints[0]
+        # copy=False receives zmq.Frame objects and wraps the tensor frame's
+        # buffer directly (no bytes copy). The returned array is read-only and
+        # keeps the frame alive for as long as it is referenced.
+        self.copy = copy
+        self.topics = list(topics) if topics else [""]
         self.context = zmq.Context()
-        self.socket = self.context.socket(zmq.SUB)
-        self.socket.connect(self.endpoint)
-        self.socket.setsockopt_string(zmq.SUBSCRIBE, "") # Subscribe to all topics
-        logging.info(f"Connected to ZMQ endpoint: {self.endpoint}")
+        self.poller = zmq.Poller()
+        self.sockets = []
+        for ep in self.endpoints:
+            socket = self.context.socket(zmq.SUB)
+            socket.connect(ep)
+            for topic in self.topics:
+                socket.setsockopt_string(zmq.SUBSCRIBE, topic) # "" subscribes to all topics
+            self.poller.register(socket, zmq.POLLIN)
+            self.sockets.append((socket, ep))
+            logging.info(f"Connected to ZMQ endpoint: {ep}")
+        # Sockets reported readable by the last poll, served round-robin
+        self._ready = []
+        # Time spent decoding the last message (header and tensor view)
+        self.decode_seconds = 0.0
+
+    def receive(self, timeout_ms=None):
+        """
+        Returns (metadata, tensor_data), or (None, None) if nothing arrived.
+        With timeout_ms=None the call never blocks; otherwise it waits up to
+        timeout_ms for a message to arrive instead of busy-polling.
 
-    def receive(self):
+        metadata always carries a "machine_id": the one set by the sender, or
+        else the topic frame, or else the endpoint the message arrived on, and
+        "received_at", the time.time() the message was taken off the socket.
+        """
         try:
+            if not self._ready:
+                events = dict(self.poller.poll(0 if timeout_ms is None else timeout_ms))
+                self._ready = [(s, ep) for s, ep in self.sockets if s in events]
+                if not self._ready:
+                    return None, None
+            socket, ep = self._ready.pop(0)
+
             # Receive multipart message
-            # Frame 0: JSON Metadata
+            # Frame 0: Header (SpectrogramHeader protobuf or legacy JSON)
             # Frame 1: Raw Bytes
-            message = self.socket.recv_multipart(flags=zmq.NOBLOCK)
-            
-            if len(message) < 2:
+            # (optionally preceded by a topic frame)
+            message = socket.recv_multipart(flags=zmq.NOBLOCK, copy=self.copy)
+            received_at = time.time()
+            start = time.perf_counter()
+
+            topic = None
+            if len(message) == 3:
+                topic = message[0] if self.copy else message[0].bytes
+                topic = topic.decode('utf-8')
+                message = message[1:]
+            elif len(message) < 2:
                 logging.warning("Received incomplete message")
                 return None, None
 
-            metadata_json = message[0].decode('utf-8')
-            metadata = json.loads(metadata_json)
-            
-            raw_bytes = message[1]
+            if self.copy:
+                header = message[0]
+                raw_bytes = message[1]
+            else:
+                header = message[0].bytes
+                raw_bytes = message[1].buffer
+            metadata = decode_spectrogram_header(header)
+            if "machine_id" not in metadata:
+                metadata["machine_id"] = topic or ep
+            metadata["received_at"] = received_at
+
             # Assumes float32 data
             tensor_data = np.frombuffer(raw_bytes, dtype=np.float32)
-            
+            self.decode_seconds = time.perf_counter() - start
+
             # Reshape based on valid shape
             # Metadata might contain shape info, but we enforce (1024, 64) for now based on spec
             # Input to model expects (1, 1024, 64), so specific reshaping might be done here or in main
-            
+
             return metadata, tensor_data
 
         except zmq.Again:
@@ -44,5 +97,6 @@ class ZMQSubscriber:
             return None, None
 
     def close(self):
-        self.socket.close()
+        for socket, _ in self.sockets:
+            socket.close()
         self.context.term()
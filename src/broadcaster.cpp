@@ -22,6 +22,7 @@ void Broadcaster::send(const float* data, size_t bins, size_t frames, uint64_t t
     std::ostringstream json;
     json << "{"
          << "\"timestamp_ms\":" << ts << ","
+         << "\"seq\":" << seq++ << ","
          << "\"rms\":" << rms << ","
          << "\"bins\":" << bins << ","
          << "\"frames\":" << frames << ","
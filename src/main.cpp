@@ -18,6 +18,7 @@ int main() {
     resonance::SafetyGate safety(0.7f, 4096);
     resonance::FFTEngine fft(2048, 512);
     resonance::SpectrogramRing spectrogram(1024, 64);
+    std::vector<float> window;   // published bins × frames tensor
     resonance::Broadcaster broadcaster("tcp://*:5555");
 
     std::cout << "--- Project Resonance: Node A (The Ear) ---\n";
@@ -77,8 +78,9 @@ int main() {
             uint64_t ts = std::chrono::duration_cast<std::chrono::milliseconds>(
                 std::chrono::system_clock::now().time_since_epoch()).count();
 
+            spectrogram.copyWindow(window);
             broadcaster.send(
-                spectrogram.data(),
+                window.data(),
                 spectrogram.getBins(),
                 spectrogram.getFrames(),
                 ts,
@@ -27,4 +27,14 @@ const float* SpectrogramRing::data() const {
     return ring.data();
 }
 
+void SpectrogramRing::copyWindow(std::vector<float>& out) const {
+    out.resize(bins * frames);
+    // writeFrame is the next slot to overwrite, i.e. the oldest frame
+    for (size_t f = 0; f < frames; ++f) {
+        const float* frame = &ring[((writeFrame + f) % frames) * bins];
+        for (size_t b = 0; b < bins; ++b)
+            out[b * frames + f] = frame[b];
+    }
+}
+
 }
@@ -4,6 +4,8 @@ const socket = io();
 const mseValueEl = document.getElementById('mse-value');
 const statusBadgeEl = document.getElementById('status-badge');
 const statusTextEl = document.getElementById('status-text');
+const latencyTextEl = document.getElementById('latency-text');
+const bandTextEl = document.getElementById('band-text');
 const alertAreaEl = document.querySelector('.alert-area');
 const alertContentEl = document.getElementById('alert-content');
 
@@ -86,11 +88,31 @@ socket.on('connect', () => {
 
 socket.on('disconnect', () => {
     statusTextEl.textContent = "OFFLINE";
+    latencyTextEl.textContent = "";
     statusBadgeEl.style.backgroundColor = "rgba(239, 68, 68, 0.2)";
     statusBadgeEl.style.color = "#ef4444";
 });
 
+// Node B can serve several machines; the dashboard follows the first one it
+// sees (waterfalls for the others are still kept up to date).
+let displayedMachine = null;
+
 socket.on('node_b_data', (data) => {
+    if (data.machine_id) {
+        if (!displayedMachine) displayedMachine = data.machine_id;
+        if (data.machine_id !== displayedMachine) {
+            if (data.spectrogram_data && data.spectrogram_format) {
+                updateWaterfall(data.machine_id, data.spectrogram_format, data.spectrogram_data);
+            }
+            return;
+        }
+    }
+
+    // Sensor-to-screen latency, from the Node A timestamp of the scored window
+    if (data.origin_timestamp_ms) {
+        latencyTextEl.textContent = `· ${Math.max(Date.now() - data.origin_timestamp_ms, 0)} ms`;
+    }
+
     // 1. Update Gauge
     const normalizedScore = Math.min((data.mse / 0.25) * 100, 100);
     gaugeChart.data.datasets[0].data = [normalizedScore, 100 - normalizedScore];
@@ -107,6 +129,12 @@ socket.on('node_b_data', (data) => {
     mseValueEl.textContent = data.mse.toFixed(4);
     mseValueEl.style.color = color;
 
+    // Fault localization: the band with the largest error (scoring graphs only)
+    if (data.band_errors) {
+        const [band, error] = Object.entries(data.band_errors).reduce((a, b) => (b[1] > a[1] ? b : a));
+        bandTextEl.textContent = `Peak error: ${band} (${error.toFixed(4)})`;
+    }
+
     // 2. Update History
     const historyData = historyChart.data.datasets[0].data;
     historyData.push(data.mse);
@@ -116,28 +144,37 @@ socket.on('node_b_data', (data) => {
     // 3. Alert Logic
     // 3. Alert Logic (Restored)
     if (data.severity !== 'NORMAL') {
+        // Prefer LLM text already received for this alert over the fallback
+        const alertText = (data.alert_id && alertTexts.get(data.alert_id)) || data.alert || "Anomaly Detected";
         alertContentEl.innerHTML = `
             <div style="animation: pulse 1s infinite; font-size: 40px; color: ${color}; margin-bottom: 10px;">
                 <ion-icon name="warning"></ion-icon>
             </div>
-            <h3 style="margin: 0; color: white;">${data.alert || "Anomaly Detected"}</h3>
+            <h3 id="alert-text" style="margin: 0; color: white;"></h3>
             <p style="margin: 5px 0 0 0; color: ${color}; font-weight: bold;">Severity: ${data.severity}</p>
         `;
+        document.getElementById('alert-text').textContent = alertText;
+        shownAlertId = data.alert_id || null;
         // Flash the card background
         alertAreaEl.style.background = `linear-gradient(135deg, ${color}20, transparent)`;
 
         // ALSO ADD TO AI CHAT
-        const msg = data.alert || `Anomaly Detected (Severity: ${data.severity})`;
+        const msg = data.alert_id ? alertText : (data.alert || `Anomaly Detected (Severity: ${data.severity})`);
         const chatBox = document.getElementById('ai-chat-box');
-        // Simple debounce: don't add if same as last message
+        // Simple debounce: don't add if same as last message (or alert already in the chat)
         const lastMsg = chatBox.lastElementChild;
-        if (!lastMsg || !lastMsg.textContent.includes(msg)) {
+        if (data.alert_id) {
+            if (!alertMessages.has(data.alert_id)) {
+                alertMessages.set(data.alert_id, addAiMessage(msg, 'alert'));
+            }
+        } else if (!lastMsg || !lastMsg.textContent.includes(msg)) {
             addAiMessage(msg, 'alert');
             // Auto-open chat on high severity? Optional.
             // if (data.severity === 'HIGH') document.getElementById('ai-chat-window').classList.add('open');
         }
 
     } else {
+        shownAlertId = null;
         alertContentEl.innerHTML = `
             <ion-icon name="checkmark-circle-outline" style="font-size: 48px; color: #10b981; opacity: 0.5;"></ion-icon>
             <p style="margin-top: 10px; color: #94a3b8;">System Normal</p>
@@ -146,11 +183,40 @@ socket.on('node_b_data', (data) => {
     }
 
     // 4. Spectrogram
-    if (data.spectrogram) {
+    if (data.spectrogram_data && data.spectrogram_format) {
+        drawSpectrogram(updateWaterfall(data.machine_id, data.spectrogram_format, data.spectrogram_data));
+    } else if (data.spectrogram) {
         renderSpectrogram(data.spectrogram);
     }
 });
 
+// LLM alert text arrives after the result it belongs to, streamed as
+// alert_update messages: update the alert card and its chat message in place.
+const alertTexts = new Map();     // alert_id -> latest text
+const alertMessages = new Map();  // alert_id -> chat message element
+let shownAlertId = null;
+
+socket.on('alert_update', (update) => {
+    if (update.machine_id && displayedMachine && update.machine_id !== displayedMachine) return;
+    alertTexts.set(update.alert_id, update.alert);
+    if (update.alert_id === shownAlertId) {
+        const alertTextEl = document.getElementById('alert-text');
+        if (alertTextEl) alertTextEl.textContent = update.alert;
+    }
+    const message = alertMessages.get(update.alert_id);
+    if (message) {
+        message.querySelector('div').textContent = update.alert;
+        const chatBox = document.getElementById('ai-chat-box');
+        if (chatBox) chatBox.scrollTop = chatBox.scrollHeight;
+    }
+    // Keep the maps bounded
+    if (alertTexts.size > 100) {
+        const oldest = alertTexts.keys().next().value;
+        alertTexts.delete(oldest);
+        alertMessages.delete(oldest);
+    }
+});
+
 // AI Chat Helpers
 function addAiMessage(text, type = 'system') {
     const chatBox = document.getElementById('ai-chat-box');
@@ -169,6 +235,7 @@ function addAiMessage(text, type = 'system') {
 
     chatBox.appendChild(msgDiv);
     chatBox.scrollTop = chatBox.scrollHeight;
+    return msgDiv;
 }
 
 // Toggle AI Chat Window
@@ -197,8 +264,68 @@ function renderSpectrogram(base64Data) {
     const len = binaryString.length;
     const bytes = new Uint8Array(len);
     for (let i = 0; i < len; i++) { bytes[i] = binaryString.charCodeAt(i); }
-    const floats = new Float32Array(bytes.buffer);
+    drawSpectrogram(new Float32Array(bytes.buffer));
+}
+
+// --- Binary spectrogram stream ---
+// Node B can send float16 or uint8 (scale/offset per column) magnitudes, optionally only
+// the newest waterfall columns. We keep the full 1024x64 window per machine
+// and scroll it left by the number of columns received.
+const waterfalls = {};
+let halfTable = null;
+
+function halfToFloatTable() {
+    const table = new Float32Array(65536);
+    for (let h = 0; h < 65536; h++) {
+        const sign = (h & 0x8000) ? -1 : 1;
+        const exp = (h >> 10) & 0x1f;
+        const frac = h & 0x3ff;
+        if (exp === 0) table[h] = sign * Math.pow(2, -14) * (frac / 1024);
+        else if (exp === 31) table[h] = frac ? NaN : sign * Infinity;
+        else table[h] = sign * Math.pow(2, exp - 15) * (1 + frac / 1024);
+    }
+    return table;
+}
+
+function updateWaterfall(machineId, format, payload) {
+    const bins = format.bins;
+    const frames = format.frames;
+    const columns = format.columns;
+    const buffer = payload instanceof ArrayBuffer ? payload : payload.buffer;
+
+    let values;
+    if (format.dtype === 'uint8') {
+        // Row-major (freq x columns): element i belongs to column i % columns
+        const q = new Uint8Array(buffer);
+        values = new Float32Array(q.length);
+        for (let i = 0; i < q.length; i++) {
+            const c = i % columns;
+            values[i] = q[i] * format.scale[c] + format.offset[c];
+        }
+    } else {
+        if (!halfTable) halfTable = halfToFloatTable();
+        const h = new Uint16Array(buffer);
+        values = new Float32Array(h.length);
+        for (let i = 0; i < h.length; i++) values[i] = halfTable[h[i]];
+    }
+
+    const key = machineId || 'default';
+    let waterfall = waterfalls[key];
+    if (!waterfall || waterfall.length !== bins * frames) {
+        waterfall = waterfalls[key] = new Float32Array(bins * frames);
+    }
+
+    // Row-major (freq x time): shift each row left, append the new columns
+    const keep = frames - columns;
+    for (let y = 0; y < bins; y++) {
+        const row = y * frames;
+        if (keep > 0) waterfall.copyWithin(row, row + columns, row + frames);
+        waterfall.set(values.subarray(y * columns, (y + 1) * columns), row + keep);
+    }
+    return waterfall;
+}
 
+function drawSpectrogram(floats) {
     // Spectrogram Dimensions
     const width = 64;
     const height = 1024; // Original Data Height
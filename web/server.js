@@ -3,6 +3,7 @@ const http = require('http');
 const { Server } = require('socket.io');
 const zmq = require('zeromq');
 const path = require('path');
+const protobuf = require('protobufjs');
 
 const app = express();
 const server = http.createServer(app);
@@ -11,6 +12,51 @@ const io = new Server(server);
 // Serve static files from 'public' directory
 app.use(express.static(path.join(__dirname, 'public')));
 
+// Node B headers: DashboardMessage (schema/alert.proto) or legacy JSON.
+// A JSON header starts with '{', a protobuf message with a field tag.
+const schema = new protobuf.Root();
+schema.resolvePath = (origin, target) => path.join(__dirname, '..', target);
+schema.loadSync('schema/alert.proto', { keepCase: true });
+const DashboardMessage = schema.lookupType('resonance.DashboardMessage');
+const OPTIONAL_FIELDS = ['origin_timestamp_ms', 'origin_seq', 'mse', 'alert', 'alert_id'];
+
+function decodeHeader(msg) {
+    if (msg[0] === 0x7b) {
+        return withColumnScales(JSON.parse(msg.toString()));
+    }
+    const message = DashboardMessage.toObject(DashboardMessage.decode(msg), {
+        enums: String, longs: Number, defaults: true, oneofs: true,
+    });
+    if (message.body === 'alert_update') {
+        return { type: 'alert_update', ...message.alert_update };
+    }
+    const result = message.result;
+    // proto3 optional fields: absent means null, as in the JSON header
+    for (const key of OPTIONAL_FIELDS) {
+        if (result[`_${key}`] === undefined) {
+            result[key] = null;
+        }
+        delete result[`_${key}`];
+    }
+    delete result._spectrogram_format;
+    // Band errors only come from scoring graphs
+    if (!result.band_errors || Object.keys(result.band_errors).length === 0) {
+        result.band_errors = null;
+    }
+    return result;
+}
+
+// uint8 spectrograms carry one scale/offset per column; headers from older
+// Node B versions had a single value for the whole frame
+function withColumnScales(result) {
+    const format = result.spectrogram_format;
+    if (format && format.dtype === 'uint8' && !Array.isArray(format.scale)) {
+        format.scale = new Array(format.columns).fill(format.scale);
+        format.offset = new Array(format.columns).fill(format.offset);
+    }
+    return result;
+}
+
 // ZeroMQ Subscriber
 async function runSubscriber() {
     const sock = new zmq.Subscriber();
@@ -20,9 +66,20 @@ async function runSubscriber() {
         console.log("Node.js Server connected to Node B (ZMQ:5557)");
         sock.subscribe(""); // Subscribe to all topics
 
-        for await (const [msg] of sock) {
+        for await (const [msg, payload] of sock) {
             try {
-                const data = JSON.parse(msg.toString());
+                const data = decodeHeader(msg);
+                // LLM alert text for an earlier result, generated (and
+                // streamed) in the background by Node B
+                if (data.type === 'alert_update') {
+                    io.emit('alert_update', data);
+                    continue;
+                }
+                // Binary stream mode: the spectrogram arrives as a second frame
+                // and is forwarded to the browser as a binary attachment.
+                if (payload) {
+                    data.spectrogram_data = payload;
+                }
                 // Broadcast to all connected web clients
                 io.emit('node_b_data', data);
             } catch (err) {